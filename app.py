@@ -1,15 +1,24 @@
 # (venv)환경에서 streamlit run app.py 명령어 실행
 import streamlit as st
-from src.data import get_vectorstore
-from src.rag_system import create_rag_system, get_ktas_prompt
+from src.resources import get_shared_chain, get_rule_engine, warmup_in_background, is_ready, health_check
+from src.rag_system import stream_answer
+from src.telemetry import recent_traces, startup_spans
+from src.triage_rules import format_decision
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO)
 
 # 페이지 제목
 st.set_page_config(page_title="KTAS 중증도 분류 시스템", layout="wide")
 
+# 규칙 엔진은 바로 만들고, 벡터스토어/RAG 체인/LLM 클라이언트는 화면을 띄운 뒤 백그라운드에서 준비
+# (프로세스당 한 번만 생성되어 재실행/세션 간 공유)
+rule_engine = get_rule_engine()
+warmup_in_background()
+
 # 사이드바에서 앱 정보 표시
 with st.sidebar:
     st.title("KTAS 중증도 분류")
@@ -30,6 +39,36 @@ with st.sidebar:
     - **KTAS 5**: 비응급 상태
     """)
 
+    # 시스템 상태 (준비 중에는 기다리지 않고 표시만)
+    if not is_ready():
+        st.caption("시스템 상태: 준비 중...")
+    else:
+        status = health_check()
+        if status["ok"]:
+            st.caption(f"시스템 상태: 정상 (문서 {status['documents']}개)")
+            if "cache" in status:
+                cache = status["cache"]
+                st.caption(f"응답 캐시: 적중 {cache['hits']} / 미적중 {cache['misses']} (저장 {cache['entries']}건)")
+        else:
+            st.caption(f"시스템 상태: 확인 필요 {status['error'] or ''}")
+
+    # 디버그 패널: 최근 요청의 단계별 시간
+    if st.checkbox("디버그 패널", value=False):
+        st.markdown("### 최근 요청")
+        st.caption(f"시작 단계: {startup_spans}")
+        rows = [
+            {
+                "시각": trace["timestamp"],
+                "전체(초)": trace["total"],
+                **{f"{stage}(초)": seconds for stage, seconds in trace["stages"].items()},
+                **trace["tokens"],
+                **trace["cache"],
+                "오류": trace["error"],
+            }
+            for trace in reversed(recent_traces)
+        ]
+        st.dataframe(rows[:10])
+
 # 메인 페이지 헤더
 st.title("환자 정보")
 
@@ -48,6 +87,22 @@ if 'patient_data' not in st.session_state:
 if 'assessment_result' not in st.session_state:
     st.session_state.assessment_result = None
 
+if 'rule_decision' not in st.session_state:
+    st.session_state.rule_decision = None
+
+if 'llm_level' not in st.session_state:
+    st.session_state.llm_level = None
+
+
+# KTAS 레벨에 맞는 경고 표시 (target: 경고를 그릴 위치, 스트리밍 중에는 미리 만든 st.empty())
+def show_level_alert(level, target=st):
+    if level == 1:
+        target.error("⚠️ 이 환자는 즉시 의료진의 처치가 필요합니다!")
+    elif level == 2:
+        target.warning("⚠️ 이 환자는 15분 이내 의료진의 진찰이 필요합니다.")
+    elif level == 3:
+        target.info("이 환자는 30분 이내 의료진의 진찰이 필요합니다.")
+
 # 폼 생성
 with st.form("patient_info_form"):
     # 2열 레이아웃
@@ -83,12 +138,16 @@ with st.form("patient_info_form"):
     # 증상
     st.subheader("현재 증상")
     symptoms = st.text_area("증상", height=100)
+
+    # 규칙 엔진으로 KTAS 1/2가 판정된 경우에도 LLM 설명을 생성할지 여부
+    explain = st.checkbox("규칙 기반으로 분류된 경우에도 상세 설명 생성", value=True)
     
     # 제출 버튼
     submit_button = st.form_submit_button("중증도 평가")
 
 
 # 폼제출
+streamed = False
 if submit_button:
     # 입력 데이터 저장
     st.session_state.patient_data = {
@@ -105,48 +164,72 @@ if submit_button:
     if not vital_signs or not symptoms:
         st.error("활력징후와 증상은 필수 입력 사항입니다.")
     else:
-        with st.spinner("환자 정보 분석 중..."):
-            # 1. 벡터스토어 연결
-            vectorstore = get_vectorstore()
-            
-            # 2. RAG 시스템 생성
-            ktas_chain = create_rag_system(vectorstore)
-
-            search_query = f"{symptoms} {vital_signs} {consciousness}"
-            # 3. 체인에 입력 데이터 전달하기 전
-            input_params = {
-                "input": search_query,  # retriever 쿼리용
-                "sex": st.session_state.patient_data["sex"],
-                "age": st.session_state.patient_data["age"],
-                "diseases": st.session_state.patient_data["diseases"],
-                "medications": st.session_state.patient_data["medications"],
-                "vital_signs": st.session_state.patient_data["vital_signs"],
-                "consciousness": st.session_state.patient_data["consciousness"],
-            }
-            st.write("입력 파라미터:", input_params)
-
-            # 이후 RAG 시스템 호출
-            response = ktas_chain.invoke(input_params)
-            
-            # 4. 응답 처리 및 표시
-            st.session_state.assessment_result = response["answer"]
+        # 0. 활력징후 규칙으로 KTAS 1/2가 명확하면 LLM을 기다리지 않고 바로 표시
+        decision = rule_engine.evaluate(vital_signs, consciousness, age, diseases)
+        st.session_state.rule_decision = decision if decision["level"] else None
+        st.session_state.llm_level = None
+        if st.session_state.rule_decision:
+            st.subheader("규칙 기반 사전 분류")
+            show_level_alert(decision["level"])
+            st.markdown(format_decision(decision))
+            st.session_state.assessment_result = format_decision(decision)
+
+        if st.session_state.rule_decision and not explain:
+            streamed = True
+        else:
+            with st.spinner("환자 정보 분석 중..."):
+                # 백그라운드 준비가 끝나지 않았으면 여기서 기다림
+                ktas_chain = get_shared_chain()
+                # 1~2. 벡터스토어와 RAG 시스템은 시작 시 생성된 공유 체인 사용
+                search_query = f"{symptoms} {vital_signs} {consciousness}"
+                # 3. 체인에 입력 데이터 전달하기 전
+                input_params = {
+                    "input": search_query,  # retriever 쿼리용
+                    "sex": st.session_state.patient_data["sex"],
+                    "age": st.session_state.patient_data["age"],
+                    "diseases": st.session_state.patient_data["diseases"],
+                    "medications": st.session_state.patient_data["medications"],
+                    "vital_signs": st.session_state.patient_data["vital_signs"],
+                    "consciousness": st.session_state.patient_data["consciousness"],
+                }
+                st.write("입력 파라미터:", input_params)
+
+                # 이후 RAG 시스템 호출 (생성되는 대로 화면에 표시)
+                st.subheader("KTAS 평가 결과")
+                # 답변 첫 줄의 KTAS 레벨이 파싱되면 설명이 끝나기 전에 경고부터 표시
+                level_slot = st.empty()
+
+                def on_level(level):
+                    st.session_state.llm_level = level
+                    if not st.session_state.rule_decision:
+                        show_level_alert(level, level_slot)
+
+                timings = {}
+                answer = st.write_stream(stream_answer(ktas_chain, input_params, timings, on_level))
+                st.caption(f"첫 응답 {timings.get('first_token', 0):.2f}초 / 전체 {timings['total']:.2f}초")
+
+                # 4. 응답 처리 및 표시
+                st.session_state.assessment_result = answer
+                streamed = True
 
 # 결과 표시
 if st.session_state.assessment_result:
     st.success("평가가 완료되었습니다!")
     
-    # 결과 카드
-    st.subheader("KTAS 평가 결과")
+    # 결과 카드 (이번 실행에서 스트리밍한 경우 이미 화면에 표시됨)
+    if not streamed:
+        st.subheader("KTAS 평가 결과")
 
-    # 실제 구현에서는 아래 하드코딩된 결과를 RAG 시스템의 출력으로 대체
     with st.container():
-        st.markdown(st.session_state.assessment_result)
-
-        # KTAS 점수 추출 및 적절한 경고 표시 (실제 응답에서 KTAS 점수 추출 로직 필요)
-        if "KTAS 1" in st.session_state.assessment_result:
-            st.error("⚠️ 이 환자는 즉시 의료진의 처치가 필요합니다!")
-        elif "KTAS 2" in st.session_state.assessment_result:
-            st.warning("⚠️ 이 환자는 15분 이내 의료진의 진찰이 필요합니다.")
-        elif "KTAS 3" in st.session_state.assessment_result:
-            st.info("이 환자는 30분 이내 의료진의 진찰이 필요합니다.")
-
+        if not streamed:
+            st.markdown(st.session_state.assessment_result)
+
+        # 규칙 엔진 결과가 있으면 그 레벨을, 없으면 답변 첫 줄에서 파싱한 KTAS 레벨 사용
+        if st.session_state.rule_decision:
+            level = st.session_state.rule_decision["level"]
+        else:
+            level = st.session_state.llm_level
+
+        # 이번 실행에서는 규칙 결과 또는 스트리밍 중 파싱한 레벨로 경고를 이미 표시함
+        if not streamed:
+            show_level_alert(level)
@@ -0,0 +1,140 @@
+# 문서 단위(item / code) A/B 비교
+# python benchmarks/bench_chunking.py [--modes item code] [--k 3] [--output 결과.json]
+# 같은 가이드라인으로 두 방식의 인덱스를 만들고 문서 수, 인덱스 크기, 생성 시간, 검색 정확도(정답 코드 hit@k, MRR),
+# 프롬프트에 들어가는 컨텍스트 토큰 수를 비교 (로컬 해싱 임베딩, 네트워크 없음)
+import argparse, json, os, statistics, sys, tempfile, time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_chroma import Chroma
+
+from src.context import estimate_tokens, pack_documents
+from src.indexing import CHUNKING_MODES, convert_to_documents
+from src.numpy_store import build_numpy_index
+from src.rag_system import get_retriever, retrieve_documents
+from benchmarks.bench_suite import GUIDELINE_JSON, percentiles
+from benchmarks.fakes import make_fake_embeddings
+
+# 증상 -> 정답 NACRS 코드 (여러 코드가 맞을 수 있는 증상은 모두 정답으로 봄)
+LABELED_QUERIES = [
+    ("30분 전부터 가슴을 누르는 듯한 흉통과 식은땀", {"003"}),
+    ("명치 부위 복통과 구토", {"251", "257"}),
+    ("갑자기 시작된 심한 두통", {"404"}),
+    ("전신 발작 후 의식이 흐림", {"405", "401"}),
+    ("30분째 멈추지 않는 코피", {"151"}),
+    ("끓는 물에 팔에 화상", {"705"}),
+    ("당뇨 환자 저혈당 식은땀", {"854"}),
+    ("계단을 오르면 숨참이 심해짐", {"651"}),
+    ("화장실에서 실신", {"008"}),
+    ("검은 피를 토함 토혈", {"259"}),
+    ("오른쪽 옆구리 통증과 혈뇨", {"301", "302"}),
+    ("벌에 쏘인 뒤 온몸 두드러기 알레르기 반응", {"657", "702"}),
+    ("넘어진 뒤 발목이 붓고 하지 통증", {"555", "557"}),
+    ("38.5도 열과 오한", {"852"}),
+    ("한쪽 팔다리 힘이 빠지고 말이 어눌함", {"409"}),
+    ("자살하고 싶다고 함", {"351"}),
+]
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def ranked_codes(documents):
+    # 검색 순위대로 중복 없는 코드 목록
+    codes = []
+    for document in documents:
+        code = document.metadata.get("code")
+        if code and code not in codes:
+            codes.append(code)
+    return codes
+
+
+def evaluate(retriever, k, context_tokens):
+    hits, reciprocal_ranks, prompt_tokens, samples = 0, [], [], []
+    for query, expected in LABELED_QUERIES:
+        chain_input = {"input": query, "age": "45"}
+        start = time.perf_counter()
+        documents = retrieve_documents(retriever, chain_input)
+        samples.append(time.perf_counter() - start)
+        codes = ranked_codes(documents)[:k]
+        rank = next((i + 1 for i, code in enumerate(codes) if code in expected), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        prompt_tokens.append(estimate_tokens(pack_documents(documents, max_tokens=context_tokens)))
+    return {
+        f"hit_at_{k}": round(hits / len(LABELED_QUERIES), 3),
+        "mrr": round(statistics.fmean(reciprocal_ranks), 3),
+        "context_tokens_mean": round(statistics.fmean(prompt_tokens), 1),
+        "context_tokens_max": max(prompt_tokens),
+        "latency": percentiles(samples),
+    }
+
+
+def bench_mode(data, chunking, embeddings, tmp, k=3, context_tokens=800):
+    documents = convert_to_documents(data, chunking)
+    tokens = [estimate_tokens(document.page_content) for document in documents]
+    result = {
+        "documents": len(documents),
+        "document_tokens_mean": round(statistics.fmean(tokens), 1),
+        "document_tokens_max": max(tokens),
+    }
+
+    stores = {}
+    start = time.perf_counter()
+    directory = os.path.join(tmp, f"numpy_{chunking}")
+    stores["numpy"] = build_numpy_index(documents, embeddings, directory)
+    result["numpy"] = {"build_seconds": round(time.perf_counter() - start, 4), "bytes": directory_size(directory)}
+
+    start = time.perf_counter()
+    directory = os.path.join(tmp, f"chroma_{chunking}")
+    stores["chroma"] = Chroma.from_documents(documents, embeddings, ids=[document.id for document in documents],
+                                             persist_directory=directory)
+    result["chroma"] = {"build_seconds": round(time.perf_counter() - start, 4), "bytes": directory_size(directory)}
+
+    for mode in ("dense", "hybrid"):
+        result[mode] = evaluate(get_retriever(stores["numpy"], mode=mode, k=k), k, context_tokens)
+
+    print(f"[{chunking}] 문서 {result['documents']}개, numpy {result['numpy']['bytes'] / 1024:.0f}KB, "
+          f"chroma {result['chroma']['bytes'] / 1024:.0f}KB")
+    for mode in ("dense", "hybrid"):
+        print(f"[{chunking}] {mode}: hit@{k} {result[mode][f'hit_at_{k}']}, MRR {result[mode]['mrr']}, "
+              f"컨텍스트 평균 {result[mode]['context_tokens_mean']}토큰, p50 {result[mode]['latency']['p50_ms']}ms")
+    return result
+
+
+def run(modes=CHUNKING_MODES, k=3, context_tokens=800, embedding="hashing"):
+    embeddings = make_fake_embeddings(embedding)
+    with open(GUIDELINE_JSON, encoding="utf-8") as f:
+        data = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {chunking: bench_mode(data, chunking, embeddings, tmp, k, context_tokens) for chunking in modes}
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"modes": list(modes), "k": k, "context_tokens": context_tokens, "embedding": embedding,
+                   "queries": len(LABELED_QUERIES)},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="문서 단위(item / code) A/B 비교")
+    parser.add_argument("--modes", nargs="+", choices=CHUNKING_MODES, default=list(CHUNKING_MODES))
+    parser.add_argument("--k", type=int, default=3, help="검색 문서 수")
+    parser.add_argument("--context-tokens", type=int, default=800, help="컨텍스트 토큰 예산")
+    parser.add_argument("--embedding", choices=["hashing", "deterministic"], default="hashing")
+    parser.add_argument("--output", default=None, help="결과 저장 json")
+    args = parser.parse_args()
+
+    report = run(args.modes, args.k, args.context_tokens, args.embedding)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
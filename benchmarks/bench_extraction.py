@@ -0,0 +1,61 @@
+# PPTX 추출 속도 측정
+# python benchmarks/bench_extraction.py [--pptx 경로] [--slides 200] [--workers 1 2 4]
+# 경로를 주지 않으면 가상 덱을 만들어 측정
+import argparse, json, os, sys, tempfile, time
+
+from pptx import Presentation
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.indexing import extract_medical_codes_from_pptx
+from benchmarks.synthetic_deck import build_synthetic_deck
+
+
+def bench_extraction(pptx_path, workers_list, repeat=3):
+    results = []
+    baseline = None
+    for workers in workers_list:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = extract_medical_codes_from_pptx(pptx_path, workers=workers)
+            timings.append(time.perf_counter() - start)
+
+        # 프로세스 수와 관계없이 결과가 같아야 함
+        if baseline is None:
+            baseline = data
+        elif data != baseline:
+            raise AssertionError(f"workers={workers} 결과가 직렬 처리 결과와 다릅니다")
+
+        best = min(timings)
+        slide_count = len(Presentation(pptx_path).slides)
+        results.append({
+            "workers": workers,
+            "slides": slide_count,
+            "best_seconds": round(best, 4),
+            "slides_per_second": round(slide_count / best, 1),
+        })
+        print(f"workers={workers}: {best:.3f}초, {slide_count / best:.1f}장/초")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PPTX 추출 벤치마크")
+    parser.add_argument("--pptx", default=None, help="측정할 PPTX (없으면 가상 덱 생성)")
+    parser.add_argument("--slides", type=int, default=200, help="가상 덱 슬라이드 수")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="결과 저장 json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pptx_path = args.pptx or build_synthetic_deck(os.path.join(tmp, "synthetic.pptx"), args.slides)
+        results = bench_extraction(pptx_path, args.workers, args.repeat)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# 오프라인 성능 측정 모음
+# python benchmarks/bench_suite.py [--output 결과.json] [--baseline 이전결과.json] [--tolerance 0.2]
+# 네트워크/API 키 없이 가짜 채팅 모델과 로컬 임베딩으로 추출 -> 문서 변환 -> 인덱스 생성 -> 검색 -> 체인 전체를 측정
+import argparse, json, os, platform, statistics, sys, tempfile, time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_chroma import Chroma
+
+from src.indexing import convert_to_documents
+from src.numpy_store import build_numpy_index
+from src.rag_system import build_chain_input, create_rag_system, get_retriever
+from benchmarks.bench_extraction import bench_extraction
+from benchmarks.fakes import make_fake_embeddings, make_fake_llm
+from benchmarks.synthetic_deck import build_synthetic_deck
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUIDELINE_JSON = os.path.join(ROOT_DIR, "의학코드_추출결과.json")
+
+QUERIES = [
+    "흉통 성인 압박감 식은땀",
+    "호흡곤란 산소포화도 저하",
+    "의식 저하 혈압 80",
+    "발열 38도 이상 면역저하",
+    "복통 구토 설사",
+    "두통 갑자기 시작된 심한 두통",
+    "소아 경련 발열",
+    "외상 출혈 골절",
+]
+
+PATIENTS = [
+    {"symptoms": "30분 전 시작된 압박성 흉통", "sex": "남성", "age": "65",
+     "vital_signs": "혈압 170/95, 맥박 110, 산소포화도 93%", "consciousness": "명료",
+     "diseases": "고혈압", "medications": "암로디핀"},
+    {"symptoms": "3일째 기침과 발열", "sex": "여성", "age": "7",
+     "vital_signs": "체온 38.5, 맥박 120, 산소포화도 96%", "consciousness": "명료"},
+    {"symptoms": "어지러움과 실신", "sex": "남성", "age": "80",
+     "vital_signs": "혈압 85/50, 맥박 45", "consciousness": "언어 반응"},
+]
+
+# 값이 클수록 좋은 지표 (나머지는 작을수록 좋음)
+HIGHER_IS_BETTER = ("per_second",)
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": round(pick(50) * 1000, 3),
+        "p95_ms": round(pick(95) * 1000, 3),
+        "p99_ms": round(pick(99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def best_of(func, repeat):
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def bench_convert(data, repeat=5):
+    seconds, documents = best_of(lambda: convert_to_documents(data), repeat)
+    print(f"문서 변환: {len(documents)}개, {seconds:.4f}초")
+    return {"documents": len(documents), "best_seconds": round(seconds, 4)}, documents
+
+
+def bench_index_build(documents, embedding, tmp):
+    results, stores = {}, {}
+
+    start = time.perf_counter()
+    stores["chroma"] = Chroma.from_documents(
+        documents, embedding, ids=[document.id for document in documents],
+        persist_directory=os.path.join(tmp, "chroma")
+    )
+    results["chroma_seconds"] = round(time.perf_counter() - start, 4)
+
+    start = time.perf_counter()
+    stores["numpy"] = build_numpy_index(documents, embedding, os.path.join(tmp, "numpy"))
+    results["numpy_seconds"] = round(time.perf_counter() - start, 4)
+
+    print(f"인덱스 생성: chroma {results['chroma_seconds']}초, numpy {results['numpy_seconds']}초")
+    return results, stores
+
+
+def bench_retrieval(stores, rounds=10):
+    results = {}
+    for store_name, vectorstore in stores.items():
+        for mode in ("dense", "hybrid"):
+            retriever = get_retriever(vectorstore, mode=mode)
+            retriever.invoke(QUERIES[0])  # 워밍업
+            samples = []
+            for _ in range(rounds):
+                for query in QUERIES:
+                    start = time.perf_counter()
+                    retriever.invoke(query)
+                    samples.append(time.perf_counter() - start)
+            name = f"{store_name}_{mode}"
+            results[name] = percentiles(samples)
+            print(f"검색 {name}: p50 {results[name]['p50_ms']}ms, p95 {results[name]['p95_ms']}ms")
+    return results
+
+
+def bench_chain(vectorstore, requests=30, concurrency=4, token_delay=None):
+    ktas_chain = create_rag_system(vectorstore, llm=make_fake_llm(token_delay))
+    inputs = [build_chain_input(PATIENTS[i % len(PATIENTS)]) for i in range(requests)]
+    ktas_chain.invoke(inputs[0])  # 워밍업
+
+    samples = []
+    start = time.perf_counter()
+    for chain_input in inputs:
+        request_start = time.perf_counter()
+        ktas_chain.invoke(chain_input)
+        samples.append(time.perf_counter() - request_start)
+    serial_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ktas_chain.batch(inputs, config={"max_concurrency": concurrency})
+    batch_seconds = time.perf_counter() - start
+
+    results = {
+        "requests": requests,
+        "serial": {**percentiles(samples), "requests_per_second": round(requests / serial_seconds, 2)},
+        "batch": {"concurrency": concurrency, "requests_per_second": round(requests / batch_seconds, 2)},
+    }
+    print(f"체인 전체: 직렬 {results['serial']['requests_per_second']}건/초, "
+          f"동시 {concurrency} {results['batch']['requests_per_second']}건/초")
+    return results
+
+
+def flatten(results, prefix=""):
+    """
+    {"a": {"b": 1}} -> {"a.b": 1} (기준 결과와 지표별로 비교하기 위함)
+    """
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and (name.endswith("seconds") or name.endswith("_ms")
+                                                  or name.endswith("per_second")):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    기준 결과 대비 tolerance(비율) 이상 나빠진 지표 목록 반환
+    """
+    current, previous = flatten(results["results"]), flatten(baseline["results"])
+    regressions = []
+    for name, value in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        change = (value - before) / before
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": before, "current": value, "change": round(change, 3)})
+    return regressions
+
+
+def run_suite(slides=100, workers=(1, 2), repeat=3, rounds=10, requests=30, concurrency=4, token_delay=None,
+              embedding="hashing"):
+    embeddings = make_fake_embeddings(embedding)
+    with open(GUIDELINE_JSON, encoding="utf-8") as f:
+        data = json.load(f)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = build_synthetic_deck(os.path.join(tmp, "synthetic.pptx"), slides)
+        results["extraction"] = {str(r["workers"]): r for r in bench_extraction(deck, list(workers), repeat)}
+        results["convert"], documents = bench_convert(data, repeat)
+        results["index_build"], stores = bench_index_build(documents, embeddings, tmp)
+        results["retrieval"] = bench_retrieval(stores, rounds)
+        results["chain"] = bench_chain(stores["numpy"], requests, concurrency, token_delay)
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {"slides": slides, "workers": list(workers), "repeat": repeat, "rounds": rounds,
+                   "requests": requests, "concurrency": concurrency, "token_delay": token_delay,
+                   "embedding": embedding},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KTAS 오프라인 벤치마크 모음")
+    parser.add_argument("--slides", type=int, default=100, help="가상 덱 슬라이드 수")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=10, help="검색 질의 반복 횟수")
+    parser.add_argument("--requests", type=int, default=30, help="체인 전체 측정 요청 수")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--token-delay", type=float, default=None, help="가짜 LLM 토큰당 지연(초)")
+    parser.add_argument("--embedding", choices=["hashing", "deterministic"], default="hashing")
+    parser.add_argument("--output", default=None, help="결과 저장 json")
+    parser.add_argument("--baseline", default=None, help="비교할 이전 결과 json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="성능 저하 허용 비율")
+    args = parser.parse_args()
+
+    report = run_suite(args.slides, args.workers, args.repeat, args.rounds, args.requests, args.concurrency,
+                       args.token_delay, args.embedding)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"성능 저하: {regression['metric']} {regression['baseline']} -> {regression['current']} "
+                  f"({regression['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("기준 결과 대비 성능 저하 없음")
+
+
+if __name__ == "__main__":
+    main()
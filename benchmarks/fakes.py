@@ -0,0 +1,44 @@
+# 네트워크 없이 벤치마크를 돌리기 위한 Upstage 대체 모델
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import os, sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embeddings import HashingEmbeddings
+
+FAKE_ANSWER = """KTAS_LEVEL: 2
+[환자 분석]
+65세 남성, 30분 전 시작된 압박성 흉통, 활력징후 혈압 170/95, 맥박 110, 산소포화도 93%.
+
+[KTAS 평가]
+KTAS 2
+
+판단 근거:
+1. 급성 관상동맥 증후군이 의심되는 흉통입니다.
+2. 빈맥과 경미한 산소포화도 저하가 있습니다.
+
+[주의사항]
+이 KTAS 평가는 참고용 정보이며, 최종 판단은 의료진이 해야 합니다."""
+
+
+class FakeTriageChatModel(FakeListChatModel):
+    """
+    고정된 KTAS 답변을 돌려주는 채팅 모델
+    sleep을 지정하면 스트리밍 토큰마다 지연을 넣어 원격 모델의 생성 시간을 흉내냄
+    """
+    responses: list = [FAKE_ANSWER]
+
+
+def make_fake_llm(token_delay=None):
+    return FakeTriageChatModel(responses=[FAKE_ANSWER], sleep=token_delay)
+
+
+def make_fake_embeddings(kind="hashing", size=1024):
+    """
+    hashing: 실제 로컬 백엔드(문자 n-gram 해싱) / deterministic: 텍스트 해시로 만든 무작위 벡터
+    """
+    if kind == "deterministic":
+        return DeterministicFakeEmbedding(size=size)
+    return HashingEmbeddings(n_features=size)
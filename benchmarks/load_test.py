@@ -0,0 +1,433 @@
+# 동시 사용자 부하 시험
+# python benchmarks/load_test.py --target chain --users 20 --rate 5 --requests 200
+# python benchmarks/load_test.py --target http --serve --users 20 --rate 5      (서버를 하위 프로세스로 띄움)
+# python benchmarks/load_test.py --target http --url http://localhost:8000 --users 20
+# python benchmarks/load_test.py --target streamlit --users 20 --requests 60   (app.py를 AppTest로 실행)
+# 가상 환자 기록을 지정한 도착률(포아송, --rate 생략 시 사용자마다 연속 제출)로 여러 가상 사용자가 동시에 제출하고
+# 처리량, 지연 시간 백분위, 오류율, 최대 메모리(RSS)를 측정
+# LLM/임베딩은 로컬 대역 서버(stub_upstage)를 사용하고, 인덱스/캐시/저장소는 작업 디렉터리에 따로 만듦
+import argparse, json, os, random, resource, subprocess, sys, tempfile, threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUIDELINE_JSON = os.path.join(ROOT_DIR, "의학코드_추출결과.json")
+
+sys.path.append(ROOT_DIR)
+
+# src 모듈은 import할 때 KTAS_LOG_DIR 등을 읽으므로 작업 디렉터리 환경변수를 설정한 뒤 import
+
+TARGETS = ("chain", "http", "streamlit")
+
+SYMPTOMS = [
+    "30분 전 시작된 압박성 흉통과 식은땀", "어제부터 시작된 명치 부위 복통과 구토", "갑자기 시작된 심한 두통",
+    "전신 발작 후 의식이 흐림", "멈추지 않는 코피", "끓는 물에 팔에 화상", "계단을 오르면 숨이 참",
+    "화장실에서 실신", "검은 피를 토함", "오른쪽 옆구리 통증과 혈뇨", "벌에 쏘인 뒤 온몸 두드러기",
+    "넘어진 뒤 발목이 붓고 통증", "3일째 기침과 발열", "한쪽 팔다리 힘이 빠지고 말이 어눌함", "어지러움",
+]
+DISEASES = ["미확인", "고혈압", "당뇨", "고혈압, 당뇨", "심방세동(와파린 복용)", "천식"]
+CONSCIOUSNESS = ["명료(Alert)", "명료(Alert)", "명료(Alert)", "언어자극에 반응(Verbal)", "통증자극에 반응(Pain)"]
+
+
+def synthetic_patients(count, seed=0):
+    """
+    무작위 가상 환자 기록 (seed가 같으면 같은 목록, 일부는 활력징후만으로 KTAS 1/2)
+    """
+    rng = random.Random(seed)
+    patients = []
+    for _ in range(count):
+        unstable = rng.random() < 0.2
+        sbp = rng.randint(70, 89) if unstable else rng.randint(100, 170)
+        vital_signs = (f"{sbp}/{rng.randint(40, 100)}-{rng.randint(50, 140)}-{rng.randint(85, 100)}-"
+                       f"{rng.choice([36.5, 37.2, 38.4, 39.1])}-{rng.randint(60, 250)}")
+        patients.append({
+            "sex": rng.choice(["남성", "여성"]),
+            "age": str(rng.choice([1, 4, 9, 25, 38, 52, 67, 81])),
+            "symptoms": rng.choice(SYMPTOMS),
+            "vital_signs": vital_signs,
+            "consciousness": rng.choice(CONSCIOUSNESS),
+            "diseases": rng.choice(DISEASES),
+            "medications": "미확인",
+        })
+    return patients
+
+
+def read_memory(pid="self"):
+    """
+    (현재 RSS, 최대 RSS) 바이트 (/proc이 없으면 현재 프로세스의 최대 RSS만)
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+    except (OSError, KeyError):
+        if pid != "self":
+            return None, None
+        return None, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def prepare_workdir(workdir, base_url, store, response_cache=False):
+    """
+    대역 서버를 쓰도록 환경변수를 맞추고, 작업 디렉터리에 대역 임베딩으로 만든 인덱스 스냅샷이 없으면 생성
+    """
+    os.makedirs(workdir, exist_ok=True)
+    env = {
+        "UPSTAGE_API_BASE": base_url,
+        "UPSTAGE_API_KEY": "stub",
+        "EMBEDDING_BACKEND": "upstage",
+        "KTAS_VECTORSTORE": store,
+        "KTAS_INDEX_DIR": workdir,
+        "KTAS_EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "KTAS_CACHE_PATH": os.path.join(workdir, "ktas_cache.sqlite3"),
+        "KTAS_GUIDELINE_DB": os.path.join(workdir, "guideline.sqlite3"),
+        "KTAS_LOG_DIR": os.path.join(workdir, "logs"),
+        # 같은 환자가 반복되면 캐시 적중으로 LLM을 건너뛰므로 기본으로는 끔
+        "KTAS_RESPONSE_CACHE": "1" if response_cache else "0",
+    }
+    os.environ.update(env)
+
+    from src.index_store import current_version, resolve_index_root
+    index_root = resolve_index_root(store, "upstage", os.getenv("KTAS_CHUNKING", "item"))
+    if current_version(index_root) is None:
+        from src.embeddings import get_embeddings
+        from src.indexing import build_snapshot, convert_to_documents
+
+        with open(GUIDELINE_JSON, encoding="utf-8") as f:
+            documents = convert_to_documents(json.load(f))
+        start = time.perf_counter()
+        build_snapshot(documents, get_embeddings(), index_root, store)
+        print(f"대역 임베딩 인덱스 생성: {index_root} ({time.perf_counter() - start:.1f}초)")
+    return env
+
+
+class ChainTarget:
+    """
+    공유 체인을 프로세스 안에서 직접 호출 (CLI/일괄 평가와 같은 경로)
+    """
+
+    def setup(self):
+        from src.resources import get_shared_chain, warmup
+        warmup()
+        self.chain = get_shared_chain()
+
+    def call(self, patient):
+        from src.rag_system import build_chain_input, stream_answer
+        timings = {}
+        for _ in stream_answer(self.chain, build_chain_input(patient), timings):
+            pass
+        return {"first_token": timings.get("first_token")}
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """
+    HTTP 서비스(src/server.py)의 POST /triage 호출
+    serve=True이면 작업 디렉터리에서 서버를 하위 프로세스로 띄우고, 끝날 때 서버의 최대 RSS도 기록
+    """
+
+    def __init__(self, url=None, serve=False, port=8765, users=1, deadline=None):
+        self.url = (url or f"http://127.0.0.1:{port}").rstrip("/")
+        self.serve = serve
+        self.port = port
+        self.users = users
+        self.deadline = deadline
+        self.process = None
+
+    def setup(self):
+        import httpx
+
+        if self.serve:
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.join(ROOT_DIR, "src", "server.py"), "--port", str(self.port)],
+                env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        self.client = httpx.Client(base_url=self.url, timeout=120,
+                                   limits=httpx.Limits(max_connections=self.users, max_keepalive_connections=self.users))
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                if self.client.get("/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if self.process is not None and self.process.poll() is not None:
+                raise RuntimeError(f"서버 시작 실패 (종료 코드 {self.process.returncode})")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"서버가 응답하지 않음: {self.url}")
+            time.sleep(0.2)
+
+    def call(self, patient):
+        params = {"deadline": self.deadline} if self.deadline is not None else None
+        response = self.client.post("/triage", json=patient, params=params)
+        if response.status_code >= 400:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        body = response.json()
+        return {"shed": body.get("shed", False), "degraded": body.get("degraded", False)}
+
+    def server_memory(self):
+        if self.process is None:
+            return None
+        return read_memory(self.process.pid)[1]
+
+    def close(self):
+        self.client.close()
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+
+# streamlit 대상 작업 프로세스의 화면 세션 (프로세스당 1개)
+_app = None
+
+
+def _start_app(app_path, timeout):
+    # AppTest는 실행할 때마다 전역 Runtime을 바꾸므로 한 프로세스에서 동시에 돌릴 수 없어 가상 사용자마다 프로세스를 씀
+    global _app
+    from streamlit.testing.v1 import AppTest
+    from src.resources import warmup_in_background
+
+    _app = AppTest.from_file(app_path, default_timeout=timeout)
+    _app.run()
+    # 첫 화면에서 시작되는 백그라운드 준비가 끝날 때까지 기다림 (측정에서 제외)
+    warmup_in_background().join()
+
+
+def _submit_form(patient):
+    app = _app
+    for widget in [*app.text_input, *app.text_area]:
+        key = {"나이": "age", "활력징후": "vital_signs", "기저질환": "diseases", "복용약물": "medications",
+               "증상": "symptoms"}.get(widget.label)
+        if key:
+            widget.input(patient.get(key) or "")
+    next(radio for radio in app.radio if radio.label == "성별").set_value(patient.get("sex") or "남성")
+    consciousness = next(box for box in app.selectbox if box.label == "의식상태")
+    if patient.get("consciousness") in consciousness.options:
+        consciousness.set_value(patient["consciousness"])
+    next(button for button in app.button if button.label == "중증도 평가").click()
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    if app.error:
+        raise RuntimeError(app.error[0].value)
+    return {"pid": os.getpid(), "peak_rss": read_memory()[1]}
+
+
+class StreamlitTarget:
+    """
+    app.py를 Streamlit AppTest로 실행해서 폼 입력 -> 제출까지 화면 스크립트 전체를 돌림
+    가상 사용자마다 작업 프로세스 하나와 브라우저 세션 하나(AppTest 하나)를 유지
+    (공유 리소스도 프로세스마다 따로 만들어지므로 최대 RSS는 작업 프로세스별로 기록)
+    """
+
+    def __init__(self, app_path=None, users=1, timeout=120):
+        self.app_path = app_path or os.path.join(ROOT_DIR, "app.py")
+        self.users = users
+        self.timeout = timeout
+        self._pools = []
+        self._local = threading.local()
+        self._next = iter(range(users))
+        self._lock = threading.Lock()
+
+    def setup(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # AppTest가 작업 프로세스의 __main__을 app.py로 바꾸므로 함수는 모듈 이름으로 전달
+        from benchmarks import load_test
+
+        self._module = load_test
+        context = multiprocessing.get_context("spawn")
+        self._pools = [ProcessPoolExecutor(1, context, initializer=load_test._start_app,
+                                           initargs=(self.app_path, self.timeout))
+                       for _ in range(self.users)]
+        # 작업 프로세스를 모두 띄우고 첫 화면/준비가 끝날 때까지 기다림
+        for future in [pool.submit(load_test.read_memory) for pool in self._pools]:
+            future.result()
+
+    def call(self, patient):
+        # 가상 사용자(스레드)마다 같은 작업 프로세스(같은 화면 세션) 사용
+        pool = getattr(self._local, "pool", None)
+        if pool is None:
+            with self._lock:
+                pool = self._local.pool = self._pools[next(self._next)]
+        return pool.submit(self._module._submit_form, patient).result()
+
+    def close(self):
+        for pool in self._pools:
+            pool.shutdown(cancel_futures=True)
+
+
+def run_load(target, patients, users=10, rate=None, duration=None, think=0.0, seed=0):
+    """
+    rate(건/초)를 지정하면 포아송 도착으로 제출(가상 사용자가 모두 바쁘면 대기), 지정하지 않으면
+    사용자마다 응답을 받은 뒤 think초 쉬고 다음 환자를 제출
+    지연 시간은 예정 도착 시각부터 측정 (대기 시간 포함), 처리 시간은 실제 시작부터 측정
+    """
+    from benchmarks.bench_suite import percentiles
+
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    latencies, service, first_tokens, errors, flags = [], [], [], Counter(), Counter()
+    worker_peaks = {}
+
+    def run_one(patient, scheduled):
+        started = time.perf_counter()
+        try:
+            result = target.call(patient)
+        except Exception as e:
+            with lock:
+                errors[str(e)[:80] or type(e).__name__] += 1
+            return
+        finished = time.perf_counter()
+        with lock:
+            latencies.append(finished - scheduled)
+            service.append(finished - started)
+            if result.get("first_token") is not None:
+                first_tokens.append(result["first_token"])
+            flags.update(key for key in ("shed", "degraded") if result.get(key))
+            if result.get("pid"):
+                worker_peaks[result["pid"]] = max(worker_peaks.get(result["pid"], 0), result["peak_rss"] or 0)
+
+    start = time.perf_counter()
+    stop_at = start + duration if duration else None
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix="load-user") as pool:
+        if rate:
+            scheduled = start
+            for patient in patients:
+                scheduled += rng.expovariate(rate)
+                if stop_at and scheduled > stop_at:
+                    break
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                pool.submit(run_one, patient, scheduled)
+        else:
+            queue = iter(patients)
+
+            def user_loop():
+                while not stop_at or time.perf_counter() < stop_at:
+                    with lock:
+                        patient = next(queue, None)
+                    if patient is None:
+                        return
+                    run_one(patient, time.perf_counter())
+                    if think:
+                        time.sleep(think)
+
+            for _ in range(users):
+                pool.submit(user_loop)
+    elapsed = time.perf_counter() - start
+
+    completed = len(latencies)
+    total = completed + sum(errors.values())
+    return {
+        "requests": total,
+        "completed": completed,
+        "errors": dict(errors),
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "shed": flags["shed"],
+        "degraded": flags["degraded"],
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 3) if elapsed else 0.0,
+        "latency": percentiles(latencies) if latencies else None,
+        "service": percentiles(service) if service else None,
+        "first_token": percentiles(first_tokens) if first_tokens else None,
+        "worker_peak_rss": list(worker_peaks.values()),
+    }
+
+
+def make_target(args):
+    if args.target == "chain":
+        return ChainTarget()
+    if args.target == "http":
+        return HttpTarget(args.url, args.serve or not args.url, args.port, args.users, args.deadline)
+    return StreamlitTarget(args.app, args.users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KTAS 동시 사용자 부하 시험")
+    parser.add_argument("--target", choices=TARGETS, default="chain")
+    parser.add_argument("--users", type=int, default=10, help="동시 가상 사용자 수")
+    parser.add_argument("--rate", type=float, default=None, help="도착률(건/초), 생략하면 사용자마다 연속 제출")
+    parser.add_argument("--requests", type=int, default=100, help="제출할 환자 수")
+    parser.add_argument("--duration", type=float, default=None, help="최대 시험 시간(초)")
+    parser.add_argument("--think", type=float, default=0.0, help="연속 제출 시 사용자별 대기 시간(초)")
+    parser.add_argument("--patients", default=None, help="환자 기록 csv/jsonl (생략하면 가상 환자 생성)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", default=None, help="http 대상 서버 주소 (생략하면 하위 프로세스로 띄움)")
+    parser.add_argument("--serve", action="store_true", help="http 대상 서버를 하위 프로세스로 띄움")
+    parser.add_argument("--port", type=int, default=8765, help="--serve로 띄울 서버 포트")
+    parser.add_argument("--deadline", type=float, default=None, help="http 요청별 마감 시간(초)")
+    parser.add_argument("--app", default=None, help="streamlit 대상 스크립트 (기본값 app.py)")
+    parser.add_argument("--store", choices=["numpy", "chroma"], default="chroma")
+    parser.add_argument("--workdir", default=None, help="인덱스/캐시 작업 디렉터리 (기본값 임시 디렉터리)")
+    parser.add_argument("--response-cache", action="store_true", help="응답 캐시 사용")
+    parser.add_argument("--latency", type=float, default=0.2, help="대역 서버 첫 응답 지연(초)")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="대역 서버 스트리밍 토큰 지연(초)")
+    parser.add_argument("--output", default=None, help="결과 저장 json")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ktas-load-"))
+    os.environ["KTAS_LOG_DIR"] = os.path.join(workdir, "logs")
+    from benchmarks.stub_upstage import StubConfig, start_stub_server
+
+    stub, base_url = start_stub_server(config=StubConfig(args.latency, args.token_delay))
+    prepare_workdir(workdir, base_url, args.store, args.response_cache)
+
+    if args.patients:
+        from src.batch import read_patients
+        patients = list(read_patients(args.patients))
+    else:
+        patients = synthetic_patients(args.requests, args.seed)
+    patients = (patients * (args.requests // max(1, len(patients)) + 1))[:args.requests]
+
+    target = make_target(args)
+    rss_before = read_memory()[0]
+    start = time.perf_counter()
+    target.setup()
+    setup_seconds = time.perf_counter() - start
+    stub_before = dict(stub.RequestHandlerClass.config.requests)
+    try:
+        results = run_load(target, patients, args.users, args.rate, args.duration, args.think, args.seed)
+        server_peak = target.server_memory() if isinstance(target, HttpTarget) else None
+    finally:
+        target.close()
+        stub.shutdown()
+
+    stub_after = stub.RequestHandlerClass.config.requests
+    worker_peaks = results.pop("worker_peak_rss")
+    current, peak = read_memory()
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: getattr(args, key) for key in ("target", "users", "rate", "requests", "duration", "think",
+                                                        "store", "latency", "token_delay", "response_cache")},
+        "setup_seconds": round(setup_seconds, 3),
+        "results": results,
+        "memory_mb": {
+            "rss_before": round(rss_before / 2 ** 20, 1) if rss_before else None,
+            "rss_after": round(current / 2 ** 20, 1) if current else None,
+            "peak_rss": round(peak / 2 ** 20, 1),
+            "server_peak_rss": round(server_peak / 2 ** 20, 1) if server_peak else None,
+            "worker_peak_rss": round(max(worker_peaks) / 2 ** 20, 1) if worker_peaks else None,
+            "workers_total_peak_rss": round(sum(worker_peaks) / 2 ** 20, 1) if worker_peaks else None,
+        },
+        "stub_requests": {kind: stub_after[kind] - stub_before.get(kind, 0) for kind in stub_after},
+    }
+
+    latency = results["latency"] or {}
+    print(f"[{args.target}] 사용자 {args.users}명, 완료 {results['completed']}/{results['requests']}건, "
+          f"{results['throughput_rps']}건/초, 오류율 {results['error_rate']:.1%}")
+    print(f"지연 p50 {latency.get('p50_ms')}ms, p95 {latency.get('p95_ms')}ms, p99 {latency.get('p99_ms')}ms")
+    print(f"최대 RSS {report['memory_mb']['peak_rss']}MB"
+          + (f", 서버 {report['memory_mb']['server_peak_rss']}MB" if server_peak else "")
+          + (f", 작업 프로세스 최대 {report['memory_mb']['worker_peak_rss']}MB "
+             f"(합계 {report['memory_mb']['workers_total_peak_rss']}MB)" if worker_peaks else ""))
+    for message, count in results["errors"].items():
+        print(f"오류 {count}건: {message}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
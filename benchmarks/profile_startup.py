@@ -0,0 +1,117 @@
+# 시작 시간 프로파일링
+# python benchmarks/profile_startup.py [--module src.resources] [--warmup] [--top 15] [--output 결과.json]
+# 새 파이썬 프로세스를 `-X importtime`으로 실행해 모듈별 import 시간을 집계하고,
+# --warmup이면 이어서 warmup()의 단계별 시간(vectorstore_open, chain_build, llm_client)도 측정
+import argparse, json, os, re, subprocess, sys, time
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time:       self [us] |  cumulative | imported package"
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+result = {{"import_seconds": time.perf_counter() - start}}
+if {warmup!r}:
+    from src.resources import warmup
+    from src.telemetry import startup_spans
+    start = time.perf_counter()
+    warmup()
+    result["warmup_seconds"] = time.perf_counter() - start
+    result["warmup_spans"] = dict(startup_spans)
+print("PROFILE_RESULT " + json.dumps(result), file=sys.stdout)
+"""
+
+
+def parse_importtime(stderr):
+    """
+    -X importtime 출력을 [(모듈, 자체 시간(초), 누적 시간(초), 깊이)]로 변환
+    """
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us) / 1e6, int(cumulative_us) / 1e6, (len(indent) - 1) // 2))
+    return rows
+
+
+def profile_startup(modules, warmup=False, top=15, env=None):
+    code = PROBE.format(modules=list(modules), warmup=warmup)
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR, capture_output=True, text=True, env={**os.environ, **(env or {})},
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr[-2000:])
+
+    result = {}
+    for line in completed.stdout.splitlines():
+        if line.startswith("PROFILE_RESULT "):
+            result = json.loads(line[len("PROFILE_RESULT "):])
+
+    rows = parse_importtime(completed.stderr)
+    packages = defaultdict(float)
+    for module, self_seconds, _, _ in rows:
+        packages[module.split(".")[0]] += self_seconds
+
+    def ms(seconds):
+        return round(seconds * 1000, 1)
+
+    return {
+        "modules": list(modules),
+        "process_seconds": round(wall, 3),
+        "import_seconds": round(result.get("import_seconds", 0.0), 3),
+        "warmup_seconds": round(result["warmup_seconds"], 3) if "warmup_seconds" in result else None,
+        "warmup_spans": result.get("warmup_spans"),
+        # 요청한 모듈이 직접 끌어온 모듈 중 누적 시간이 큰 순서
+        "top_cumulative_ms": [
+            {"module": module, "cumulative_ms": ms(cumulative)}
+            for module, _, cumulative, _ in sorted(rows, key=lambda row: -row[2])[:top]
+        ],
+        # 최상위 패키지별 자체 시간 합계
+        "packages_ms": [
+            {"package": package, "self_ms": ms(seconds)}
+            for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+        "loaded_modules": len(rows),
+    }
+
+
+def print_report(report):
+    print(f"모듈: {', '.join(report['modules'])}")
+    print(f"import {report['import_seconds']}초 / 프로세스 전체 {report['process_seconds']}초 "
+          f"(모듈 {report['loaded_modules']}개)")
+    if report["warmup_seconds"] is not None:
+        print(f"warmup {report['warmup_seconds']}초 {report['warmup_spans']}")
+    print("\n[누적 import 시간 상위]")
+    for row in report["top_cumulative_ms"]:
+        print(f"  {row['cumulative_ms']:>9.1f}ms  {row['module']}")
+    print("\n[패키지별 자체 import 시간]")
+    for row in report["packages_ms"]:
+        print(f"  {row['self_ms']:>9.1f}ms  {row['package']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="시작 시간(import/워밍업) 프로파일링")
+    parser.add_argument("--module", nargs="+", default=["src.resources"], help="import할 모듈")
+    parser.add_argument("--warmup", action="store_true", help="import 후 warmup()까지 측정")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", default=None, help="결과 저장 json")
+    args = parser.parse_args()
+
+    report = profile_startup(args.module, args.warmup, args.top)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Upstage(OpenAI 호환) API 대역 서버
+# python benchmarks/stub_upstage.py --port 8900 [--latency 0.2] [--token-delay 0.01]
+# UPSTAGE_API_BASE=http://localhost:8900 으로 실행하면 네트워크/API 키 없이 채팅(/chat/completions)과 임베딩(/embeddings)을 흉내냄
+import argparse, base64, json, os, sys, threading, time, uuid
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embeddings import HashingEmbeddings
+from benchmarks.fakes import FAKE_ANSWER
+
+
+class StubConfig:
+    """
+    응답 지연 설정
+    - latency: 첫 응답(스트리밍은 첫 토큰)까지 지연(초)
+    - token_delay: 스트리밍 토큰 사이 지연(초)
+    - chunk_chars: 스트리밍 조각 하나의 글자 수
+    """
+
+    def __init__(self, latency=0.0, token_delay=0.0, chunk_chars=4, answer=FAKE_ANSWER, dimensions=1024):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.chunk_chars = chunk_chars
+        self.answer = answer
+        self.embeddings = HashingEmbeddings(n_features=dimensions)
+        self.requests = {"chat": 0, "embeddings": 0}
+        self.lock = threading.Lock()
+
+    def count(self, kind):
+        with self.lock:
+            self.requests[kind] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(self.config.requests)
+        else:
+            self._send_json({"error": {"message": "not found"}}, 404)
+
+    def do_POST(self):
+        request = self._read_json()
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self.config.count("chat")
+            self._chat(request)
+        elif self.path.rstrip("/").endswith("/embeddings"):
+            self.config.count("embeddings")
+            self._embeddings(request)
+        else:
+            self._send_json({"error": {"message": f"unknown path {self.path}"}}, 404)
+
+    def _chat(self, request):
+        config = self.config
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "solar-pro")
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in request.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_chars // 2,
+            "completion_tokens": len(config.answer) // 2,
+            "total_tokens": (prompt_chars + len(config.answer)) // 2,
+        }
+        time.sleep(config.latency)
+
+        if not request.get("stream"):
+            self._send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": config.answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        # SSE 스트리밍 (조각마다 choices[0].delta.content)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send(delta, finish_reason=None, extra=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **(extra or {}),
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            send({"role": "assistant", "content": ""})
+            for i in range(0, len(config.answer), config.chunk_chars):
+                send({"content": config.answer[i:i + config.chunk_chars]})
+                if config.token_delay:
+                    time.sleep(config.token_delay)
+            send({}, "stop", {"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def _embeddings(self, request):
+        texts = request.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        time.sleep(self.config.latency)
+        vectors = self.config.embeddings.embed_documents(texts)
+
+        data = []
+        for i, vector in enumerate(vectors):
+            # openai 클라이언트는 기본으로 base64(float32) 형식을 요청함
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(len(text) for text in texts) // 2
+        self._send_json({
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "embedding-passage"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+
+def make_stub_server(host="127.0.0.1", port=0, config=None):
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub_server(port=0, config=None, host="127.0.0.1"):
+    """
+    대역 서버를 백그라운드 스레드로 시작하고 (서버, base_url) 반환 (port=0이면 빈 포트 사용)
+    """
+    server = make_stub_server(host, port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upstage API 대역 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="첫 응답까지 지연(초)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="스트리밍 토큰 사이 지연(초)")
+    parser.add_argument("--dimensions", type=int, default=1024, help="임베딩 차원")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.token_delay, dimensions=args.dimensions)
+    server = make_stub_server(args.host, args.port, config)
+    print(f"Upstage 대역 서버: http://{args.host}:{args.port} (UPSTAGE_API_BASE로 지정)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# 벤치마크용 가상 가이드라인 PPTX 생성
+# 실제 KTAS 가이드라인과 같은 표 구조(Coding System / NACRS / 카테고리 / 레벨 행)를 가짐
+from pptx import Presentation
+from pptx.util import Inches
+import random
+
+CATEGORY_ROWS = ("활력징후 1차 고려사항", "그 밖의 1차 고려사항", "증상별 2차 고려사항")
+DESCRIPTIONS = (
+    "중증 호흡곤란", "쇼크", "무의식 (U, GCS 3-8)", "중등도 호흡곤란", "혈역학적 장애",
+    "의식변화 (V/P, GCS 9-13)", "급성 중심성 중증 통증 (8-10)", "급성 중등도 통증 (4-7)",
+    "출혈성 질환 (중등도나 경도의 출혈)", "경증 호흡곤란", "심장성 흉통", "흉막성 흉통",
+    "새로 발생한 국소 신경학적 결손", "구토를 동반한 두통", "고위험성 사고기전",
+)
+
+
+def build_synthetic_deck(output_path, slide_count=200, rows_per_category=4, seed=0):
+    """
+    slide_count장짜리 가상 가이드라인 덱을 만들어 output_path에 저장
+    """
+    rng = random.Random(seed)
+    prs = Presentation()
+    layout = prs.slide_layouts[6]   # 빈 슬라이드
+
+    for idx in range(slide_count):
+        slide = prs.slides.add_slide(layout)
+        rows = [
+            ("Coding System", f"Codes 가상 증상 {idx + 1:03d}"),
+            ("NACRS", f"NACRS {idx + 1:03d}"),
+        ]
+        for category in CATEGORY_ROWS:
+            rows.append((category, ""))
+            for _ in range(rows_per_category):
+                level = rng.randint(1, 5)
+                rows.append((str(level), rng.choice(DESCRIPTIONS)))
+
+        table = slide.shapes.add_table(len(rows), 2, Inches(0.5), Inches(0.5), Inches(9), Inches(6)).table
+        for r, (left, right) in enumerate(rows):
+            table.cell(r, 0).text = left
+            table.cell(r, 1).text = right
+
+    prs.save(output_path)
+    return output_path
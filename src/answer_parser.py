@@ -0,0 +1,89 @@
+# KTAS 답변 파싱
+# LLM 답변 첫 줄의 "KTAS_LEVEL: N"을 읽어 설명 생성이 끝나기 전에 레벨을 사용할 수 있게 함
+import re
+
+LEVEL_PREFIX = "KTAS_LEVEL"
+
+# 첫 줄 형식: KTAS_LEVEL: 2 (마크다운 강조나 전각 콜론도 허용)
+LEVEL_LINE = re.compile(r"^[\s*#>`]*KTAS_LEVEL[\s*`]*[:：]\s*\**\s*([1-5])(?!\.?\d)")
+# 첫 줄이 없는 답변(이전 형식, 캐시된 답변 등)은 [KTAS 평가] 섹션의 첫 점수 사용
+# ([KTAS 기준] 설명에 나오는 "KTAS 1" 등을 잘못 읽지 않도록 섹션 뒤에서만 찾음)
+# 숫자 뒤에 조사가 바로 붙는 경우("KTAS 3에 해당")도 읽도록 \b 대신 뒤에 숫자가 이어지지 않는지만 확인
+EVALUATION_LEVEL = re.compile(r"\[KTAS 평가\][^\[]*?KTAS\s*([1-5])(?!\.?\d)")
+
+# 첫 줄이 이 길이를 넘도록 줄바꿈이 없으면 레벨 줄이 없는 것으로 판단
+MAX_HEADER_CHARS = 64
+
+
+def _split_header(text):
+    """
+    (레벨, 레벨 줄을 뺀 본문) 반환, 첫 줄이 레벨 줄이 아니면 (None, 원문)
+    """
+    stripped = text.lstrip()
+    first_line, _, rest = stripped.partition("\n")
+    match = LEVEL_LINE.match(first_line)
+    if not match:
+        return None, text
+    return int(match.group(1)), rest.lstrip("\n")
+
+
+def parse_ktas_level(answer):
+    """
+    답변에서 KTAS 레벨(1~5) 추출, 찾지 못하면 None
+    """
+    if not answer:
+        return None
+    level, _ = _split_header(answer)
+    if level is not None:
+        return level
+    match = EVALUATION_LEVEL.search(answer)
+    return int(match.group(1)) if match else None
+
+
+def split_answer(answer):
+    """
+    답변을 (레벨, 화면에 보여줄 본문)으로 분리
+    """
+    level, body = _split_header(answer or "")
+    if level is None:
+        level = parse_ktas_level(body)
+    return level, body
+
+
+class LevelStreamParser:
+    """
+    스트리밍 답변 조각을 받아 레벨 줄을 찾는 즉시 level을 채우고, 레벨 줄을 뺀 본문 조각을 돌려줌
+    첫 줄이 완성될 때까지는 본문을 내보내지 않음
+    """
+
+    def __init__(self):
+        self.level = None
+        self._buffer = ""
+        self._header_done = False
+        self._parts = []
+
+    def feed(self, chunk):
+        self._parts.append(chunk)
+        if self._header_done:
+            return chunk
+
+        self._buffer += chunk
+        stripped = self._buffer.lstrip()
+        if "\n" not in stripped and len(stripped) < MAX_HEADER_CHARS:
+            return ""
+        return self._finish_header()
+
+    def close(self):
+        """
+        스트림이 끝났을 때 남은 본문 반환 (레벨 줄이 없었으면 전체 답변에서 레벨을 다시 찾음)
+        """
+        remaining = "" if self._header_done else self._finish_header()
+        if self.level is None:
+            self.level = parse_ktas_level("".join(self._parts))
+        return remaining
+
+    def _finish_header(self):
+        self._header_done = True
+        self.level, body = _split_header(self._buffer)
+        self._buffer = ""
+        return body
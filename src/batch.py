@@ -0,0 +1,164 @@
+# 일괄 중증도 평가
+# python src/batch.py 환자목록.csv 결과.jsonl --workers 4 --rps 2
+# 입력 파일(csv/jsonl)의 각 행은 medical_info()와 같은 필드를 가짐
+import argparse, csv, json, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.answer_parser import parse_ktas_level
+from src.rag_system import build_chain_input
+
+PATIENT_FIELDS = ("sex", "age", "symptoms", "vital_signs", "consciousness", "diseases", "medications")
+REQUIRED_FIELDS = ("symptoms", "vital_signs")
+
+
+class InvalidRecord(ValueError):
+    """
+    읽을 수 없는 입력 행 (일괄 평가를 멈추지 않고 해당 행만 error로 기록)
+    """
+
+
+class RateLimiter:
+    """
+    초당 요청 수 제한 (요청 시작 간격을 일정하게 유지)
+    """
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+def read_patients(input_path):
+    """
+    csv 또는 jsonl 파일에서 환자 정보를 한 건씩 읽음
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    with open(input_path, encoding="utf-8-sig") as f:
+        if ext == ".csv":
+            for row in csv.DictReader(f):
+                yield {key: (row.get(key) or "").strip() for key in PATIENT_FIELDS}
+        elif ext in (".jsonl", ".ndjson"):
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    patient = json.loads(line)
+                except json.JSONDecodeError as e:
+                    patient = InvalidRecord(f"{line_number}번째 줄 JSON 오류: {e}")
+                yield patient
+        else:
+            raise ValueError(f"지원하지 않는 입력 형식: {ext} (csv, jsonl만 가능)")
+
+
+def triage_one(ktas_chain, patient, rate_limiter):
+    missing = [key for key in REQUIRED_FIELDS if not str(patient.get(key) or "").strip()]
+    if missing:
+        raise ValueError(f"필수 입력 누락: {', '.join(missing)}")
+
+    rate_limiter.acquire()
+    response = ktas_chain.invoke(build_chain_input(patient))
+    return response["answer"]
+
+
+def run_batch(ktas_chain, patients, output_path, max_workers=4, requests_per_second=None):
+    """
+    환자 목록을 제한된 동시성으로 평가하고, 입력 순서대로 결과를 jsonl로 기록
+    각 결과에는 level/answer 또는 error가 기록되며, 한 건의 실패가 전체를 멈추지 않음
+    """
+    rate_limiter = RateLimiter(requests_per_second)
+    # 한 번에 대기시킬 최대 작업 수 (입력 파일 전체를 메모리에 올리지 않기 위함)
+    max_pending = max_workers * 2
+    # 순서대로 기록되기를 기다리는 결과까지 포함한 최대 보관 수 (앞 번호 한 건이 오래 걸려도 버퍼가 계속 커지지 않도록 함)
+    max_buffered = max_pending * 4
+
+    pending = {}      # future -> (index, patient, 시작 시각)
+    finished = {}     # index -> 결과 레코드 (순서대로 기록되기 전까지 보관)
+    next_index = 0
+    counts = {"ok": 0, "error": 0}
+    start = time.perf_counter()
+
+    def collect(done):
+        for future in done:
+            index, patient, started = pending.pop(future)
+            record = {"index": index, "patient": patient, "level": None, "answer": None, "error": None}
+            try:
+                record["answer"] = future.result()
+                record["level"] = parse_ktas_level(record["answer"])
+                counts["ok"] += 1
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {str(e)}"
+                counts["error"] += 1
+            record["elapsed"] = round(time.perf_counter() - started, 3)
+            finished[index] = record
+
+    def reject(index, error):
+        finished[index] = {"index": index, "patient": None, "level": None, "answer": None,
+                           "error": f"{type(error).__name__}: {str(error)}", "elapsed": 0.0}
+        counts["error"] += 1
+
+    with open(output_path, "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def flush():
+            # 앞 번호부터 완료된 결과만 순서대로 기록
+            nonlocal next_index
+            while next_index in finished:
+                out.write(json.dumps(finished.pop(next_index), ensure_ascii=False) + "\n")
+                next_index += 1
+            out.flush()
+
+        def drain(should_wait):
+            while pending and should_wait():
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+                flush()
+
+        try:
+            for index, patient in enumerate(patients):
+                drain(lambda: len(pending) >= max_pending or len(pending) + len(finished) >= max_buffered)
+                if isinstance(patient, Exception):
+                    reject(index, patient)
+                    flush()
+                    continue
+                future = executor.submit(triage_one, ktas_chain, patient, rate_limiter)
+                pending[future] = (index, patient, time.perf_counter())
+        finally:
+            # 입력을 읽다가 예외가 나도 이미 시작한 평가는 끝까지 기록
+            drain(lambda: True)
+
+    elapsed = time.perf_counter() - start
+    total = counts["ok"] + counts["error"]
+    print(f"일괄 평가 완료: {total}건 (성공 {counts['ok']}, 실패 {counts['error']}), {elapsed:.1f}초")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KTAS 일괄 중증도 평가")
+    parser.add_argument("input_path", help="환자 정보 파일 (csv 또는 jsonl)")
+    parser.add_argument("output_path", help="결과 저장 파일 (jsonl)")
+    parser.add_argument("--workers", type=int, default=4, help="동시 평가 수")
+    parser.add_argument("--rps", type=float, default=None, help="초당 최대 요청 수")
+    args = parser.parse_args()
+
+    from src.resources import get_shared_chain
+    ktas_chain = get_shared_chain()
+
+    run_batch(ktas_chain, read_patients(args.input_path), args.output_path,
+              max_workers=args.workers, requests_per_second=args.rps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# 응답 캐시
+# 같은(또는 정규화하면 같은) 환자 입력에 대해 검색 + LLM 호출을 반복하지 않도록 SQLite에 답변 저장
+import hashlib, json, os, re, sqlite3, threading, time, unicodedata
+
+from src.answer_parser import parse_ktas_level
+from src.data import load_manifest
+from src.telemetry import record_cache
+from src.triage_rules import parse_avpu, parse_vital_signs
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(ROOT_DIR, "ktas_cache.sqlite3")
+
+CACHE_FIELDS = ("input", "sex", "age", "vital_signs", "consciousness", "diseases", "medications")
+UNKNOWN_VALUES = ("", "미확인", "모름", "없음", "-")
+
+_whitespace = re.compile(r"\s+")
+
+
+def _normalize_text(text):
+    text = unicodedata.normalize("NFC", str(text or ""))
+    text = _whitespace.sub(" ", text).strip().lower()
+    return "" if text in UNKNOWN_VALUES else text
+
+
+def _normalize_vital_signs(vital_signs):
+    vitals = parse_vital_signs(vital_signs)
+    values = [vitals.sbp, vitals.dbp, vitals.heart_rate, vitals.spo2, vitals.temperature, vitals.glucose]
+    # 형식을 확실히 읽지 못했으면 수치 변화를 놓치지 않도록 문자열로 비교
+    if not vitals.parsed:
+        return _normalize_text(vital_signs)
+    return "|".join("" if v is None else f"{v:g}" for v in values)
+
+
+def normalize_chain_input(chain_input):
+    """
+    캐시 키용 입력 정규화 (공백/대소문자/미확인 표현 통일, 활력징후는 수치로, 의식상태는 AVPU로)
+    """
+    normalized = {key: _normalize_text(chain_input.get(key)) for key in CACHE_FIELDS}
+    normalized["vital_signs"] = _normalize_vital_signs(chain_input.get("vital_signs"))
+    normalized["consciousness"] = parse_avpu(chain_input.get("consciousness")) or normalized["consciousness"]
+    return normalized
+
+
+def make_cache_key(chain_input):
+    payload = json.dumps(normalize_chain_input(chain_input), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_cache_version(prompt, index_version="", retriever_mode=""):
+    """
+    프롬프트, 인덱스(문서/임베딩 모델), 검색 방식 중 하나라도 바뀌면 달라지는 캐시 버전
+    """
+    payload = f"{prompt!r}\n{index_version}\n{retriever_mode}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def get_index_version(vectorstore):
+    """
+    벡터스토어 내용을 대표하는 버전 문자열
+    manifest가 있으면 manifest 버전 + 임베딩 모델, 없으면 컬렉션 이름 + 문서 수
+    (문서가 같아도 임베딩 모델이 다르면 검색 결과가 다르므로 구분)
+    """
+    persist_directory = getattr(vectorstore, "_persist_directory", None)
+    manifest = load_manifest(persist_directory) if persist_directory else None
+    if manifest and manifest.get("version"):
+        return f"{manifest['version']}:{manifest.get('embedding_model')}"
+
+    collection = getattr(vectorstore, "_collection", None)
+    if collection is None:
+        return type(vectorstore).__name__
+    return f"{collection.name}:{collection.count()}"
+
+
+class ResponseCache:
+    """
+    SQLite 기반 응답 캐시
+    - ttl: 저장 후 유효 시간(초), None이면 만료 없음
+    - max_entries: 최대 저장 수, 초과하면 가장 오래 사용하지 않은 항목부터 삭제(LRU)
+    - version: 이 버전으로 저장된 항목만 읽음
+    다른 인덱스 스냅샷/임베딩 백엔드/검색 방식을 쓰는 프로세스가 같은 파일을 함께 쓰므로
+    다른 버전 항목은 지우지 않고, 만료(ttl)나 LRU로 자연히 정리되게 둠
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, version="", ttl=24 * 60 * 60, max_entries=10000):
+        self.path = path
+        self.version = version
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # 이전 형식(key만 기본 키)은 버전끼리 서로 덮어쓰므로 새로 만듦 (캐시라서 버려도 됨)
+        primary_key = [row[1] for row in self._conn.execute("PRAGMA table_info(responses)") if row[5]]
+        if primary_key == ["key"]:
+            self._conn.execute("DROP TABLE responses")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT NOT NULL,
+                version TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (key, version)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses (created)")
+        self._conn.commit()
+
+    def get(self, chain_input):
+        key = make_cache_key(chain_input)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, created FROM responses WHERE key = ? AND version = ?",
+                (key, self.version)
+            ).fetchone()
+
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ? AND version = ?", (key, self.version))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                record_cache("response", False)
+                return None
+
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ? AND version = ?",
+                               (now, key, self.version))
+            self._conn.commit()
+            self.hits += 1
+            record_cache("response", True)
+            return row[0]
+
+    def put(self, chain_input, answer):
+        key = make_cache_key(chain_input)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, version, answer, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, self.version, answer, now, now)
+            )
+            # 만료된 항목은 버전과 관계없이 삭제 (더 이상 쓰지 않는 버전도 여기서 정리됨)
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            # 최대 개수를 넘으면 최근 사용 순으로 max_entries개만 남김
+            self._conn.execute("""
+                DELETE FROM responses WHERE rowid IN (
+                    SELECT rowid FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses WHERE version = ?",
+                                         (self.version,)).fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "version": self.version,
+        }
+
+
+class CachedChain:
+    """
+    ktas_chain 앞에 응답 캐시를 두는 래퍼 (invoke/stream 사용법은 원래 체인과 동일)
+    캐시에서 꺼낸 응답은 context 없이 answer/level과 cached=True만 반환
+    """
+
+    def __init__(self, chain, cache):
+        self.chain = chain
+        self.cache = cache
+
+    def invoke(self, chain_input, config=None):
+        answer = self.cache.get(chain_input)
+        if answer is not None:
+            return {**chain_input, "answer": answer, "level": parse_ktas_level(answer), "cached": True}
+
+        response = self.chain.invoke(chain_input, config=config)
+        self.cache.put(chain_input, response["answer"])
+        return {**response, "cached": False}
+
+    def stream(self, chain_input, config=None):
+        answer = self.cache.get(chain_input)
+        if answer is not None:
+            yield {"answer": answer, "cached": True}
+            return
+
+        parts = []
+        for chunk in self.chain.stream(chain_input, config=config):
+            if chunk.get("answer"):
+                parts.append(chunk["answer"])
+            yield chunk
+        # 끝까지 생성된 경우에만 저장 (중간에 끊긴 답변은 저장하지 않음)
+        if parts:
+            self.cache.put(chain_input, "".join(parts))
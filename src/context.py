@@ -0,0 +1,89 @@
+# 검색 문서 압축
+# 검색된 문서를 NACRS 코드별로 묶고 중복 설명을 제거해 짧은 형식으로 만든 뒤, 토큰 예산 안에서 프롬프트에 넣음
+import logging, re
+
+logger = logging.getLogger(__name__)
+
+PATIENT_TYPE_NAMES = {"adult": "성인", "pediatric": "소아"}
+CATEGORY_NAMES = {
+    "vital_signs_primary": "활력징후 1차",
+    "other_primary": "그 밖의 1차",
+    "symptom_secondary": "증상별 2차",
+}
+
+# 문서 머리 줄 (묶음 제목 [코드 제목 | 환자유형]으로 대신 표시)
+HEADER_PREFIXES = ("NACRS 코드:", "제목:", "환자 유형:", "카테고리:", "레벨:")
+
+_hangul = re.compile(r"[가-힣]")
+
+
+def estimate_tokens(text):
+    """
+    토크나이저 없이 쓰는 대략적인 토큰 수 (한글은 글자당 약 1토큰, 그 외는 4글자당 1토큰)
+    """
+    hangul = len(_hangul.findall(text))
+    return hangul + (len(text) - hangul + 3) // 4
+
+
+def _description(document):
+    # 항목 단위 문서는 '설명:' 줄만 사용하고, 그 외 문서(코드 단위 등)는 머리 줄을 뺀 본문 사용
+    lines = document.page_content.splitlines()
+    for line in lines:
+        if line.startswith("설명:"):
+            return line[len("설명:"):].strip()
+    return "\n".join(line for line in lines if not line.startswith(HEADER_PREFIXES)).strip()
+
+
+def group_documents(documents):
+    """
+    검색 순위를 유지하면서 (코드, 환자유형)별로 묶고, 카테고리/레벨별 설명 중복 제거
+    """
+    groups = {}
+    for document in documents:
+        metadata = document.metadata
+        group_key = (metadata.get("code"), metadata.get("patient_type"))
+        group = groups.setdefault(group_key, {"title": metadata.get("title"), "items": {}})
+        item_key = (metadata.get("category"), metadata.get("level"))
+        descriptions = group["items"].setdefault(item_key, [])
+        desc = _description(document)
+        if desc and desc not in descriptions:
+            descriptions.append(desc)
+    return groups
+
+
+def render_group(code, patient_type, group):
+    title = f" {group['title']}" if group["title"] else ""
+    lines = [f"[{code or '-'}{title} | {PATIENT_TYPE_NAMES.get(patient_type, patient_type or '-')}]"]
+    for (category, level), descriptions in group["items"].items():
+        if category is None and level is None:
+            lines.extend(descriptions)
+            continue
+        lines.append(f"{CATEGORY_NAMES.get(category, category)} L{level}: {'; '.join(descriptions)}")
+    return "\n".join(lines)
+
+
+def pack_documents(documents, max_tokens=800, token_counter=estimate_tokens):
+    """
+    문서를 압축 형식으로 렌더링하고 max_tokens를 넘지 않는 범위에서 순위가 높은 코드부터 포함
+    남은 예산보다 긴 묶음(코드 단위 문서 등)은 줄 단위로 뒤에서부터 잘라서 제목과 한 줄 이상이 들어가면 포함
+    """
+    blocks, used, dropped, truncated = [], 0, 0, 0
+    for (code, patient_type), group in group_documents(documents).items():
+        block = render_group(code, patient_type, group)
+        tokens = token_counter(block)
+        if used + tokens > max_tokens:
+            lines = block.splitlines()
+            while len(lines) > 2 and used + tokens > max_tokens:
+                lines.pop()
+                block = "\n".join(lines)
+                tokens = token_counter(block)
+            if used + tokens > max_tokens:
+                dropped += 1
+                continue
+            truncated += 1
+        blocks.append(block)
+        used += tokens
+
+    if dropped or truncated:
+        logger.info("컨텍스트 예산(%d토큰) 초과로 코드 묶음 %d개 제외, %d개 일부만 포함", max_tokens, dropped, truncated)
+    return "\n\n".join(blocks)
@@ -1,229 +1,97 @@
-from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
+# 벡터스토어 열기(질의 경로)와 인덱스 manifest
+# 가이드라인 추출/인덱스 생성은 src/indexing.py에 있으며, 인덱스를 새로 만들어야 할 때만 import
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_upstage import UpstageEmbeddings
-from langchain_core.documents import Document
-import re, os, json
+from src.embeddings import get_embeddings
+from src.telemetry import TimedEmbeddings
+import os, json, hashlib, logging
 
 load_dotenv()
 
-def extract_medical_codes_from_pptx(pptx_path, pediatric_start_page=None):
-      # 파일 존재 확인
-    if not os.path.exists(pptx_path):
-        print(f"파일을 찾을 수 없습니다: {pptx_path}")
-        print("현재 디렉토리:", os.getcwd())
-        print("디렉토리 내 파일:", os.listdir())
-        raise FileNotFoundError(f"파일을 찾을 수 없습니다: {pptx_path}")
+logger = logging.getLogger(__name__)
 
-    prs = Presentation(pptx_path)
+# 이전 코드 호환: from src.data import extract_medical_codes_from_pptx 등은 src.indexing에서 가져옴
+INDEXING_NAMES = (
+    "NACRS_PATTERN", "LEVEL_PATTERN", "CATEGORY_MARKERS",
+    "extract_medical_codes_from_pptx", "convert_to_documents", "sync_vectorstore", "save_to_json",
+)
 
-    if pediatric_start_page is not None:
-        print(f"소아 슬라이드 {pediatric_start_page}로 지정됨.")
 
-    # 구조화된 데이터 형식
-    organized_data = {}
+def __getattr__(name):
+    if name in INDEXING_NAMES:
+        from src import indexing
+        return getattr(indexing, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    # 중복 방지
-    processed_items = set()
 
-    for idx, slides in enumerate(prs.slides, 1):
-        # if idx < 191 or idx > 195:
-        #     continue
+# 문서 고유 ID (코드/환자유형/카테고리/레벨/설명이 같으면 항상 같은 ID)
+def make_document_id(code, patient_type, category, level, desc):
+    key = f"{code}|{patient_type}|{category}|{level}|{desc}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
 
-        print(f"\n=== 슬라이드 {idx} ===")
-        print(f"도형 수: {len(slides.shapes)}")   # 각 슬라이드의 도형수
-        nacrs_code = None
-        title = None
-        current_category = None
 
-        # 소아 시작 페이지가 있고, 그 페이지 이상 페이지라면 소아 페이지 지정
-        is_pediatric = (pediatric_start_page is not None and idx >= pediatric_start_page)
-        
-        # 슬라이드의 모든 도형에서 텍스트 추출
-        for shape in slides.shapes:
-            if shape.shape_type == MSO_SHAPE_TYPE.TABLE:
-                print("표 발견")
-                table = shape.table
-
-                # 표 처리 
-                for row in table.rows:
-                    row_text = " ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
-                    print(f"처리할 행: {row_text}")  # 디버깅용
-
-                    # 제목 찾기(대분류)
-                    if 'Coding System' in row_text:
-                        parts = row_text.split('Codes')
-                        if len(parts) > 1:
-                            title = parts[1].strip()
-                            print(f"제목: {title}")  # 디버깅용
-
-                    # NACRS 코드 먼저 찾기
-                    elif 'NACRS' in row_text:
-                        code_match = re.search(r'NACRS\s+(\d+)', row_text)
-                        if code_match:
-                            nacrs_code = code_match.group(1)
-                            print(f"NACRS 코드: {nacrs_code}")  # 디버깅용
-
-                        # 아직 나오지 않은 코드라면
-                        if nacrs_code and nacrs_code not in organized_data:
-                            organized_data[nacrs_code] = {
-                                'title' : title,
-                                'adult':{
-                                    'vital_signs_primary':{},
-                                    'other_primary':{},
-                                    'symptom_secondary':{}
-                                },
-                                'pediatric' : {
-                                    'vital_signs_primary':{},
-                                    'other_primary':{},
-                                    'symptom_secondary':{}
-                                }
-                            }
-                    
-                    # 카테고리 확인
-                    if '활력징후 1차 고려사항' in row_text:
-                        current_category = 'vital_signs_primary'
-                    elif '그 밖의 1차 고려사항' in row_text:
-                        current_category = 'other_primary'
-                    elif '증상별 2차 고려사항' in row_text:
-                        current_category = 'symptom_secondary'
-                    else:
-                        # 레벨과 설명 매칭
-                        level_matches = re.finditer(r'(\d+)\s+(.*?)(?=\s+\d+\s+|$)', row_text)
-                        for match in level_matches:
-                            # 현재 코드가 있고 카테고리가 있다면
-                            if nacrs_code and current_category:
-                                level = match.group(1)
-                                desc = match.group(2).strip()
-                                if desc:
-                                    # 성인/소아 구분하여 저장
-                                    patient_type = 'pediatric' if is_pediatric else 'adult'
-
-                                    # 중복 방지 위해 고유 키 생성
-                                    item_key = f"{nacrs_code}_{patient_type}_{current_category}_{level}_{desc}"
-                                    if item_key not in processed_items:
-                                        # 같은 레벨끼리 묶기 위해 고유 키 사용
-                                        if level not in organized_data[nacrs_code][patient_type][current_category]:
-                                            organized_data[nacrs_code][patient_type][current_category][level] = []
-
-                                        # 해당 레에 항목 추가
-                                        organized_data[nacrs_code][patient_type][current_category][level].append(desc)
-                                        processed_items.add(item_key)
-                                        print(f"항목 추가: {current_category} - 레벨 {level}, 설명 {desc}")
-                                    else:
-                                        print(f"중복 항목 건너뜀: {patient_type} - {current_category} - 레벨 {level}, 설명 {desc}")
-
-    return organized_data
-
-
-# 문서 변환
-def convert_to_documents(data):
+# 문서 내용 해시 (내용이나 메타데이터가 바뀌면 달라짐)
+def make_content_hash(document):
+    payload = document.page_content + "\n" + json.dumps(document.metadata, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+MANIFEST_NAME = "index_manifest.json"
+
+
+def load_manifest(persist_directory):
     """
-    추출된 의학 코드 데이터를 LangChain Document 객체 리스트로 변환
+    인덱스에 들어 있는 문서 목록(manifest) 읽기, 없으면 None
     """
-    documents = []
-    for code, code_data in data.items():
-        title = code_data.get('title')
-        
-        # 성인 데이터
-        for category_name, category_data in code_data['adult'].items():
-            for level, description in category_data.items():
-                for desc in description:
-                    # 각 항목을 문서로 변환
-                    content = f"NACRS 코드: {code}\n"
-                    content = f"제목: {title}\n"
-                    content = f"환자 유형: 성인\n"
-                    content = f"카테고리: {category_name}\n"
-                    content = f"레벨: {level}\n"
-                    content = f"설명: {desc}"
-
-                    # 메타데이터
-                    metadata = {
-                        "code": code,
-                        "title": title,
-                        "patient_type": "adult",
-                        "category": category_name,
-                        "level": level,
-                    }
-                    
-                    documents.append(Document(page_content=content, metadata=metadata))
-                    
-        # 소아 데이터 처리
-        for categroy_name, category_data in code_data['pediatric'].items():
-            for level, description in category_data.items():
-                for desc in description:
-                    # 각 항목을 문서로 변환
-                    # 각 항목을 문서로 변환
-                    content = f"NACRS 코드: {code}\n"
-                    content = f"제목: {title}\n"
-                    content = f"환자 유형: 소아\n"
-                    content = f"카테고리: {category_name}\n"
-                    content = f"레벨: {level}\n"
-                    content = f"설명: {desc}"
-                    
-                    # 메타데이터
-                    metadata = {
-                        "code": code,
-                        "title": title,
-                        "patient_type": "pediatric",
-                        "category": category_name,
-                        "level": level,
-                    }
-            
-                    documents.append(Document(page_content=content, metadata=metadata))
-                    
-    print(f"{len(documents)}개의 문서로 변환됨.")
-    return documents
-    
+    manifest_path = os.path.join(persist_directory, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(persist_directory, manifest):
+    # 임시 파일에 쓴 뒤 교체해서 중간에 깨진 manifest가 남지 않도록 함
+    os.makedirs(persist_directory, exist_ok=True)
+    manifest_path = os.path.join(persist_directory, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
 # vectorStore
-def get_vectorstore(pptx_path=None, pediatric_start_page=None):
-    # chroma db 경로 설정
-    persist_directory = "./chroma_db"
-
-    # embeddings
-    embeddings = UpstageEmbeddings(
-        api_key=os.getenv("UPSTAGE_API_KEY"),
-        model="embedding-passage"
-    )
-    
-    # 중복 방지
-    if os.path.exists(persist_directory):
-        print("기존 db 사용")
-        return Chroma(
-            persist_directory=persist_directory,
-            embedding_function=embeddings
-        )
-    else:
-        print("새로운 db 생성")
-        # 문서 준비 및 Vector Store 생성
-        if pptx_path is None:
-            pptx_path = "src/KTAS_guideline.pptx"
-        
-        # 데이터 추출
-        data = extract_medical_codes_from_pptx(pptx_path, pediatric_start_page)
-        
-        # 백업용
-        output_path = "의학코드_추출결과.json"
-        save_to_json(data, output_path)
-        
-        # 문서 변환
-        documents = convert_to_documents(data)
-        
-        return Chroma.from_documents(
-            documents=documents,
-            embedding=embeddings,
-            persist_directory=persist_directory
-        )
+def get_vectorstore(pptx_path=None, pediatric_start_page=None, embedding_backend=None, store=None, chunking=None,
+                    version=None):
+    """
+    벡터스토어 반환 (현재 스냅샷을 읽기 전용으로 열기, src/index_store.py 참고)
+    pptx_path를 지정하면 가이드라인을 다시 추출해서 바뀐 문서만 새 스냅샷에 반영하고 CURRENT를 교체
+    store: chroma(기본값) / numpy(메모리 맵 기반 NumPy 인덱스), 기본값은 KTAS_VECTORSTORE 환경변수
+    chunking: item(기준 문구 단위, 기본값) / code(NACRS 코드 단위), 기본값은 KTAS_CHUNKING 환경변수
+    version: 열 스냅샷 이름 (기본값 KTAS_INDEX_VERSION, 없으면 CURRENT)
+    """
+    from src.index_store import current_version, open_index, resolve_index_root
 
+    # embeddings (upstage / hashing, 기본값은 EMBEDDING_BACKEND 환경변수)
+    embedding_backend = embedding_backend or os.getenv("EMBEDDING_BACKEND", "upstage")
+    # 임베딩 시간은 요청별 단계 시간(query_embedding)으로 기록
+    embeddings = TimedEmbeddings(get_embeddings(embedding_backend))
+    store = store or os.getenv("KTAS_VECTORSTORE", "chroma")
+    chunking = chunking or os.getenv("KTAS_CHUNKING", "item")
 
+    # 인덱스 경로는 작업 디렉터리와 무관하게 프로젝트 루트(KTAS_INDEX_DIR) 기준
+    # (백엔드마다 벡터 차원이, 문서 단위마다 문서가 다르므로 인덱스를 분리)
+    index_root = resolve_index_root(store, embedding_backend, chunking)
 
-# json 변환
-def save_to_json(data, output_path):
-    # JSON 파일로 저장 (한글 인코딩 처리)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # 기존 인덱스가 있고 가이드라인 갱신 요청이 없으면 그대로 사용
+    if pptx_path is None and (version or current_version(index_root)):
+        print(f"기존 db 사용: {index_root}")
+        return open_index(index_root, embeddings, store, version)
 
+    # 가이드라인 추출/인덱스 생성은 필요할 때만 import
+    from src.indexing import build_vectorstore
+    embedding_model = getattr(embeddings, "model", embedding_backend)
+    return build_vectorstore(embeddings, index_root, store, pptx_path, pediatric_start_page, embedding_model,
+                             chunking)
 
 
 # 사용 예시
@@ -233,16 +101,8 @@ if __name__ == "__main__":
     pediatric_start_page = 192
 
     try:
-        # 데이터 추출
-        data = extract_medical_codes_from_pptx(pptx_path, pediatric_start_page)
-        
-        # json 저장
-        save_to_json(data, output_path)
-        
-        # 벡터 스토어 생성
+        # 데이터 추출, json 저장 후 바뀐 문서만 벡터 스토어에 반영
         vectorstore = get_vectorstore(pptx_path, pediatric_start_page)
         
     except Exception as e:
         print(f"오류 발생: {str(e)}")
-
-
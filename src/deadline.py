@@ -0,0 +1,265 @@
+# 마감 시간 기반 분류
+# 활력징후 규칙 평가와 검색(BM25 + dense)을 동시에 실행하고, LLM 호출에는 요청별 마감 시간을 둠
+# - hedge_after초 안에 LLM 응답이 없으면 같은 요청을 한 번 더 보내 먼저 온 답변을 사용 (선택)
+# - 마감 시간 안에 답변이 없거나 모두 실패하면 가이드라인 1차 고려사항(vital_signs_primary/other_primary)으로
+#   계산한 KTAS 추정치를 degraded=True로 표시해서 반환
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars, logging, re, threading, time
+
+from src.answer_parser import parse_ktas_level
+from src.rag_system import PEDIATRIC_AGE_MONTHS, retrieve_documents
+from src.scheduler import estimate_acuity
+from src.telemetry import metrics, record_stage
+from src.triage_rules import collect_criteria, parse_age_months
+
+logger = logging.getLogger(__name__)
+
+# 증상에서 통증 점수(NRS/VAS 0-10) 읽기: "NRS 8", "통증 7/10", "VAS: 9", "통증 점수 6", "통증 8점"
+# 점수 표시(NRS/VAS/통증 점수, /10, 점)가 있는 숫자만 읽음 ("통증 8시간 지속", "통증 3일"은 기간)
+_NOT_DURATION = r"(?!\d|\s*(?:시간|일|분|주|개월|달|년))"
+PAIN_PATTERNS = (
+    re.compile(r"(?:NRS|VAS|통증\s*점수)\s*[:=]?\s*(\d{1,2})" + _NOT_DURATION, re.I),
+    re.compile(r"통증\s*[:=]?\s*(\d{1,2})\s*(?:/\s*10(?!\d)|점)"),
+    re.compile(r"(?<![\d.])(\d{1,2})\s*/\s*10(?!\d)"),
+)
+# other_primary 기준 문구의 통증 범위: "(8-10)", "(<4)"
+PAIN_RANGE = re.compile(r"\((\d+)\s*-\s*(\d+)\)|\(<\s*(\d+)\)")
+
+HIGH_RISK_MECHANISM_KEYWORDS = ("추락", "교통사고", "보행자", "오토바이", "전복", "관통", "총상", "자상", "끼임")
+BLEEDING_DISORDER_KEYWORDS = ("혈우병", "항응고", "와파린", "warfarin", "헤파린", "혈소판감소", "출혈성 질환")
+
+
+def parse_pain_score(text):
+    for pattern in PAIN_PATTERNS:
+        match = pattern.search(text or "")
+        if match and 0 <= int(match.group(1)) <= 10:
+            return int(match.group(1))
+    return None
+
+
+def _pain_in_range(description, score):
+    match = PAIN_RANGE.search(description)
+    if not match:
+        return False
+    if match.group(3):
+        return score < int(match.group(3))
+    return int(match.group(1)) <= score <= int(match.group(2))
+
+
+def _find_keyword(text, keywords):
+    text = (text or "").lower()
+    return next((keyword for keyword in keywords if keyword.lower() in text), None)
+
+
+def _other_primary_criteria(data, patient_type, codes):
+    # 코드가 여러 개면 같은 기준 중 가장 급한(낮은) 레벨 사용, 코드를 모르면 전체 코드에서 가장 많이 쓰인 레벨
+    criteria = {}
+    for code in codes or [None]:
+        for description, level in collect_criteria(data, patient_type, code, "other_primary"):
+            criteria[description] = min(level, criteria.get(description, level))
+    return criteria
+
+
+def estimate_ktas(chain_input, data, decision, codes=None):
+    """
+    LLM 없이 계산하는 KTAS 추정치 {"level", "reasons"}
+    - 활력징후 1차 고려사항: 규칙 엔진 결과(KTAS 1/2), 그 밖의 활력징후 이상/의식 저하는 3, 정상은 4
+    - 그 밖의 1차 고려사항: 증상의 통증 점수, 고위험 사고기전, 출혈성 질환 + 출혈
+    codes: 검색된 문서의 NACRS 코드 (주증상을 좁히는 데 사용, 없으면 전체 코드 기준)
+    판단할 수 없는 항목은 더 급한 쪽으로 추정 (estimate_acuity는 활력징후를 읽지 못하면 3)
+    """
+    symptoms = chain_input.get("input") or ""
+    history = f"{chain_input.get('diseases') or ''} {chain_input.get('medications') or ''}"
+    months = parse_age_months(chain_input.get("age"))
+    patient_type = "pediatric" if months is not None and months < PEDIATRIC_AGE_MONTHS else "adult"
+    # 소아 기준이 추출되지 않은 경우 성인 기준 사용 (규칙 엔진과 같음)
+    criteria = _other_primary_criteria(data, patient_type, codes) or _other_primary_criteria(data, "adult", codes)
+
+    reasons = list(decision["reasons"])
+    pain = parse_pain_score(symptoms)
+    chronic = "만성" in symptoms
+    mechanism = _find_keyword(symptoms, HIGH_RISK_MECHANISM_KEYWORDS)
+    bleeding_disorder = _find_keyword(history, BLEEDING_DISORDER_KEYWORDS) if "출혈" in symptoms else None
+
+    for description, level in criteria.items():
+        finding = None
+        if pain is not None and "통증" in description and ("만성" in description) == chronic \
+                and _pain_in_range(description, pain):
+            finding = f"통증 점수 {pain}/10"
+        elif mechanism and "사고기전" in description:
+            finding = f"사고기전 '{mechanism}'"
+        elif bleeding_disorder and "출혈성 질환" in description and "경도" in description:
+            # 생명을 위협하는 출혈 여부는 활력징후 규칙(혈역학적 장애)으로 판단
+            finding = f"'{bleeding_disorder}' 환자의 출혈"
+        if finding:
+            reasons.append({"level": level, "criterion": description, "finding": finding})
+
+    acuity = estimate_acuity(decision)
+    if not any(reason["level"] <= acuity for reason in reasons):
+        vitals = decision["vitals"]
+        if acuity == 4:
+            finding = "활력징후 정상 범위"
+        elif all(value is None for value in (vitals.sbp, vitals.heart_rate, vitals.spo2, vitals.temperature, vitals.glucose)):
+            finding = "활력징후를 읽을 수 없음 (보수적으로 추정)"
+        else:
+            finding = "정상 범위 밖의 활력징후 또는 의식 저하"
+        reasons.append({"level": acuity, "criterion": "활력징후 1차 고려사항", "finding": finding})
+
+    return {"level": min(reason["level"] for reason in reasons), "reasons": sorted(reasons, key=lambda r: r["level"])}
+
+
+def format_estimate(estimate, reason):
+    """
+    추정 결과를 답변 형식으로 변환 (첫 줄 KTAS_LEVEL은 LLM 답변과 같음)
+    """
+    lines = [
+        f"KTAS_LEVEL: {estimate['level']}",
+        f"[자동 추정] {reason} 가이드라인 1차 고려사항으로 계산한 결과입니다. LLM 설명 없이 제공됩니다.",
+    ]
+    for item in estimate["reasons"]:
+        lines.append(f"- {item['criterion']} (KTAS {item['level']}): {item['finding']}")
+    lines.append("[주의사항] 자동 추정 결과이므로 반드시 의료진이 직접 재평가해야 합니다.")
+    return "\n".join(lines)
+
+
+class DeadlineTriage:
+    """
+    마감 시간이 있는 분류 실행기 (invoke 결과 형식은 ktas_chain과 같고 degraded/degraded_reason 키가 추가됨)
+    - retriever: 검색기 (hybrid면 BM25와 dense 검색도 서로 동시에 실행)
+    - answer_chain: context가 채워진 입력을 받아 답변 문자열을 반환하는 체인 (rag_system.create_document_chain)
+    - rule_engine: 활력징후 규칙 엔진 (data 속성의 가이드라인으로 추정치 계산)
+    - deadline: 요청 하나의 마감 시간(초)
+    - hedge_after: 이 시간(초) 안에 LLM 응답이 없으면 같은 요청을 한 번 더 보냄, None이면 보내지 않음
+    - cache: 응답 캐시 (자동 추정 결과는 저장하지 않음)
+    - retrieval_workers / llm_workers: 검색과 LLM 호출의 작업 스레드 수 (서로 다른 풀을 써서 LLM이 느려도 검색은 계속 실행)
+    - max_abandoned: 마감 후에도 끝나지 않은 LLM 호출이 이 수만큼 쌓여 있으면 새 호출 없이 바로 추정치로 대체
+    마감 후에도 진행 중인 LLM 호출은 중단할 수 없으므로 끝날 때까지 LLM 작업 스레드를 차지함
+    """
+
+    def __init__(self, retriever, answer_chain, rule_engine, deadline=10.0, hedge_after=None, cache=None,
+                 retrieval_workers=8, llm_workers=16, max_abandoned=None):
+        self.retriever = retriever
+        self.answer_chain = answer_chain
+        self.rule_engine = rule_engine
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.cache = cache
+        # 기본값은 LLM 작업 스레드의 절반 (나머지는 응답이 오는 요청에 남겨 둠)
+        self.max_abandoned = max(1, llm_workers // 2) if max_abandoned is None else max_abandoned
+        self._retrieval_pool = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="ktas-retrieval")
+        self._llm_pool = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="ktas-deadline-llm")
+        self._abandoned = 0
+        self._abandoned_lock = threading.Lock()
+
+    @staticmethod
+    def _submit(pool, func, *args):
+        # 요청 계측 컨텍스트를 작업 스레드에 전달
+        return pool.submit(contextvars.copy_context().run, func, *args)
+
+    def _abandon(self, future):
+        # 취소할 수 없는(이미 실행 중인) 호출은 끝날 때까지 개수를 세어 둠
+        if future.cancel() or future.done():
+            return
+        with self._abandoned_lock:
+            self._abandoned += 1
+            metrics.set_gauge("llm_abandoned_in_flight", self._abandoned)
+        future.add_done_callback(self._release_abandoned)
+
+    def _release_abandoned(self, future):
+        with self._abandoned_lock:
+            self._abandoned -= 1
+            metrics.set_gauge("llm_abandoned_in_flight", self._abandoned)
+
+    def _llm_saturated(self):
+        with self._abandoned_lock:
+            return self._abandoned >= self.max_abandoned
+
+    def _generate(self, chain_input, context, config, expires, deadline):
+        """
+        답변 문자열 반환, 마감 시간 안에 받지 못하면 (None, 사유)
+        """
+        if self._llm_saturated():
+            metrics.increment("llm_skipped_total")
+            return None, "응답이 늦은 LLM 호출이 많이 밀려 있어"
+        run_input = {**chain_input, "context": context}
+        attempts = [self._submit(self._llm_pool, self.answer_chain.invoke, run_input, config)]
+        hedge_at = time.perf_counter() + self.hedge_after if self.hedge_after is not None else None
+        error = None
+
+        while attempts:
+            now = time.perf_counter()
+            if now >= expires:
+                break
+            timeout = expires - now
+            if hedge_at is not None:
+                timeout = min(timeout, max(0.0, hedge_at - now))
+            done, pending = wait(attempts, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result(), None
+                except Exception as e:
+                    error = e
+                    logger.warning("LLM 호출 실패: %s", e)
+            attempts = list(pending)
+            if not attempts and hedge_at is not None:
+                # 첫 요청이 실패했으면 기다리지 않고 바로 다시 보냄
+                hedge_at = time.perf_counter()
+            if hedge_at is not None and time.perf_counter() >= hedge_at and not self._llm_saturated():
+                # 한 번만 추가로 보냄
+                hedge_at = None
+                metrics.increment("llm_hedged_total")
+                logger.info("LLM 응답 지연, 같은 요청을 한 번 더 보냄")
+                attempts.append(self._submit(self._llm_pool, self.answer_chain.invoke, run_input, config))
+
+        for future in attempts:
+            self._abandon(future)
+        if error is not None and not attempts:
+            return None, f"LLM 호출이 실패해서({type(error).__name__})"
+        return None, f"LLM 응답이 제한 시간({deadline:g}초) 안에 오지 않아"
+
+    def invoke(self, chain_input, config=None, deadline=None, started=None):
+        """
+        deadline: 이 요청의 마감 시간(초, 기본값은 생성 시 지정값)
+        started: 마감 시간 계산 기준 시각(time.perf_counter, 대기열에서 기다린 시간을 포함할 때 지정)
+        """
+        deadline = self.deadline if deadline is None else deadline
+        expires = (started or time.perf_counter()) + deadline
+
+        if self.cache is not None:
+            answer = self.cache.get(chain_input)
+            if answer is not None:
+                return {**chain_input, "answer": answer, "level": parse_ktas_level(answer), "cached": True,
+                        "degraded": False}
+
+        # 1. 활력징후 규칙 평가와 검색을 동시에 실행
+        start = time.perf_counter()
+        retrieval = self._submit(self._retrieval_pool, retrieve_documents, self.retriever, chain_input, config)
+        decision = self.rule_engine.evaluate(chain_input.get("vital_signs"), chain_input.get("consciousness"),
+                                             chain_input.get("age"), chain_input.get("diseases"))
+        context, reason = None, None
+        try:
+            context = retrieval.result(timeout=max(0.0, expires - time.perf_counter()))
+        except Exception as e:
+            reason = (f"검색이 제한 시간({deadline:g}초) 안에 끝나지 않아" if not retrieval.done()
+                      else f"검색이 실패해서({type(e).__name__})")
+        record_stage("retrieval", time.perf_counter() - start)
+
+        # 2. 남은 시간 안에서 LLM 답변 생성
+        answer = None
+        if context is not None:
+            answer, reason = self._generate(chain_input, context, config, expires, deadline)
+
+        if answer is not None:
+            if self.cache is not None:
+                self.cache.put(chain_input, answer)
+            return {**chain_input, "context": context, "answer": answer, "level": parse_ktas_level(answer),
+                    "cached": False, "degraded": False}
+
+        # 3. 가이드라인 기준 추정치로 대체
+        codes = sorted({document.metadata.get("code") for document in context or [] if document.metadata.get("code")})
+        estimate = estimate_ktas(chain_input, self.rule_engine.data, decision, codes)
+        metrics.increment("triage_degraded_total", level=estimate["level"])
+        logger.warning("분류 결과를 추정치로 대체: KTAS %d (%s)", estimate["level"], reason)
+        return {**chain_input, "context": context or [], "answer": format_estimate(estimate, reason),
+                "level": estimate["level"], "cached": False, "degraded": True, "degraded_reason": reason,
+                "estimate": estimate}
@@ -0,0 +1,219 @@
+# 임베딩 백엔드 선택
+# upstage: Upstage API (네트워크 필요) / hashing: 로컬 CPU 해시 n-gram (오프라인)
+from langchain_core.embeddings import Embeddings
+from dotenv import load_dotenv
+from array import array
+from src.telemetry import record_cache
+import hashlib, logging, math, os, re, sqlite3, threading, time, zlib
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("upstage", "hashing")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_EMBEDDING_CACHE_PATH = os.path.join(ROOT_DIR, "embedding_cache.sqlite3")
+
+_whitespace = re.compile(r"\s+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    문자 n-gram을 고정 크기 벡터로 해싱하는 로컬 임베딩
+    한국어는 띄어쓰기/조사 변화가 많아 단어 대신 문자 n-gram을 사용
+    학습이 필요 없으므로 인덱스 생성과 질의 임베딩 모두 오프라인으로 동작
+    """
+
+    def __init__(self, n_features=1024, ngram_range=(1, 3)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.model = f"hashing-{n_features}-{ngram_range[0]}-{ngram_range[1]}"
+
+    def _ngrams(self, text):
+        text = _whitespace.sub(" ", text.lower()).strip()
+        min_n, max_n = self.ngram_range
+        for word in text.split(" "):
+            # 단어 경계를 구분하기 위해 앞뒤에 공백 추가
+            padded = f" {word} "
+            for n in range(min_n, max_n + 1):
+                for i in range(len(padded) - n + 1):
+                    gram = padded[i:i + n]
+                    if gram.strip():
+                        yield gram
+
+    def _embed(self, text):
+        # 0이 아닌 차원만 모아서 계산한 뒤 마지막에 고정 크기 벡터로 변환
+        counts = {}
+        n_features = self.n_features
+        for gram in self._ngrams(text):
+            h = zlib.crc32(gram.encode("utf-8"))
+            # 해시 충돌 상쇄를 위해 상위 비트로 부호 결정
+            idx = h % n_features
+            counts[idx] = counts.get(idx, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        vector = [0.0] * n_features
+        for idx, value in counts.items():
+            vector[idx] = value / norm
+        return vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    임베딩 결과를 디스크(SQLite)에 저장하는 래퍼
+    - 키: 모델 이름 + 용도(passage/query) + 텍스트 해시
+    - 캐시에 없는 텍스트만 batch_size개 / max_batch_chars자 이하 묶음으로 요청하고, 실패 시 지수 백오프로 재시도
+    가이드라인 일부만 바뀐 경우 재색인 비용은 바뀐 문서만큼만 발생
+    """
+
+    def __init__(self, embeddings, path=DEFAULT_EMBEDDING_CACHE_PATH, batch_size=100, max_batch_chars=20000,
+                 max_retries=3, backoff=1.0):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, key)
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, model, keys):
+        found = {}
+        keys = list(set(keys))
+        with self._lock:
+            # SQLite 변수 개수 제한을 넘지 않도록 나눠서 조회
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk]
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def _store(self, model, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                [(model, key, array("f", vector).tobytes()) for key, vector in items]
+            )
+            self._conn.commit()
+
+    def _batches(self, texts):
+        batch, chars = [], 0
+        for text in texts:
+            if batch and (len(batch) >= self.batch_size or chars + len(text) > self.max_batch_chars):
+                yield batch
+                batch, chars = [], 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            yield batch
+
+    def _with_retry(self, func, *args):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                logger.warning("임베딩 요청 실패 (%s), %.1f초 후 재시도 %d/%d", e, delay, attempt + 1, self.max_retries)
+                time.sleep(delay)
+
+    def embed_documents(self, texts):
+        model = f"{self.model}:passage"
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(model, keys)
+
+        # 캐시에 없는 텍스트만 중복 없이 요청
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        cached = sum(1 for key in keys if key in found)
+        self.hits += cached
+        self.misses += len(keys) - cached
+        record_cache("embedding", cached == len(keys))
+
+        pending = list(missing.items())
+        done = 0
+        for batch in self._batches([text for _, text in pending]):
+            vectors = self._with_retry(self.embeddings.embed_documents, batch)
+            batch_items = [(key, vector) for (key, _), vector in zip(pending[done:done + len(batch)], vectors)]
+            self._store(model, batch_items)
+            found.update(batch_items)
+            done += len(batch)
+
+        if missing:
+            logger.info("문서 임베딩: 캐시 %d개, 새로 요청 %d개", cached, len(missing))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        model = f"{self.model}:query"
+        key = self._key(text)
+        found = self._lookup(model, [key])
+        if key in found:
+            self.hits += 1
+            record_cache("embedding", True)
+            return found[key]
+
+        self.misses += 1
+        record_cache("embedding", False)
+        vector = self._with_retry(self.embeddings.embed_query, text)
+        self._store(model, [(key, vector)])
+        return vector
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def get_embeddings(backend=None):
+    """
+    임베딩 백엔드 생성 (지정하지 않으면 EMBEDDING_BACKEND 환경변수, 기본값 upstage)
+    upstage는 KTAS_EMBEDDING_CACHE=0이 아니면 디스크 캐시를 씌워서 반환
+    """
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "upstage")
+
+    if backend == "upstage":
+        from langchain_upstage import UpstageEmbeddings
+        embeddings = UpstageEmbeddings(
+            api_key=os.getenv("UPSTAGE_API_KEY"),
+            model="embedding-passage"
+        )
+        if os.getenv("KTAS_EMBEDDING_CACHE", "1") == "0":
+            return embeddings
+        return CachedEmbeddings(embeddings, path=os.getenv("KTAS_EMBEDDING_CACHE_PATH", DEFAULT_EMBEDDING_CACHE_PATH))
+    if backend == "hashing":
+        return HashingEmbeddings()
+
+    raise ValueError(f"지원하지 않는 임베딩 백엔드: {backend} (가능: {', '.join(EMBEDDING_BACKENDS)})")
@@ -0,0 +1,211 @@
+# 가이드라인 저장소 (SQLite)
+# 의학코드_추출결과.json(코드 -> 환자유형 -> 카테고리 -> 레벨 -> 설명 목록)을 행 단위로 정규화해서 저장하고
+# 코드/환자유형/카테고리/레벨 인덱스로 필요한 기준만 조회
+# python -m src.guideline_store --migrate 의학코드_추출결과.json
+# python -m src.guideline_store --code 003 --patient-type adult --category vital_signs_primary --level 1 2
+from dotenv import load_dotenv
+import argparse, hashlib, json, logging, os, sqlite3, threading
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUIDELINE_JSON = os.path.join(ROOT_DIR, "의학코드_추출결과.json")
+DEFAULT_GUIDELINE_DB = os.path.join(ROOT_DIR, "guideline.sqlite3")
+
+PATIENT_TYPES = ("adult", "pediatric")
+CATEGORIES = ("vital_signs_primary", "other_primary", "symptom_secondary")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS codes (
+    code TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS criteria (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL REFERENCES codes(code),
+    patient_type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS criteria_lookup ON criteria (code, patient_type, category, level);
+CREATE INDEX IF NOT EXISTS criteria_by_category ON criteria (patient_type, category, level);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class GuidelineStore:
+    """
+    정규화된 가이드라인 저장소
+    - criteria(): 조건에 맞는 기준 행 목록 (코드/환자유형/카테고리/레벨 인덱스 사용)
+    - get(): 코드 하나를 JSON과 같은 중첩 dict로 반환
+    - to_dict(): 전체를 JSON과 같은 형태로 복원 (기존 convert_to_documents 등에 그대로 전달 가능)
+    여러 스레드(서버 스케줄러, 일괄 평가)에서 함께 쓰므로 연결 하나를 잠금으로 보호
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("KTAS_GUIDELINE_DB", DEFAULT_GUIDELINE_DB)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def import_data(self, data, source_hash=None):
+        """
+        추출 결과(dict)로 저장소 내용을 통째로 교체 (한 트랜잭션)
+        """
+        code_rows, criteria_rows = [], []
+        for position, (code, entry) in enumerate(data.items()):
+            code_rows.append((code, entry.get("title", ""), position))
+            for patient_type in PATIENT_TYPES:
+                for category, levels in entry.get(patient_type, {}).items():
+                    for level, descriptions in levels.items():
+                        for description in descriptions:
+                            criteria_rows.append((code, patient_type, category, int(level), description))
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM criteria")
+            self._conn.execute("DELETE FROM codes")
+            self._conn.executemany("INSERT INTO codes (code, title, position) VALUES (?, ?, ?)", code_rows)
+            self._conn.executemany(
+                "INSERT INTO criteria (code, patient_type, category, level, description) VALUES (?, ?, ?, ?, ?)",
+                criteria_rows
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source_hash', ?)",
+                               (source_hash or "",))
+        logger.info("가이드라인 저장: 코드 %d개, 기준 %d개", len(code_rows), len(criteria_rows))
+        return {"codes": len(code_rows), "criteria": len(criteria_rows)}
+
+    def source_hash(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'source_hash'").fetchone()
+        return row["value"] if row else None
+
+    def codes(self):
+        """
+        [(코드, 제목)] (추출 순서)
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT code, title FROM codes ORDER BY position").fetchall()
+        return [(row["code"], row["title"]) for row in rows]
+
+    def title(self, code):
+        with self._lock:
+            row = self._conn.execute("SELECT title FROM codes WHERE code = ?", (code,)).fetchone()
+        return row["title"] if row else None
+
+    def criteria(self, code=None, patient_type=None, category=None, levels=None):
+        """
+        조건에 맞는 기준 목록 [{"code", "patient_type", "category", "level", "description"}] (추출 순서)
+        예: criteria("003", "adult", "vital_signs_primary", levels=(1, 2))
+        """
+        clauses, params = [], []
+        for column, value in (("code", code), ("patient_type", patient_type), ("category", category)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if levels is not None:
+            levels = [int(level) for level in ([levels] if isinstance(levels, (int, str)) else levels)]
+            clauses.append(f"level IN ({','.join('?' * len(levels))})")
+            params.extend(levels)
+
+        query = "SELECT code, patient_type, category, level, description FROM criteria"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def _nest(self, titles, rows):
+        data = {}
+        for code, title in titles:
+            data[code] = {"title": title, **{
+                patient_type: {category: {} for category in CATEGORIES} for patient_type in PATIENT_TYPES
+            }}
+        for row in rows:
+            levels = data[row["code"]][row["patient_type"]].setdefault(row["category"], {})
+            levels.setdefault(str(row["level"]), []).append(row["description"])
+        return data
+
+    def get(self, code):
+        """
+        코드 하나를 JSON과 같은 형태로 반환, 없으면 None
+        """
+        title = self.title(code)
+        if title is None:
+            return None
+        return self._nest([(code, title)], self.criteria(code))[code]
+
+    def to_dict(self):
+        return self._nest(self.codes(), self.criteria())
+
+    def stats(self):
+        with self._lock:
+            codes = self._conn.execute("SELECT COUNT(*) FROM codes").fetchone()[0]
+            criteria = self._conn.execute("SELECT COUNT(*) FROM criteria").fetchone()[0]
+        return {"path": self.path, "codes": codes, "criteria": criteria}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_json(json_path=GUIDELINE_JSON, db_path=None):
+    """
+    기존 JSON 추출 결과를 저장소로 옮김
+    """
+    with open(json_path, encoding="utf-8") as f:
+        data = json.load(f)
+    store = GuidelineStore(db_path)
+    store.import_data(data, file_hash(json_path))
+    return store
+
+
+def open_guideline_store(db_path=None, json_path=GUIDELINE_JSON):
+    """
+    저장소 열기
+    JSON 백업이 있고 저장소가 비었거나 다른 JSON에서 만들어졌으면 다시 옮김
+    """
+    store = GuidelineStore(db_path)
+    if os.path.exists(json_path):
+        source_hash = file_hash(json_path)
+        if store.source_hash() != source_hash:
+            with open(json_path, encoding="utf-8") as f:
+                store.import_data(json.load(f), source_hash)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="가이드라인 저장소 변환/조회")
+    parser.add_argument("--db", default=None, help="저장소 경로 (기본값 KTAS_GUIDELINE_DB)")
+    parser.add_argument("--migrate", default=None, metavar="JSON", help="JSON 추출 결과를 저장소로 옮김")
+    parser.add_argument("--code", default=None)
+    parser.add_argument("--patient-type", choices=PATIENT_TYPES, default=None)
+    parser.add_argument("--category", choices=CATEGORIES, default=None)
+    parser.add_argument("--level", type=int, nargs="+", default=None)
+    args = parser.parse_args()
+
+    if args.migrate:
+        store = migrate_json(args.migrate, args.db)
+        print(f"저장소 생성: {store.stats()}")
+        return
+
+    store = open_guideline_store(args.db)
+    for row in store.criteria(args.code, args.patient_type, args.category, args.level):
+        print(f"{row['code']} {row['patient_type']} {row['category']} KTAS {row['level']}: {row['description']}")
+
+
+if __name__ == "__main__":
+    main()
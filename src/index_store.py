@@ -0,0 +1,259 @@
+# 버전별 인덱스 스냅샷과 읽기 전용 열기
+# 인덱스 경로는 현재 작업 디렉터리가 아니라 프로젝트 루트(또는 KTAS_INDEX_DIR) 기준으로 정함
+# 인덱스를 만들 때마다 versions/<버전>/ 아래에 새 스냅샷을 만들고, 완성된 뒤 CURRENT 파일을 원자적으로 교체
+# - 만들어진 스냅샷은 수정하지 않으므로 여러 프로세스(Streamlit, 서버, 작업 프로세스)가 같은 스냅샷을
+#   쓰기 잠금 경합 없이 읽기 전용으로 공유 (NumPy 인덱스는 메모리 맵으로 페이지 캐시까지 공유)
+# - 읽는 쪽은 CURRENT가 바뀌면 재시작 없이 새 스냅샷으로 넘어감 (src/resources.py의 refresh_index)
+# - KTAS_INDEX_VERSION으로 특정 스냅샷을 고정할 수 있음
+# - 교체된 이전 스냅샷은 close_index로 닫음 (Chroma는 경로별로 공유되는 시스템과 SQLite 연결을 멈춤)
+#
+# 읽기 전용의 한계: NumPy 인덱스는 임베딩 행렬을 읽기 전용 메모리 맵으로 열지만, Chroma에는 읽기 전용 모드가 없어서
+# 쓰기 가능한 PersistentClient로 연 뒤 벡터스토어의 쓰기 메서드(add_texts, delete 등)만 막음
+# 따라서 벡터스토어를 거치지 않고 _collection/_client로 직접 쓰는 코드나 다른 프로세스의 쓰기는 막지 못하며,
+# 스냅샷을 고치지 않는다는 약속(새 내용은 항상 새 스냅샷으로)에 기대고 있음
+#
+# <인덱스 루트>/
+#   CURRENT                 현재 스냅샷 이름 (<생성 시각(마이크로초까지)>-<manifest 버전>, 이름 순서 = 생성 순서)
+#   versions/<스냅샷 이름>/  인덱스 파일 + index_manifest.json
+#
+# python -m src.index_store --store numpy --list
+# python -m src.index_store --store numpy --activate 20261018T120000123456-0123456789abcdef
+# python -m src.index_store --store numpy --prune --keep 3
+from datetime import datetime
+import argparse, logging, os, shutil, uuid
+
+from src.data import MANIFEST_NAME, load_manifest
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+# CURRENT 없이 루트에 바로 만들어진 이전 형식 인덱스
+LEGACY_VERSION = "legacy"
+LEGACY_FILES = ("chroma.sqlite3", "embeddings.npy")
+# 새 스냅샷을 만든 뒤 남겨 둘 스냅샷 수 (이전 스냅샷을 아직 읽고 있는 프로세스가 있을 수 있음)
+DEFAULT_KEEP = 3
+
+WRITE_METHODS = ("add_texts", "add_documents", "aadd_texts", "aadd_documents", "delete", "adelete",
+                 "update_document", "update_documents")
+
+
+class ReadOnlyIndexError(RuntimeError):
+    pass
+
+
+def index_base_dir():
+    return os.path.abspath(os.getenv("KTAS_INDEX_DIR", ROOT_DIR))
+
+
+def resolve_index_root(store="chroma", embedding_backend="upstage", chunking="item", base_dir=None):
+    """
+    인덱스 루트 절대 경로 (백엔드/문서 단위가 다르면 벡터 차원이나 문서가 다르므로 인덱스를 분리)
+    """
+    name = "chroma_db" if store == "chroma" else f"{store}_index"
+    if embedding_backend != "upstage":
+        name = f"{name}_{embedding_backend}"
+    if chunking != "item":
+        name = f"{name}_{chunking}"
+    return os.path.join(base_dir or index_base_dir(), name)
+
+
+def snapshot_path(root, version):
+    return root if version == LEGACY_VERSION else os.path.join(root, VERSIONS_DIR, version)
+
+
+def current_version(root, pinned=True):
+    """
+    읽을 스냅샷 이름 (KTAS_INDEX_VERSION 고정 > CURRENT > 이전 형식 인덱스), 인덱스가 없으면 None
+    pinned=False면 고정값을 무시하고 CURRENT 기준
+    """
+    if pinned and os.getenv("KTAS_INDEX_VERSION"):
+        return os.getenv("KTAS_INDEX_VERSION")
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            version = f.read().strip()
+        if version:
+            return version
+    except FileNotFoundError:
+        pass
+    if any(os.path.exists(os.path.join(root, name)) for name in LEGACY_FILES):
+        return LEGACY_VERSION
+    return None
+
+
+def list_versions(root):
+    """
+    [{"version", "current", "count", "embedding_model", "updated"}] (오래된 순)
+    """
+    versions_dir = os.path.join(root, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    current = current_version(root, pinned=False)
+    versions = []
+    for name in sorted(os.listdir(versions_dir)):
+        manifest = load_manifest(os.path.join(versions_dir, name))
+        # 만드는 중이거나 실패한 스냅샷(.staging-*)은 manifest가 없거나 이름이 점으로 시작
+        if name.startswith(".") or manifest is None:
+            continue
+        versions.append({
+            "version": name,
+            "current": name == current,
+            "count": manifest.get("count"),
+            "embedding_model": manifest.get("embedding_model"),
+            "updated": manifest.get("updated"),
+        })
+    return versions
+
+
+def new_snapshot(root):
+    """
+    새 스냅샷을 만들 작업 디렉터리 반환
+    현재 스냅샷 내용을 복사해 두므로 바뀐 문서만 다시 임베딩하면 됨 (읽고 있는 스냅샷은 건드리지 않음)
+    """
+    staging = os.path.join(root, VERSIONS_DIR, f".staging-{uuid.uuid4().hex[:8]}")
+    version = current_version(root, pinned=False)
+    if version is None:
+        os.makedirs(staging)
+    else:
+        shutil.copytree(snapshot_path(root, version), staging,
+                        ignore=shutil.ignore_patterns(VERSIONS_DIR, CURRENT_FILE, "*.tmp"))
+    return staging
+
+
+def _write_current(root, version):
+    # 임시 파일에 쓴 뒤 교체해서 읽는 쪽이 중간 상태를 보지 않도록 함
+    tmp_path = os.path.join(root, f"{CURRENT_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def publish_snapshot(root, staging, keep=None):
+    """
+    작업 디렉터리를 스냅샷으로 확정하고 CURRENT를 교체, 오래된 스냅샷 정리 후 스냅샷 이름 반환
+    """
+    manifest = load_manifest(staging)
+    if manifest is None:
+        raise ValueError(f"{MANIFEST_NAME}이 없는 스냅샷은 게시할 수 없음: {staging}")
+    version = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{manifest['version']}"
+    target = os.path.join(root, VERSIONS_DIR, version)
+    if os.path.exists(target):
+        version = f"{version}-{uuid.uuid4().hex[:4]}"
+        target = os.path.join(root, VERSIONS_DIR, version)
+    os.rename(staging, target)
+    _write_current(root, version)
+    logger.info("인덱스 스냅샷 교체: %s (문서 %s개)", version, manifest.get("count"))
+    prune(root, keep)
+    return version
+
+
+def activate(root, version):
+    """
+    CURRENT를 기존 스냅샷으로 되돌림
+    """
+    if load_manifest(snapshot_path(root, version)) is None:
+        raise FileNotFoundError(f"스냅샷이 없음: {version}")
+    _write_current(root, version)
+
+
+def prune(root, keep=None):
+    """
+    최근 keep개와 현재 스냅샷만 남기고 삭제 (기본값 KTAS_INDEX_KEEP, 없으면 3)
+    """
+    keep = keep if keep is not None else int(os.getenv("KTAS_INDEX_KEEP", str(DEFAULT_KEEP)))
+    versions = list_versions(root)
+    removed = []
+    for entry in versions[:max(0, len(versions) - keep)]:
+        if entry["current"]:
+            continue
+        shutil.rmtree(os.path.join(root, VERSIONS_DIR, entry["version"]), ignore_errors=True)
+        removed.append(entry["version"])
+    if removed:
+        logger.info("오래된 인덱스 스냅샷 삭제: %s", ", ".join(removed))
+    return removed
+
+
+def _refuse_writes(vectorstore):
+    # 스냅샷은 여러 프로세스가 공유하므로 쓰기 메서드를 막음 (새 문서는 src.indexing으로 새 스냅샷을 만들어 반영)
+    def refuse(*args, **kwargs):
+        raise ReadOnlyIndexError("읽기 전용 인덱스 스냅샷입니다. python -m src.indexing으로 새 스냅샷을 만드세요.")
+
+    for name in WRITE_METHODS:
+        if hasattr(vectorstore, name):
+            setattr(vectorstore, name, refuse)
+    return vectorstore
+
+
+def open_index(root, embeddings, store="chroma", version=None):
+    """
+    스냅샷을 읽기 전용으로 열기 (version을 생략하면 current_version)
+    반환된 벡터스토어의 index_snapshot 속성에 {"root", "version"} 기록
+    """
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"인덱스가 없음: {root} (python -m src.indexing으로 생성)")
+    path = snapshot_path(root, version)
+    if version != LEGACY_VERSION and load_manifest(path) is None:
+        raise FileNotFoundError(f"스냅샷이 없거나 완성되지 않음: {path}")
+
+    if store == "numpy":
+        from src.numpy_store import NumpyVectorStore
+        # 임베딩 행렬은 읽기 전용 메모리 맵
+        vectorstore = NumpyVectorStore.load(path, embeddings)
+    else:
+        from langchain_chroma import Chroma
+        vectorstore = Chroma(persist_directory=path, embedding_function=embeddings)
+    vectorstore.index_snapshot = {"root": root, "version": version}
+    logger.info("인덱스 스냅샷 열기: %s", path)
+    return _refuse_writes(vectorstore)
+
+
+def close_index(vectorstore):
+    """
+    더 이상 쓰지 않는 스냅샷 닫기
+    Chroma는 같은 경로의 클라이언트가 프로세스 안에서 시스템(SQLite 연결 등)을 공유하므로 그 시스템을 멈추고
+    공유 목록에서 빼서, 같은 스냅샷을 다시 열면 새로 만들어지게 함 (이 경로를 아직 쓰는 벡터스토어가 없어야 함)
+    NumPy 인덱스는 참조가 없어지면 메모리 맵이 닫히므로 따로 할 일이 없음
+    """
+    client = getattr(vectorstore, "_client", None)
+    identifier = getattr(client, "_identifier", None)
+    if identifier is None:
+        return False
+    from chromadb.api.shared_system_client import SharedSystemClient
+    system = SharedSystemClient._identifier_to_system.pop(identifier, None)
+    if system is None:
+        return False
+    system.stop()
+    logger.info("인덱스 스냅샷 닫기: %s", identifier)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="인덱스 스냅샷 조회/교체/정리")
+    parser.add_argument("--store", default=None, help="chroma / numpy (기본값 KTAS_VECTORSTORE)")
+    parser.add_argument("--embedding", default=None, help="upstage / hashing (기본값 EMBEDDING_BACKEND)")
+    parser.add_argument("--chunking", default=None, help="item / code (기본값 KTAS_CHUNKING)")
+    parser.add_argument("--list", action="store_true", help="스냅샷 목록")
+    parser.add_argument("--activate", default=None, metavar="VERSION", help="CURRENT를 이 스냅샷으로 교체")
+    parser.add_argument("--prune", action="store_true", help="오래된 스냅샷 삭제")
+    parser.add_argument("--keep", type=int, default=None, help="--prune에서 남길 스냅샷 수")
+    args = parser.parse_args()
+
+    root = resolve_index_root(args.store or os.getenv("KTAS_VECTORSTORE", "chroma"),
+                              args.embedding or os.getenv("EMBEDDING_BACKEND", "upstage"),
+                              args.chunking or os.getenv("KTAS_CHUNKING", "item"))
+    if args.activate:
+        activate(root, args.activate)
+        print(f"CURRENT -> {args.activate}")
+    if args.prune:
+        print(f"삭제: {prune(root, args.keep) or '없음'}")
+    if args.list or not (args.activate or args.prune):
+        print(f"인덱스 루트: {root} (현재 {current_version(root) or '없음'})")
+        for entry in list_versions(root):
+            print(f"{'*' if entry['current'] else ' '} {entry['version']} 문서 {entry['count']}개 "
+                  f"({entry['embedding_model']}, {entry['updated']})")
+
+
+if __name__ == "__main__":
+    main()
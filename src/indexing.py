@@ -0,0 +1,397 @@
+# 가이드라인 추출/인덱싱 경로
+# PPTX 추출 -> Document 변환 -> 벡터스토어 생성/증분 갱신
+# 질의 경로(src/data.py의 get_vectorstore로 기존 인덱스 열기)에서는 import하지 않으므로 pptx 등 무거운 모듈을 시작 시 읽지 않음
+# python -m src.indexing --pptx src/KTAS_guideline.pptx --pediatric-start-page 192
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from langchain_core.documents import Document
+from src.guideline_store import GUIDELINE_JSON, ROOT_DIR, GuidelineStore, file_hash
+from src.index_store import close_index, new_snapshot, open_index, publish_snapshot
+from src.data import load_manifest, make_content_hash, make_document_id, save_manifest
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse, re, os, json, hashlib, logging, shutil, time
+
+logger = logging.getLogger(__name__)
+
+# 행 처리에 쓰는 정규식 (미리 컴파일)
+NACRS_PATTERN = re.compile(r'NACRS\s+(\d+)')
+LEVEL_PATTERN = re.compile(r'(\d+)\s+(.*?)(?=\s+\d+\s+|$)')
+
+CATEGORY_MARKERS = (
+    ('활력징후 1차 고려사항', 'vital_signs_primary'),
+    ('그 밖의 1차 고려사항', 'other_primary'),
+    ('증상별 2차 고려사항', 'symptom_secondary'),
+)
+
+
+def _extract_slide_events(slide, is_pediatric):
+    """
+    슬라이드 한 장에서 (코드 발견, 항목 발견) 이벤트를 순서대로 추출
+    코드/제목/카테고리는 슬라이드마다 새로 시작하므로 슬라이드끼리는 독립적으로 처리 가능
+    """
+    events = []
+    nacrs_code = None
+    title = None
+    current_category = None
+    patient_type = 'pediatric' if is_pediatric else 'adult'
+
+    # 슬라이드의 모든 도형에서 텍스트 추출
+    for shape in slide.shapes:
+        if shape.shape_type != MSO_SHAPE_TYPE.TABLE:
+            continue
+
+        # 표 처리
+        for row in shape.table.rows:
+            row_text = " ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
+            logger.debug("처리할 행: %s", row_text)
+
+            # 제목 찾기(대분류)
+            if 'Coding System' in row_text:
+                parts = row_text.split('Codes')
+                if len(parts) > 1:
+                    title = parts[1].strip()
+
+            # NACRS 코드 먼저 찾기
+            elif 'NACRS' in row_text:
+                code_match = NACRS_PATTERN.search(row_text)
+                if code_match:
+                    nacrs_code = code_match.group(1)
+                if nacrs_code:
+                    events.append(('code', nacrs_code, title))
+
+            # 카테고리 확인
+            for marker, category in CATEGORY_MARKERS:
+                if marker in row_text:
+                    current_category = category
+                    break
+            else:
+                # 현재 코드와 카테고리가 있을 때만 레벨과 설명 매칭
+                if nacrs_code and current_category:
+                    for match in LEVEL_PATTERN.finditer(row_text):
+                        desc = match.group(2).strip()
+                        if desc:
+                            events.append(('item', nacrs_code, patient_type, current_category, match.group(1), desc))
+
+    return events
+
+
+def _extract_slide_range(pptx_path, start, end, pediatric_start_page):
+    """
+    작업 프로세스용: start~end 슬라이드(1부터 시작, end 포함)의 이벤트 추출
+    """
+    prs = Presentation(pptx_path)
+    results = []
+    for idx, slide in enumerate(prs.slides, 1):
+        if idx < start:
+            continue
+        if idx > end:
+            break
+        # 소아 시작 페이지가 있고, 그 페이지 이상 페이지라면 소아 페이지 지정
+        is_pediatric = (pediatric_start_page is not None and idx >= pediatric_start_page)
+        results.append((idx, _extract_slide_events(slide, is_pediatric)))
+    return results
+
+
+def _merge_slide_events(slide_events):
+    """
+    슬라이드 순서대로 이벤트를 합쳐 최종 구조 생성 (직렬 처리와 같은 결과)
+    """
+    # 구조화된 데이터 형식
+    organized_data = {}
+
+    # 중복 방지
+    processed_items = set()
+    duplicates = 0
+
+    for _, events in sorted(slide_events, key=lambda item: item[0]):
+        for event in events:
+            if event[0] == 'code':
+                _, nacrs_code, title = event
+                # 아직 나오지 않은 코드라면
+                if nacrs_code not in organized_data:
+                    organized_data[nacrs_code] = {
+                        'title': title,
+                        'adult': {
+                            'vital_signs_primary': {},
+                            'other_primary': {},
+                            'symptom_secondary': {}
+                        },
+                        'pediatric': {
+                            'vital_signs_primary': {},
+                            'other_primary': {},
+                            'symptom_secondary': {}
+                        }
+                    }
+                continue
+
+            _, nacrs_code, patient_type, category, level, desc = event
+            # 중복 방지 위해 고유 키 생성
+            item_key = f"{nacrs_code}_{patient_type}_{category}_{level}_{desc}"
+            if item_key in processed_items:
+                duplicates += 1
+                continue
+            # 같은 레벨끼리 묶어서 추가
+            organized_data[nacrs_code][patient_type][category].setdefault(level, []).append(desc)
+            processed_items.add(item_key)
+
+    logger.info("코드 %d개, 항목 %d개 추출 (중복 %d개 제외)", len(organized_data), len(processed_items), duplicates)
+    return organized_data
+
+
+# 이보다 슬라이드가 적으면 기본값으로 프로세스를 나누지 않음
+# 프로세스마다 PPTX 전체를 다시 열어야 해서(1000장 기준 약 0.9초, 직렬 추출 시간의 1/4) 작은 덱은 직렬이 빠름
+MIN_PARALLEL_SLIDES = 200
+
+
+def _available_cpus():
+    # 컨테이너/taskset으로 제한된 경우 실제로 쓸 수 있는 CPU 수
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def extract_medical_codes_from_pptx(pptx_path, pediatric_start_page=None, workers=None):
+    """
+    가이드라인 PPTX에서 NACRS 코드별 기준 추출
+    workers개의 프로세스가 슬라이드 구간을 나눠 처리하고, 결과는 슬라이드 순서대로 합침
+    workers=1이면 현재 프로세스에서 처리
+    workers를 생략하면 CPU가 1개이거나 슬라이드가 MIN_PARALLEL_SLIDES장보다 적을 때 직렬, 그 외에는 CPU 수(최대 4)
+    """
+    # 파일 존재 확인
+    if not os.path.exists(pptx_path):
+        raise FileNotFoundError(f"파일을 찾을 수 없습니다: {pptx_path} (현재 디렉토리: {os.getcwd()})")
+
+    if pediatric_start_page is not None:
+        logger.info("소아 슬라이드 %s로 지정됨.", pediatric_start_page)
+
+    slide_count = len(Presentation(pptx_path).slides)
+    if workers is None:
+        workers = 1 if slide_count < MIN_PARALLEL_SLIDES else min(4, _available_cpus())
+    workers = max(1, min(workers, slide_count))
+
+    start = time.perf_counter()
+    if workers == 1:
+        slide_events = _extract_slide_range(pptx_path, 1, slide_count, pediatric_start_page)
+    else:
+        # 프로세스마다 PPTX를 한 번씩 열어야 하므로 프로세스당 연속된 구간 하나씩 배정
+        chunk_size = -(-slide_count // workers)
+        ranges = [(s, min(s + chunk_size - 1, slide_count)) for s in range(1, slide_count + 1, chunk_size)]
+        slide_events = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_extract_slide_range, pptx_path, s, e, pediatric_start_page) for s, e in ranges]
+            for done, future in enumerate(as_completed(futures), 1):
+                slide_events.extend(future.result())
+                logger.info("슬라이드 추출 진행: %d/%d 구간", done, len(ranges))
+
+    elapsed = time.perf_counter() - start
+    logger.info("슬라이드 %d장 추출 완료: %.2f초 (%.1f장/초, 프로세스 %d개)",
+                slide_count, elapsed, slide_count / elapsed if elapsed else 0.0, workers)
+    return _merge_slide_events(slide_events)
+
+
+# 문서 변환
+# 문서 단위: item(기준 문구 하나당 문서 1개) / code(NACRS 코드 + 환자 유형당 문서 1개)
+CHUNKING_MODES = ("item", "code")
+PATIENT_TYPE_LABELS = {"adult": "성인", "pediatric": "소아"}
+CATEGORY_LABELS = {category: marker for marker, category in CATEGORY_MARKERS}
+
+
+def _item_documents(code, title, patient_type, categories):
+    # 기준 문구마다 코드/제목/환자 유형/카테고리/레벨을 모두 담은 문서
+    for category_name, category_data in categories.items():
+        for level, descriptions in category_data.items():
+            for desc in descriptions:
+                content = "\n".join([
+                    f"NACRS 코드: {code}",
+                    f"제목: {title}",
+                    f"환자 유형: {PATIENT_TYPE_LABELS[patient_type]}",
+                    f"카테고리: {category_name}",
+                    f"레벨: {level}",
+                    f"설명: {desc}",
+                ])
+                metadata = {
+                    "code": code,
+                    "title": title,
+                    "patient_type": patient_type,
+                    "category": category_name,
+                    "level": level,
+                }
+                document_id = make_document_id(code, patient_type, category_name, level, desc)
+                yield Document(id=document_id, page_content=content, metadata=metadata)
+
+
+def _code_document(code, title, patient_type, categories):
+    # 코드 하나의 모든 카테고리/레벨 기준을 한 문서로 (기준이 없으면 None)
+    lines = []
+    for category_name, category_data in categories.items():
+        label = CATEGORY_LABELS.get(category_name, category_name)
+        for level, descriptions in sorted(category_data.items(), key=lambda item: int(item[0])):
+            if descriptions:
+                lines.append(f"{label} KTAS {level}: {'; '.join(descriptions)}")
+    if not lines:
+        return None
+
+    content = "\n".join([
+        f"NACRS 코드: {code}",
+        f"제목: {title}",
+        f"환자 유형: {PATIENT_TYPE_LABELS[patient_type]}",
+        *lines,
+    ])
+    metadata = {"code": code, "title": title, "patient_type": patient_type, "chunking": "code"}
+    document_id = make_document_id(code, patient_type, "*", "", "")
+    return Document(id=document_id, page_content=content, metadata=metadata)
+
+
+def convert_to_documents(data, chunking=None):
+    """
+    추출된 의학 코드 데이터를 LangChain Document 객체 리스트로 변환
+    chunking: item(기준 문구 단위) / code(코드 + 환자 유형 단위), 기본값은 KTAS_CHUNKING 환경변수(없으면 item)
+    """
+    chunking = chunking or os.getenv("KTAS_CHUNKING", "item")
+    if chunking not in CHUNKING_MODES:
+        raise ValueError(f"지원하지 않는 문서 단위: {chunking} (가능: {', '.join(CHUNKING_MODES)})")
+
+    documents = []
+    for code, code_data in data.items():
+        title = code_data.get('title')
+        for patient_type in ("adult", "pediatric"):
+            categories = code_data.get(patient_type, {})
+            if chunking == "item":
+                documents.extend(_item_documents(code, title, patient_type, categories))
+            else:
+                document = _code_document(code, title, patient_type, categories)
+                if document is not None:
+                    documents.append(document)
+
+    print(f"{len(documents)}개의 문서로 변환됨. ({chunking})")
+    return documents
+
+
+def sync_vectorstore(vectorstore, documents, persist_directory, embedding_model=None, batch_size=500):
+    """
+    manifest와 비교해서 추가/변경된 문서만 임베딩하고, 삭제된 문서는 인덱스에서 제거
+    """
+    manifest = load_manifest(persist_directory)
+    if manifest is None:
+        # manifest 없이 만들어진 기존 db는 ID가 무작위라 비교할 수 없으므로 비우고 다시 생성
+        existing_ids = vectorstore.get(include=[])["ids"]
+        if existing_ids:
+            print(f"manifest가 없는 기존 db 문서 {len(existing_ids)}개 삭제")
+            for i in range(0, len(existing_ids), batch_size):
+                vectorstore.delete(ids=existing_ids[i:i + batch_size])
+        manifest = {"documents": {}}
+    elif embedding_model and manifest.get("embedding_model") not in (None, embedding_model):
+        # 임베딩 모델이 바뀌면 모든 벡터를 다시 계산해야 함
+        print(f"임베딩 모델 변경: {manifest.get('embedding_model')} -> {embedding_model}")
+        manifest["documents"] = {}
+
+    indexed = manifest["documents"]
+    current = {}
+    to_upsert = []
+    for document in documents:
+        content_hash = make_content_hash(document)
+        # 같은 ID가 두 번 나오면 먼저 나온 문서만 사용
+        if document.id in current:
+            continue
+        current[document.id] = content_hash
+        if indexed.get(document.id) != content_hash:
+            to_upsert.append(document)
+
+    removed = [doc_id for doc_id in indexed if doc_id not in current]
+
+    if removed:
+        for i in range(0, len(removed), batch_size):
+            vectorstore.delete(ids=removed[i:i + batch_size])
+    for i in range(0, len(to_upsert), batch_size):
+        batch = to_upsert[i:i + batch_size]
+        vectorstore.add_documents(batch, ids=[document.id for document in batch])
+
+    version = hashlib.sha1(json.dumps(sorted(current.items())).encode("utf-8")).hexdigest()[:16]
+    save_manifest(persist_directory, {
+        "version": version,
+        "embedding_model": embedding_model,
+        "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "count": len(current),
+        "documents": current,
+    })
+    print(f"인덱스 갱신: 추가/변경 {len(to_upsert)}개, 삭제 {len(removed)}개, 전체 {len(current)}개 (버전 {version})")
+    return {"upserted": len(to_upsert), "removed": len(removed), "total": len(current), "version": version}
+
+
+def build_snapshot(documents, embeddings, index_root, store="chroma", embedding_model=None):
+    """
+    문서로 새 인덱스 스냅샷을 만들고 CURRENT를 교체한 뒤 읽기 전용으로 열어서 반환
+    현재 스냅샷을 복사해서 시작하므로 바뀐 문서만 임베딩하고, 만드는 동안 읽는 쪽은 이전 스냅샷을 계속 사용
+    """
+    staging = new_snapshot(index_root)
+    try:
+        if store == "numpy":
+            # 내용이 같은 문서의 임베딩은 재사용해서 행렬을 다시 저장
+            from src.numpy_store import build_numpy_index
+            build_numpy_index(documents, embeddings, staging, embedding_model)
+        else:
+            # 바뀐 문서만 임베딩해서 반영
+            from langchain_chroma import Chroma
+            vectorstore = Chroma(persist_directory=staging, embedding_function=embeddings)
+            try:
+                sync_vectorstore(vectorstore, documents, staging, embedding_model=embedding_model)
+            finally:
+                # 쓰기용 클라이언트는 작업 디렉터리 경로로 열려 있으므로 게시(이름 변경) 전에 닫음
+                close_index(vectorstore)
+        version = publish_snapshot(index_root, staging)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return open_index(index_root, embeddings, store, version)
+
+
+def build_vectorstore(embeddings, index_root, store="chroma", pptx_path=None, pediatric_start_page=None,
+                      embedding_model=None, chunking=None):
+    """
+    가이드라인을 추출해서 인덱스 새 스냅샷 생성 (바뀐 문서만 임베딩)
+    chunking: 문서 단위 item / code (convert_to_documents 참고)
+    """
+    print("db 생성/갱신")
+    # 문서 준비
+    if pptx_path is None:
+        pptx_path = os.path.join(ROOT_DIR, "src", "KTAS_guideline.pptx")
+
+    # 데이터 추출
+    data = extract_medical_codes_from_pptx(pptx_path, pediatric_start_page)
+
+    # 백업용
+    output_path = GUIDELINE_JSON
+    save_to_json(data, output_path)
+    # 규칙 엔진 등 조회용 저장소 (JSON 백업과 같은 내용)
+    GuidelineStore().import_data(data, file_hash(output_path))
+
+    # 문서 변환
+    documents = convert_to_documents(data, chunking)
+    return build_snapshot(documents, embeddings, index_root, store, embedding_model)
+
+
+# json 변환
+def save_to_json(data, output_path):
+    # JSON 파일로 저장 (한글 인코딩 처리)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    from src.data import get_vectorstore
+
+    parser = argparse.ArgumentParser(description="가이드라인 PPTX 추출 및 인덱스 갱신")
+    parser.add_argument("--pptx", default="src/KTAS_guideline.pptx")
+    parser.add_argument("--pediatric-start-page", type=int, default=None)
+    parser.add_argument("--embedding", default=None, help="upstage / hashing (기본값 EMBEDDING_BACKEND)")
+    parser.add_argument("--store", default=None, help="chroma / numpy (기본값 KTAS_VECTORSTORE)")
+    parser.add_argument("--chunking", choices=CHUNKING_MODES, default=None,
+                        help="문서 단위 item / code (기본값 KTAS_CHUNKING)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    get_vectorstore(args.pptx, args.pediatric_start_page, args.embedding, args.store, args.chunking)
+
+
+if __name__ == "__main__":
+    main()
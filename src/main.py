@@ -1,8 +1,14 @@
 # python main.py 실행
 # 콘솔 테스트용
 
-from rag_system import create_rag_system
-from data import get_vectorstore
+import os, sys, uuid
+
+# src 폴더에서 실행해도 src 패키지를 찾을 수 있도록 프로젝트 루트를 경로에 추가
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.resources import get_rule_engine, get_session_manager, warmup_in_background
+from src.rag_system import build_chain_input, stream_answer
+from src.triage_rules import format_decision
 
 def medical_info():
     # 입력 가이드
@@ -65,10 +71,11 @@ def medical_info():
     
     
 def main():
-    vectorstore = get_vectorstore()
-    
-    # rag 시스템 생성
-    ktas_chain = create_rag_system(vectorstore)
+    # 환자 정보를 입력받는 동안 벡터스토어/rag 시스템/LLM 클라이언트를 백그라운드에서 미리 생성
+    rule_engine = get_rule_engine()
+    warmup_in_background()
+    # 같은 환자를 재평가하면 세션을 이어서 사용 (바뀐 항목만 반영)
+    session_id = None
     
     # 대화형 인터페이스
     while True:
@@ -79,18 +86,28 @@ def main():
             print("종료")
             return None
         
-        response = ktas_chain.invoke({
-            "input" : user_info["symptoms"],   # 검색 쿼리로 사용할 것
-            "sex" : user_info["sex"],
-            "age": user_info["age"],
-            "vital_signs": user_info["vital_signs"],
-            "consciousness": user_info["consciousness"],
-            "diseases": user_info["diseases"],
-            "medications": user_info["medications"]
-        })
-        
+        # 활력징후 규칙으로 KTAS 1/2가 명확하면 바로 출력
+        decision = rule_engine.evaluate(user_info["vital_signs"], user_info["consciousness"],
+                                        user_info["age"], user_info["diseases"])
+        if decision["level"]:
+            print(format_decision(decision))
+            if input("상세 설명을 생성할까요? (y/n) :").strip().lower() != "y":
+                session_id = None
+                continue
+
+        # 준비가 끝나지 않았으면 여기서 기다림
+        session_id = session_id or uuid.uuid4().hex
+        ktas_chain = get_session_manager().bind(session_id)
         print("====답변====")
-        print(response["answer"])
+        # 생성되는 대로 바로 출력
+        timings = {}
+        on_level = lambda level: print(f"[KTAS {level}]")
+        for token in stream_answer(ktas_chain, build_chain_input(user_info), timings, on_level):
+            print(token, end="", flush=True)
+        print()
+        print(f"(첫 응답 {timings.get('first_token', 0):.2f}초 / 전체 {timings['total']:.2f}초)")
+        if input("같은 환자의 바뀐 정보로 재평가할까요? (y/n) :").strip().lower() != "y":
+            session_id = None
         
         
 if __name__ == "__main__":
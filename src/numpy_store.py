@@ -0,0 +1,268 @@
+# NumPy 기반 메모리 벡터스토어
+# 임베딩 행렬은 .npy로 한 번 저장해 메모리 맵으로 열고, 메타데이터는 열(column) 단위로 압축해 json에 저장
+# 문서 수천 개 규모에서는 전수(brute-force) 코사인 검색이 HNSW보다 빠르고 결과도 정확함
+import hashlib, json, os, time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from src.data import load_manifest, make_content_hash, save_manifest
+
+VECTORS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _encode_columns(metadatas):
+    """
+    메타데이터 목록을 열 단위 사전 인코딩 ({열 이름: (고유값 목록, 값 번호 배열)})으로 변환
+    """
+    keys = sorted({key for metadata in metadatas for key in metadata})
+    columns = {}
+    for key in keys:
+        values, codes, lookup = [], [], {}
+        for metadata in metadatas:
+            value = metadata.get(key)
+            if value not in lookup:
+                lookup[value] = len(values)
+                values.append(value)
+            codes.append(lookup[value])
+        columns[key] = (values, np.asarray(codes, dtype=np.int32))
+    return columns
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    정규화된 임베딩 행렬(N x D) + 열 단위 메타데이터로 구성된 읽기 위주 벡터스토어
+    검색/MMR은 모두 행렬 연산으로 처리하며, filter는 메타데이터 일치 조건({"patient_type": "adult"})
+    """
+
+    def __init__(self, embedding, vectors, ids, texts, columns, persist_directory=None):
+        self._embedding = embedding
+        self.vectors = vectors
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.columns = columns
+        self._persist_directory = persist_directory
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return len(self.ids)
+
+    # 생성/저장/로드
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        vectors = _normalize(embedding.embed_documents(texts)) if texts else np.zeros((0, 0), dtype=np.float32)
+        return cls(embedding, vectors, ids, texts, _encode_columns(metadatas))
+
+    @classmethod
+    def from_chroma(cls, chroma):
+        """
+        기존 Chroma 인덱스의 임베딩을 다시 계산하지 않고 그대로 옮겨옴
+        """
+        stored = chroma.get(include=["documents", "metadatas", "embeddings"])
+        vectors = _normalize(stored["embeddings"]) if len(stored["ids"]) else np.zeros((0, 0), dtype=np.float32)
+        return cls(chroma.embeddings, vectors, stored["ids"], stored["documents"],
+                   _encode_columns([metadata or {} for metadata in stored["metadatas"]]))
+
+    def save(self, directory, embedding_model=None):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, VECTORS_FILE), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        sidecar = {
+            "ids": self.ids,
+            "texts": self.texts,
+            "columns": {key: {"values": values, "codes": codes.tolist()} for key, (values, codes) in self.columns.items()},
+        }
+        with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False, separators=(",", ":"))
+
+        # 인덱스 내용 기록 (응답 캐시 버전 등에서 사용)
+        documents = {doc_id: make_content_hash(document) for doc_id, document in zip(self.ids, self._documents())}
+        version = hashlib.sha1(json.dumps(sorted(documents.items())).encode("utf-8")).hexdigest()[:16]
+        save_manifest(directory, {
+            "version": version,
+            "embedding_model": embedding_model or getattr(self._embedding, "model", None),
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "count": len(documents),
+            "documents": documents,
+        })
+        self._persist_directory = directory
+
+    @classmethod
+    def load(cls, directory, embedding, mmap=True):
+        """
+        저장된 인덱스 열기 (mmap=True면 임베딩 행렬을 읽기 전용 메모리 맵으로 열어 여러 프로세스가 공유)
+        """
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r" if mmap else None)
+        # memmap 하위 클래스 오버헤드 없이 같은 메모리를 보는 ndarray로 사용
+        vectors = np.asarray(vectors)
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        columns = {
+            key: (column["values"], np.asarray(column["codes"], dtype=np.int32))
+            for key, column in sidecar["columns"].items()
+        }
+        return cls(embedding, vectors, sidecar["ids"], sidecar["texts"], columns, persist_directory=directory)
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs):
+        # 메모리에만 추가 (저장하려면 save 호출)
+        added = NumpyVectorStore.from_texts(texts, self._embedding, metadatas, ids=ids)
+        if not len(added):
+            return []
+        metadatas = [self._metadata(i) for i in range(len(self))] + [added._metadata(i) for i in range(len(added))]
+        self.vectors = added.vectors if not len(self) else np.vstack([self.vectors, added.vectors])
+        self.ids += added.ids
+        self.texts += added.texts
+        self.columns = _encode_columns(metadatas)
+        return added.ids
+
+    # 조회
+    def _metadata(self, row):
+        return {key: values[codes[row]] for key, (values, codes) in self.columns.items()}
+
+    def _document(self, row):
+        return Document(id=self.ids[row], page_content=self.texts[row], metadata=self._metadata(row))
+
+    def _documents(self):
+        return [self._document(row) for row in range(len(self))]
+
+    def get(self, include=None):
+        """
+        Chroma.get()과 같은 형식으로 전체 문서 반환 (BM25 색인 등에서 사용)
+        """
+        return {
+            "ids": list(self.ids),
+            "documents": list(self.texts),
+            "metadatas": [self._metadata(row) for row in range(len(self))],
+        }
+
+    def _mask(self, filter):
+        if not filter:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        for key, value in filter.items():
+            values, codes = self.columns.get(key, ([], None))
+            if value not in values:
+                return np.zeros(len(self), dtype=bool)
+            mask &= codes == values.index(value)
+        return mask
+
+    def _scores(self, query_vector, filter):
+        scores = self.vectors @ query_vector
+        mask = self._mask(filter)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        return scores
+
+    @staticmethod
+    def _top_k(scores, k):
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        if not len(self):
+            return []
+        query_vector = _normalize(embedding)[0]
+        scores = self._scores(query_vector, filter)
+        return [(self._document(row), float(scores[row])) for row in self._top_k(scores, k)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # 코사인 유사도(-1~1)를 0~1로 변환
+        return lambda score: (score + 1.0) / 2.0
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        if not len(self):
+            return []
+        query_vector = _normalize(embedding)[0]
+        candidates = self._top_k(self._scores(query_vector, filter), fetch_k)
+        if not len(candidates):
+            return []
+
+        candidate_vectors = np.asarray(self.vectors[candidates])
+        relevance = candidate_vectors @ query_vector
+        similarity = candidate_vectors @ candidate_vectors.T
+
+        # 질의와 관련도는 높고, 이미 고른 문서와는 덜 비슷한 문서를 차례로 선택
+        selected = [int(np.argmax(relevance))]
+        max_similarity = similarity[selected[0]].copy()
+        while len(selected) < min(k, len(candidates)):
+            mmr = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+            mmr[selected] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            max_similarity = np.maximum(max_similarity, similarity[best])
+
+        return [self._document(int(candidates[i])) for i in selected]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+
+def build_numpy_index(documents, embedding, directory, embedding_model=None):
+    """
+    문서로 NumPy 인덱스를 만들어 저장
+    이미 저장된 인덱스가 같은 임베딩 모델로 만들어졌으면 내용이 같은 문서의 임베딩은 다시 계산하지 않고 재사용
+    """
+    embedding_model = embedding_model or getattr(embedding, "model", None)
+    previous = None
+    if os.path.exists(os.path.join(directory, VECTORS_FILE)):
+        manifest = load_manifest(directory) or {}
+        # 모델이 바뀌었거나 기록이 없으면 벡터 공간이 섞이지 않도록 전부 다시 임베딩
+        if manifest.get("embedding_model") == embedding_model:
+            previous = NumpyVectorStore.load(directory, embedding, mmap=False)
+        else:
+            print(f"임베딩 모델 변경: {manifest.get('embedding_model')} -> {embedding_model}, 전체 다시 임베딩")
+    reusable = {}
+    if previous is not None:
+        for row, document in enumerate(previous._documents()):
+            reusable[(document.id, make_content_hash(document))] = previous.vectors[row]
+
+    vectors, to_embed = [None] * len(documents), []
+    for i, document in enumerate(documents):
+        vector = reusable.get((document.id, make_content_hash(document)))
+        if vector is None:
+            to_embed.append(i)
+        else:
+            vectors[i] = vector
+
+    if to_embed:
+        embedded = _normalize(embedding.embed_documents([documents[i].page_content for i in to_embed]))
+        for i, vector in zip(to_embed, embedded):
+            vectors[i] = vector
+    print(f"NumPy 인덱스 생성: 새로 임베딩 {len(to_embed)}개, 재사용 {len(documents) - len(to_embed)}개")
+
+    store = NumpyVectorStore(
+        embedding,
+        np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32),
+        [document.id for document in documents],
+        [document.page_content for document in documents],
+        _encode_columns([document.metadata for document in documents]),
+    )
+    store.save(directory, embedding_model)
+    return NumpyVectorStore.load(directory, embedding)
@@ -1,42 +1,210 @@
-from langchain_upstage import ChatUpstage
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from dotenv import load_dotenv
-import os
+from src.answer_parser import LevelStreamParser, parse_ktas_level
+from src.context import estimate_tokens, pack_documents
+from src.retrievers import BM25Index, BM25Retriever, HybridRetriever, load_documents_from_vectorstore
+from src.triage_rules import parse_age_months
+import logging, os, time
 
 load_dotenv()
 
-def create_rag_system(vectorstore):
-    # LLM 초기화
-    llm = ChatUpstage(
+logger = logging.getLogger(__name__)
+
+def create_upstage_llm():
+    from langchain_upstage import ChatUpstage
+    return ChatUpstage(
         api_key=os.getenv("UPSTAGE_API_KEY"),
         model="solar-pro"
     )
+
+
+def lazy_llm(factory):
+    """
+    첫 호출 때 factory()로 만든 채팅 모델에 그대로 연결되는 Runnable (스트리밍 포함)
+    langchain_upstage/openai import와 클라이언트 생성을 체인 생성 시점이 아니라 첫 요청으로 미룸
+    """
+    return RunnableLambda(lambda prompt_value: factory()).with_config(run_name="lazy_llm")
+
+
+def create_document_chain(prompt, llm, context_tokens):
+    """
+    검색된 문서를 압축해 프롬프트에 넣고 LLM 답변(문자열)을 반환하는 체인
+    """
+    return (
+        RunnablePassthrough.assign(
+            context=lambda chain_input: pack_documents(chain_input["context"], max_tokens=context_tokens)
+        )
+        | prompt
+        | RunnableLambda(log_prompt_tokens).with_config(run_name="log_prompt_tokens")
+        | llm
+        | StrOutputParser()
+    ).with_config(run_name="stuff_documents_chain")
+
+
+def create_rag_system(vectorstore, retriever_mode=None, context_tokens=None, llm=None, retriever=None):
+    # LLM 초기화 (벤치마크/테스트에서는 다른 채팅 모델을 넘겨서 사용)
+    if llm is None:
+        llm = lazy_llm(create_upstage_llm)
     
     # 프롬프트 정의
     prompt = get_ktas_prompt()
     
     # 문서 체인 생성(검색된 문서들을 llm에 보내기 전 준비)
-    document_chain = create_stuff_documents_chain(llm, prompt)
+    # 문서를 그대로 이어 붙이지 않고 코드별로 압축해 토큰 예산(KTAS_CONTEXT_TOKENS) 안에서 전달
+    context_tokens = context_tokens or int(os.getenv("KTAS_CONTEXT_TOKENS", "800"))
+    document_chain = create_document_chain(prompt, llm, context_tokens)
     
-    # dense retriever 생성
-    retriever = vectorstore.as_retriever(
-        search_type='mmr',  # default : similarity(유사도) / mmr 알고리즘
-        search_kwargs={"k":3}
-    )
+    # retriever 생성 (hybrid: BM25 + dense / dense: 기존 MMR 검색만)
+    if retriever is None:
+        retriever = get_retriever(vectorstore, retriever_mode)
     
      # 최종 검색-생성 체인 생성
     """
     검색 단계와 응답 생성 단계를 하나로 묶은 워크플로우
     질문 -> 검색 -> 결합 -> 응답의 단계를 자동화하여 한 번에 수행
     llm에 생성된 문서를 전달하고 답변을 생성
+    create_retrieval_chain과 출력 형식(input/context/answer)은 같지만,
+    검색 단계에서 질문뿐 아니라 환자 정보 전체(나이 등)를 사용해 메타데이터 필터를 적용
     """
-    retriever_chain = create_retrieval_chain(retriever, document_chain)
+    retrieval = RunnableLambda(
+        lambda chain_input, config: retrieve_documents(retriever, chain_input, config)
+    ).with_config(run_name="retrieve_documents")
+
+    # 답변 첫 줄의 KTAS_LEVEL을 level 키로 함께 반환 (스트리밍 중 레벨은 stream_answer에서 바로 파싱)
+    retriever_chain = (
+        RunnablePassthrough.assign(context=retrieval)
+        .assign(answer=document_chain)
+        .assign(level=lambda response: parse_ktas_level(response["answer"]))
+    ).with_config(run_name="retrieval_chain")
 
     return retriever_chain
+
+
+def create_delta_chain(retriever, llm=None, context_tokens=None):
+    """
+    같은 환자의 재평가용 체인 (입력/출력 형식은 create_rag_system과 같음)
+    - 입력에 context(이전 검색 결과)가 있으면 검색을 건너뛰고 그대로 사용, None이면 새로 검색
+    - few-shot 예제 없이 이전 평가와 바뀐 항목만 담은 짧은 프롬프트(get_delta_prompt) 사용
+    추가 입력: previous_level, previous_summary, changed_fields
+    """
+    if llm is None:
+        llm = lazy_llm(create_upstage_llm)
+    context_tokens = context_tokens or int(os.getenv("KTAS_DELTA_CONTEXT_TOKENS", "400"))
+    document_chain = create_document_chain(get_delta_prompt(), llm, context_tokens)
+
+    retrieval = RunnableLambda(
+        lambda chain_input, config: retrieve_documents(retriever, chain_input, config)
+    ).with_config(run_name="retrieve_documents")
+    # 반환값이 Runnable이면 같은 입력으로 실행되므로, 이전 검색 결과가 없을 때만 검색
+    reuse_or_retrieve = RunnableLambda(
+        lambda chain_input: retrieval if chain_input.get("context") is None else chain_input["context"]
+    ).with_config(run_name="reuse_context")
+
+    return (
+        RunnablePassthrough.assign(context=reuse_or_retrieve)
+        .assign(answer=document_chain)
+        .assign(level=lambda response: parse_ktas_level(response["answer"]))
+    ).with_config(run_name="delta_chain")
+
+
+def log_prompt_tokens(prompt_value):
+    """
+    LLM에 보내는 프롬프트의 토큰 수(추정치)를 요청마다 기록
+    """
+    tokens = estimate_tokens(prompt_value.to_string())
+    logger.info("프롬프트 토큰 수(추정): %d", tokens)
+    return prompt_value
+
+
+# 소아/성인 구분 기준 (KTAS 소아 기준: 만 15세 미만)
+PEDIATRIC_AGE_MONTHS = 15 * 12
+
+
+def derive_search_filter(chain_input):
+    """
+    환자 정보에서 검색 필터 생성 (나이 -> 성인/소아), 나이가 미확인이면 None
+    """
+    months = parse_age_months(chain_input.get("age"))
+    if months is None:
+        return None
+    return {"patient_type": "pediatric" if months < PEDIATRIC_AGE_MONTHS else "adult"}
+
+
+def retrieve_documents(retriever, chain_input, config=None):
+    """
+    필터를 적용해 검색하고, 필터 결과가 없으면(해당 환자 유형 문서가 없는 경우 등) 필터 없이 다시 검색
+    """
+    query = chain_input["input"]
+    search_filter = derive_search_filter(chain_input)
+    if search_filter:
+        documents = retriever.invoke(query, config=config, filter=search_filter)
+        if documents:
+            return documents
+        logger.info("필터 %s 결과 없음, 전체 문서에서 다시 검색", search_filter)
+    return retriever.invoke(query, config=config)
     
     
+def stream_answer(ktas_chain, chain_input, timings=None, on_level=None):
+    """
+    ktas_chain.stream() 결과에서 답변 조각만 순서대로 반환 (첫 줄의 KTAS_LEVEL 줄은 빼고 본문만)
+    레벨이 파싱되는 즉시 on_level(level)을 호출해 설명 생성이 끝나기 전에 경고/분류에 사용할 수 있게 함
+    첫 토큰까지 걸린 시간(first_token), 레벨까지 걸린 시간(level), 전체 시간(total)을 timings에 저장
+    """
+    if timings is None:
+        timings = {}
+    start = time.perf_counter()
+    parser = LevelStreamParser()
+
+    def report_level():
+        if parser.level is None or "level" in timings:
+            return
+        timings["level"] = time.perf_counter() - start
+        logger.info("KTAS %d 파싱 %.3f초", parser.level, timings["level"])
+        if on_level:
+            on_level(parser.level)
+
+    for chunk in ktas_chain.stream(chain_input):
+        # retrieval chain은 input/context/answer 키를 나눠서 보내므로 answer만 사용
+        answer = chunk.get("answer")
+        if not answer:
+            continue
+        if "first_token" not in timings:
+            timings["first_token"] = time.perf_counter() - start
+            logger.info("첫 토큰까지 %.3f초", timings["first_token"])
+        text = parser.feed(answer)
+        report_level()
+        if text:
+            yield text
+
+    text = parser.close()
+    report_level()
+    if text:
+        yield text
+
+    timings["total"] = time.perf_counter() - start
+    logger.info("답변 생성 완료 %.3f초", timings["total"])
+
+
+def build_chain_input(patient):
+    """
+    medical_info() 형식의 환자 정보를 ktas_chain 입력으로 변환 (빈 값은 미확인)
+    """
+    def value(key):
+        return str(patient.get(key) or "").strip() or "미확인"
+
+    return {
+        "input": value("symptoms"),   # 검색 쿼리로 사용할 것
+        "sex": value("sex"),
+        "age": value("age"),
+        "vital_signs": value("vital_signs"),
+        "consciousness": value("consciousness"),
+        "diseases": value("diseases"),
+        "medications": value("medications")
+    }
+
+
 def get_ktas_prompt():
     return ChatPromptTemplate.from_messages([
         # system prompt
@@ -67,7 +235,8 @@ def get_ktas_prompt():
          - 이는 참고용 정보이며, 정확한 판단은 의료진의 판단임을 명시해줘.
 
          4. [형식]:
-         - 응답은 [환자 분석], [KTAS 평가], [주의사항] 섹션으로 구분해서 제공해줘.
+         - 응답의 첫 줄은 반드시 "KTAS_LEVEL: 숫자" 형식으로 최종 KTAS 점수(1~5)만 적어줘. 예: KTAS_LEVEL: 2
+         - 둘째 줄부터 [환자 분석], [KTAS 평가], [주의사항] 섹션으로 구분해서 제공해줘.
          - 검색된 문서의 정보를 바탕으로 응답해줘.
          - 생체징후가 비정상인 경우 해당 수치를 명시하고 그 의미를 설명해줘.
          - 최종 KTAS 점수를 명확하게 제시하고 그 이유를 상세히 설명해줘.
@@ -75,7 +244,8 @@ def get_ktas_prompt():
 
         # few-shot 예제 1: KTAS 2 사례
         ("human", "65세 남성 환자가 갑작스러운 흉통을 호소하며 응급실에 내원했습니다. 고혈압과 당뇨병 기저질환이 있으며, 혈압약과 당뇨약을 복용 중입니다. 활력징후는 혈압 170/95, 맥박 110, 호흡수 24, 체온 37.2, 산소포화도 93%입니다. 의식은 명료하고, 환자는 30분전부터 시작된 압박감을 동반한 가슴 통증을 호소하고 있습니다. KTAS 점수는 얼마인가요?"),
-        ("assistant", """[환자 분석]
+        ("assistant", """KTAS_LEVEL: 2
+        [환자 분석]
         이 환자는 65세 남성으로 고혈압과 당뇨병의 기저질환이 있으며, 30분 전부터 시작된 압박감을 동반한 가슴 통증을 호소하고 있습니다.
         - 성별: 남성
         - 나이: 65세
@@ -100,7 +270,8 @@ def get_ktas_prompt():
 
         # few-shot 예제 2: KTAS 5 사례
         ("human", "35세 여성이 왼쪽 발목 통증으로 응급실에 내원했습니다. 특별한 기저질환은 없으며, 복용 중인 약물도 없습니다. 활력징후는 혈압 120/80, 맥박 78, 호흡수 18, 체온 36.5, 산소포화도 99%입니다. 의식은 명료하고, 2시간 전 계단에서 발을 접질려 왼쪽 발목 통증과 경미한 부종이 있으나 체중 부하는 가능한 상태입니다. KTAS 점수를 평가해주세요."),    
-        ("assistant", """[환자 분석]
+        ("assistant", """KTAS_LEVEL: 5
+        [환자 분석]
         이 환자는 35세 여성으로 2시간 전 발생한 왼쪽 발목 통증과 경미한 부종을 호소하고 있습니다.
         - 성별: 여성
         - 나이: 35세
@@ -129,17 +300,59 @@ def get_ktas_prompt():
     ])
 
 
-# RAG 시스템을 모듈화하고 단계별로 처리할 때 유용
-# # Context 문서 포매팅 함수
-# def format_docs(docs):
-#     return "\n\n".join(document.page_content for document in docs)
-
-# # retriever 생성 함수
-# def get_retriever(vectorstore):
-#     # dense retriever 생성
-#     retriever = vectorstore.as_retriever(
-#         # 유사도 정의
-#         search_type="mmr",   # Maximum Marginal Relevance 검색 방식 사용
-#         # 검색할 쿼리 수 정의
-#         search_kwargs={"k": 3})
-#     return retriever
\ No newline at end of file
+def get_delta_prompt():
+    return ChatPromptTemplate.from_messages([
+        ("system", """너는 응급실에서 KTAS로 환자 중증도를 재평가하는 의료 챗봇이야.
+        같은 환자의 이전 평가와 바뀐 정보를 보고 KTAS 점수를 갱신해줘.
+        다음은 검색된 문서 정보야: {context}
+
+        [형식]:
+         - 응답의 첫 줄은 반드시 "KTAS_LEVEL: 숫자" 형식으로 갱신된 KTAS 점수(1~5)만 적어줘.
+         - 둘째 줄부터 [변경 사항], [KTAS 평가], [주의사항] 섹션으로 짧게 답해줘.
+         - 바뀐 정보가 점수에 주는 영향을 중심으로 설명하고, 비정상 수치는 명시해줘.
+         - 이는 참고용 정보이며, 정확한 판단은 의료진의 판단임을 명시해줘.
+"""),
+        ("human", """[이전 평가] KTAS {previous_level}
+{previous_summary}
+
+[바뀐 정보]
+{changed_fields}
+
+[현재 환자 정보]
+- 성별: {sex}
+- 나이: {age}
+- 기저질환: {diseases}
+- 복용약물: {medications}
+- 활력징후: {vital_signs}
+- 의식상태: {consciousness}
+- 증상: {input}""")
+    ])
+
+
+# retriever 생성 함수
+def get_retriever(vectorstore, mode=None, k=3, candidates=10):
+    """
+    mode: dense(MMR 검색만) / hybrid(BM25 키워드 검색 + MMR 검색을 RRF로 합침)
+    기본값은 KTAS_RETRIEVER 환경변수, 없으면 hybrid
+    hybrid는 두 검색을 동시에 실행 (KTAS_PARALLEL_RETRIEVAL=0이면 순서대로)
+    """
+    mode = mode or os.getenv("KTAS_RETRIEVER", "hybrid")
+
+    if mode == "dense":
+        # dense retriever 생성
+        return vectorstore.as_retriever(
+            search_type='mmr',  # default : similarity(유사도) / mmr 알고리즘
+            search_kwargs={"k": k}
+        )
+
+    if mode == "hybrid":
+        # 두 검색기에서 후보를 넉넉히 가져온 뒤 순위를 합쳐 k개만 사용
+        dense = vectorstore.as_retriever(
+            search_type='mmr',
+            search_kwargs={"k": candidates}
+        )
+        lexical = BM25Retriever(index=BM25Index(load_documents_from_vectorstore(vectorstore)), k=candidates)
+        parallel = os.getenv("KTAS_PARALLEL_RETRIEVAL", "1") != "0"
+        return HybridRetriever(retrievers=[lexical, dense], k=k, parallel=parallel)
+
+    raise ValueError(f"지원하지 않는 검색 방식: {mode} (가능: dense, hybrid)")
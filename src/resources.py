@@ -0,0 +1,433 @@
+# 프로세스 단위 공유 리소스 관리
+# 벡터스토어와 RAG 체인을 한 번만 생성하고, Streamlit 재실행/세션 간에 재사용
+import os
+import threading
+import time
+
+from src.cache import CachedChain, ResponseCache, get_index_version, make_cache_version
+from src.data import get_vectorstore
+from src.deadline import DeadlineTriage
+from src.index_store import close_index, current_version
+from src.rag_system import (create_delta_chain, create_document_chain, create_rag_system, get_ktas_prompt,
+                            get_retriever, lazy_llm)
+from src.scheduler import PriorityScheduler
+from src.session import SessionManager
+from src.telemetry import TracedChain, span, start_metrics_server
+from src.triage_rules import VitalSignRuleEngine
+
+# 생성된 리소스 보관 (프로세스당 1개)
+_resources = {}
+_lock = threading.Lock()
+
+
+def get_shared_vectorstore():
+    """
+    프로세스 전체에서 공유하는 벡터스토어 반환 (최초 호출 시에만 생성)
+    """
+    vectorstore = _resources.get("vectorstore")
+    if vectorstore is None:
+        with _lock:
+            # 다른 스레드가 먼저 생성했을 수 있으므로 다시 확인
+            vectorstore = _resources.get("vectorstore")
+            if vectorstore is None:
+                with span("vectorstore_open"):
+                    vectorstore = get_vectorstore()
+                _resources["vectorstore"] = vectorstore
+    return vectorstore
+
+
+def get_shared_retriever():
+    """
+    전체 체인과 재평가 체인이 함께 쓰는 검색기 (BM25 색인을 한 번만 생성)
+    """
+    retriever = _resources.get("retriever")
+    if retriever is None:
+        vectorstore = get_shared_vectorstore()
+        with _lock:
+            retriever = _resources.get("retriever")
+            if retriever is None:
+                retriever = get_retriever(vectorstore)
+                _resources["retriever"] = retriever
+    return retriever
+
+
+def get_shared_llm():
+    """
+    프로세스 전체에서 공유하는 ChatUpstage 반환
+    동기/비동기 HTTP 클라이언트를 한 번만 만들어 연결(keep-alive)을 재사용하고, 동시 연결 수와 시간 제한을 둠
+    - KTAS_LLM_MAX_CONNECTIONS: 최대 동시 연결 수 (기본 16)
+    - KTAS_LLM_TIMEOUT: 요청 시간 제한(초, 기본 60)
+    - UPSTAGE_API_BASE: API 주소 (로컬 대역 서버로 시험할 때 지정)
+    """
+    llm = _resources.get("llm")
+    if llm is None:
+        with _lock:
+            llm = _resources.get("llm")
+            if llm is None:
+                import httpx
+                from langchain_upstage import ChatUpstage
+
+                max_connections = int(os.getenv("KTAS_LLM_MAX_CONNECTIONS", "16"))
+                timeout = float(os.getenv("KTAS_LLM_TIMEOUT", "60"))
+                limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+                llm = ChatUpstage(
+                    api_key=os.getenv("UPSTAGE_API_KEY"),
+                    model="solar-pro",
+                    timeout=timeout,
+                    http_client=httpx.Client(limits=limits, timeout=timeout),
+                    http_async_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+                )
+                _resources["llm"] = llm
+    return llm
+
+
+def get_response_cache():
+    """
+    응답 캐시 반환 (KTAS_RESPONSE_CACHE=0이면 None)
+    프롬프트와 인덱스 버전이 캐시 버전에 포함되므로 둘 중 하나가 바뀌면 이전 응답은 무효화됨
+    """
+    if os.getenv("KTAS_RESPONSE_CACHE", "1") == "0":
+        return None
+
+    response_cache = _resources.get("response_cache")
+    if response_cache is None:
+        vectorstore = get_shared_vectorstore()
+        with _lock:
+            response_cache = _resources.get("response_cache")
+            if response_cache is None:
+                response_cache = _create_response_cache(vectorstore)
+                _resources["response_cache"] = response_cache
+    return response_cache
+
+
+def _create_response_cache(vectorstore):
+    # 검색 방식이 다르면 같은 입력이라도 답변 근거가 다르므로 버전에 포함
+    version = make_cache_version(get_ktas_prompt(), get_index_version(vectorstore),
+                                 os.getenv("KTAS_RETRIEVER", "hybrid"))
+    kwargs = {"version": version}
+    if os.getenv("KTAS_CACHE_PATH"):
+        kwargs["path"] = os.getenv("KTAS_CACHE_PATH")
+    return ResponseCache(**kwargs)
+
+
+def get_shared_chain():
+    """
+    프로세스 전체에서 공유하는 KTAS RAG 체인 반환 (최초 호출 시에만 생성)
+    응답 캐시가 켜져 있으면 캐시 래퍼를 씌우고, 가장 바깥에 단계별 시간 계측 래퍼를 씌워서 반환
+    """
+    ktas_chain = _resources.get("ktas_chain")
+    if ktas_chain is None:
+        vectorstore = get_shared_vectorstore()
+        retriever = get_shared_retriever()
+        response_cache = get_response_cache()
+        with _lock:
+            ktas_chain = _resources.get("ktas_chain")
+            if ktas_chain is None:
+                ktas_chain = _create_chain(vectorstore, retriever, response_cache)
+                # KTAS_METRICS_PORT가 있으면 /metrics 엔드포인트 시작
+                if os.getenv("KTAS_METRICS_PORT"):
+                    start_metrics_server()
+                _resources["ktas_chain"] = ktas_chain
+    return ktas_chain
+
+
+def _create_chain(vectorstore, retriever, response_cache):
+    with span("chain_build"):
+        # LLM 클라이언트는 첫 요청(또는 백그라운드 워밍업)에서 생성
+        ktas_chain = create_rag_system(vectorstore, llm=lazy_llm(get_shared_llm), retriever=retriever)
+    if response_cache is not None:
+        ktas_chain = CachedChain(ktas_chain, response_cache)
+    return TracedChain(ktas_chain)
+
+
+def get_session_manager():
+    """
+    환자별 재평가 세션 관리자 반환
+    - KTAS_MAX_SESSIONS: 최대 보관 세션 수 (기본 1000)
+    - KTAS_SESSION_TTL: 마지막 갱신 후 세션 유지 시간(초, 기본 12시간)
+    """
+    session_manager = _resources.get("session_manager")
+    if session_manager is None:
+        ktas_chain = get_shared_chain()
+        retriever = get_shared_retriever()
+        with _lock:
+            session_manager = _resources.get("session_manager")
+            if session_manager is None:
+                session_manager = _create_session_manager(ktas_chain, retriever)
+                _resources["session_manager"] = session_manager
+    return session_manager
+
+
+def _create_session_manager(ktas_chain, retriever):
+    delta_chain = TracedChain(create_delta_chain(retriever, llm=lazy_llm(get_shared_llm)))
+    return SessionManager(
+        ktas_chain, delta_chain,
+        max_sessions=int(os.getenv("KTAS_MAX_SESSIONS", "1000")),
+        ttl=float(os.getenv("KTAS_SESSION_TTL", str(12 * 60 * 60))),
+    )
+
+
+def get_deadline_triage():
+    """
+    마감 시간 기반 분류 실행기 반환 (전체 체인과 검색기/응답 캐시/규칙 엔진을 공유)
+    - KTAS_DEADLINE: 기본 마감 시간(초, 기본 10)
+    - KTAS_HEDGE_AFTER: 이 시간(초) 안에 LLM 응답이 없으면 한 번 더 요청 (기본값 없음 = 보내지 않음)
+    - KTAS_MAX_ABANDONED_LLM: 마감 후에도 끝나지 않은 LLM 호출이 이 수 이상이면 새 호출 없이 추정치 반환 (기본 8)
+    """
+    deadline_triage = _resources.get("deadline_triage")
+    if deadline_triage is None:
+        retriever = get_shared_retriever()
+        response_cache = get_response_cache()
+        rule_engine = get_rule_engine()
+        with _lock:
+            deadline_triage = _resources.get("deadline_triage")
+            if deadline_triage is None:
+                deadline_triage = _create_deadline_triage(retriever, response_cache, rule_engine)
+                _resources["deadline_triage"] = deadline_triage
+    return deadline_triage
+
+
+def _create_deadline_triage(retriever, response_cache, rule_engine):
+    context_tokens = int(os.getenv("KTAS_CONTEXT_TOKENS", "800"))
+    answer_chain = create_document_chain(get_ktas_prompt(), lazy_llm(get_shared_llm), context_tokens)
+    hedge_after = os.getenv("KTAS_HEDGE_AFTER")
+    return TracedChain(DeadlineTriage(
+        retriever, answer_chain, rule_engine,
+        deadline=float(os.getenv("KTAS_DEADLINE", "10")),
+        hedge_after=float(hedge_after) if hedge_after else None,
+        cache=response_cache,
+        max_abandoned=int(os.getenv("KTAS_MAX_ABANDONED_LLM", "8")),
+    ))
+
+
+def get_rule_engine():
+    """
+    활력징후 규칙 엔진 반환 (가이드라인 json은 프로세스당 한 번만 로드)
+    """
+    rule_engine = _resources.get("rule_engine")
+    if rule_engine is None:
+        with _lock:
+            rule_engine = _resources.get("rule_engine")
+            if rule_engine is None:
+                rule_engine = VitalSignRuleEngine()
+                _resources["rule_engine"] = rule_engine
+    return rule_engine
+
+
+def get_scheduler():
+    """
+    LLM 호출 스케줄러 반환 (동시 호출 수 KTAS_LLM_WORKERS, 대기열 길이 KTAS_QUEUE_SIZE)
+    """
+    scheduler = _resources.get("scheduler")
+    if scheduler is None:
+        with _lock:
+            scheduler = _resources.get("scheduler")
+            if scheduler is None:
+                scheduler = PriorityScheduler(
+                    workers=int(os.getenv("KTAS_LLM_WORKERS", "4")),
+                    max_queue=int(os.getenv("KTAS_QUEUE_SIZE", "32")),
+                )
+                _resources["scheduler"] = scheduler
+    return scheduler
+
+
+def warmup(probe_query="흉통"):
+    """
+    시작 시점에 리소스를 미리 생성하고, 검색 한 번으로 인덱스와 임베딩 클라이언트를 데움
+    probe_query가 None이면 검색 없이 객체 생성만 수행
+    """
+    start = time.perf_counter()
+    vectorstore = get_shared_vectorstore()
+    get_shared_chain()
+    get_rule_engine()
+    with span("llm_client"):
+        get_shared_llm()
+
+    if probe_query:
+        try:
+            vectorstore.similarity_search(probe_query, k=1)
+        except Exception as e:
+            # 워밍업 실패는 치명적이지 않으므로 기록만 하고 진행
+            print(f"워밍업 검색 실패: {str(e)}")
+
+    elapsed = time.perf_counter() - start
+    print(f"리소스 워밍업 완료: {elapsed:.2f}초")
+    start_index_watcher()
+    return elapsed
+
+
+_warmup_thread = None
+
+
+def warmup_in_background(probe_query="흉통"):
+    """
+    warmup()을 백그라운드 스레드에서 한 번만 시작
+    화면이나 입력 프롬프트를 먼저 띄우고, 사용자가 입력하는 동안 인덱스/체인/LLM 클라이언트를 준비
+    준비 전에 들어온 요청은 get_shared_chain() 등에서 생성이 끝날 때까지 기다림
+    """
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warmup, args=(probe_query,), name="ktas-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def is_ready():
+    """
+    인덱스/체인/LLM 클라이언트가 모두 준비되었는지 (기다리지 않고 확인)
+    """
+    return all(key in _resources for key in ("vectorstore", "ktas_chain", "llm"))
+
+
+def health_check():
+    """
+    공유 리소스 상태 확인
+    """
+    status = {
+        "vectorstore": "vectorstore" in _resources,
+        "ktas_chain": "ktas_chain" in _resources,
+        "documents": None,
+        "ok": False,
+        "error": None,
+    }
+
+    try:
+        vectorstore = get_shared_vectorstore()
+        status["vectorstore"] = True
+        status["index_version"] = getattr(vectorstore, "index_snapshot", {}).get("version")
+        # 문서 수 확인 (Chroma는 컬렉션, NumPy 인덱스는 len)
+        collection = getattr(vectorstore, "_collection", None)
+        if collection is not None:
+            status["documents"] = collection.count()
+        elif hasattr(vectorstore, "__len__"):
+            status["documents"] = len(vectorstore)
+        get_shared_chain()
+        status["ktas_chain"] = True
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            status["cache"] = response_cache.stats()
+        # 임베딩 캐시를 사용하는 경우 적중률 기록
+        embeddings = getattr(vectorstore, "embeddings", None)
+        if hasattr(embeddings, "stats"):
+            status["embedding_cache"] = embeddings.stats()
+        if "scheduler" in _resources:
+            status["scheduler"] = _resources["scheduler"].stats()
+        if "session_manager" in _resources:
+            status["sessions"] = _resources["session_manager"].stats()
+        status["ok"] = status["documents"] != 0
+    except Exception as e:
+        status["error"] = str(e)
+
+    return status
+
+
+# 인덱스와 무관해서 스냅샷을 바꿔도 유지하는 리소스 (작업 스레드/연결이 살아 있음)
+INDEX_INDEPENDENT = ("scheduler", "llm", "rule_engine")
+
+
+def reset(vectorstore=None):
+    """
+    공유 리소스 초기화 (인덱스 재생성 후 다시 로드할 때 사용)
+    스케줄러, LLM 클라이언트, 규칙 엔진은 인덱스와 무관하므로 유지
+    vectorstore를 주면 그 벡터스토어로 교체 (검색기/체인/세션 등은 다음 사용 시 새로 생성)
+    """
+    with _lock:
+        kept = {key: _resources[key] for key in INDEX_INDEPENDENT if key in _resources}
+        _resources.clear()
+        _resources.update(kept)
+        if vectorstore is not None:
+            _resources["vectorstore"] = vectorstore
+
+
+def _create_index_resources(vectorstore):
+    """
+    새 벡터스토어에 대한 검색기/응답 캐시/체인 (이미 쓰이던 재평가 세션, 마감 시간 실행기도 함께)
+    공유 리소스를 건드리지 않고 만들기만 함
+    """
+    resources = {"vectorstore": vectorstore, "retriever": get_retriever(vectorstore)}
+    if os.getenv("KTAS_RESPONSE_CACHE", "1") != "0":
+        resources["response_cache"] = _create_response_cache(vectorstore)
+    resources["ktas_chain"] = _create_chain(vectorstore, resources["retriever"], resources.get("response_cache"))
+    if "session_manager" in _resources:
+        resources["session_manager"] = _create_session_manager(resources["ktas_chain"], resources["retriever"])
+    if "deadline_triage" in _resources:
+        resources["deadline_triage"] = _create_deadline_triage(
+            resources["retriever"], resources.get("response_cache"), get_rule_engine())
+    return resources
+
+
+def refresh_index():
+    """
+    CURRENT가 다른 스냅샷으로 바뀌었으면 새 스냅샷으로 교체 (바뀌었으면 True)
+    새 스냅샷을 먼저 열고 체인까지 만든 뒤 다음 요청부터 사용, 진행 중인 요청은 이전 스냅샷으로 끝남
+    재평가 세션은 이전 인덱스의 검색 결과를 들고 있으므로 함께 비움 (다음 평가는 전체 체인으로 실행)
+    KTAS_INDEX_VERSION으로 버전을 고정했으면 교체하지 않음
+    """
+    snapshot = getattr(_resources.get("vectorstore"), "index_snapshot", None)
+    if snapshot is None or os.getenv("KTAS_INDEX_VERSION"):
+        return False
+    version = current_version(snapshot["root"])
+    if version is None or version == snapshot["version"]:
+        return False
+
+    with span("vectorstore_open"):
+        vectorstore = get_vectorstore()
+    resources = _create_index_resources(vectorstore)
+    # 다 만든 뒤 잠금 안에서 한 번에 교체 (비우지 않고 덮어써서 잠금 없이 읽는 요청도 빈 상태를 보지 않음)
+    with _lock:
+        retired = {key: _resources[key] for key in ("vectorstore", "response_cache") if key in _resources}
+        for key in [key for key in _resources if key not in INDEX_INDEPENDENT and key not in resources]:
+            del _resources[key]
+        _resources.update(resources)
+    print(f"인덱스 스냅샷 교체: {snapshot['version']} -> {version}")
+    _retire(retired)
+    return True
+
+
+def _retire(retired):
+    """
+    교체된 벡터스토어(Chroma 클라이언트/SQLite 연결)와 응답 캐시 연결을 닫음
+    교체 직전에 시작한 요청이 이전 객체로 끝날 수 있도록 KTAS_INDEX_CLOSE_DELAY초(기본 60) 뒤에 닫음
+    """
+    def close():
+        try:
+            close_index(retired["vectorstore"])
+            if retired.get("response_cache") is not None:
+                retired["response_cache"].close()
+        except Exception as e:
+            print(f"이전 인덱스 스냅샷 닫기 실패: {str(e)}")
+
+    timer = threading.Timer(float(os.getenv("KTAS_INDEX_CLOSE_DELAY", "60")), close)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+_index_watcher = None
+
+
+def start_index_watcher(interval=None):
+    """
+    interval초마다 CURRENT를 확인해서 새 스냅샷으로 교체하는 백그라운드 스레드를 한 번만 시작
+    기본값은 KTAS_INDEX_CHECK_INTERVAL(30초), 0이면 시작하지 않음
+    """
+    global _index_watcher
+    interval = float(os.getenv("KTAS_INDEX_CHECK_INTERVAL", "30")) if interval is None else interval
+    if interval <= 0:
+        return None
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh_index()
+            except Exception as e:
+                # 새 스냅샷을 열지 못하면 이전 스냅샷을 계속 사용
+                print(f"인덱스 스냅샷 교체 실패: {str(e)}")
+
+    with _lock:
+        if _index_watcher is None:
+            _index_watcher = threading.Thread(target=watch, name="ktas-index-watcher", daemon=True)
+            _index_watcher.start()
+    return _index_watcher
@@ -0,0 +1,165 @@
+# 검색기 모음
+# BM25(키워드) 검색과 dense(벡터) 검색 결과를 RRF(Reciprocal Rank Fusion)로 합침
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+import contextvars, heapq, math, re, threading
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+_word = re.compile(r"[0-9a-z가-힣]+")
+_hangul = re.compile(r"[가-힣]")
+
+
+def tokenize_korean(text, ngram=2):
+    """
+    한국어 검색용 토큰화
+    한글 단어는 문자 n-gram으로 나눠 조사/어미가 붙어도 매칭되게 하고 ('흉통이' -> '흉통', '통이'),
+    영문/숫자 단어(GCS, SIRS 등)는 그대로 사용
+    """
+    tokens = []
+    for word in _word.findall((text or "").lower()):
+        if not _hangul.search(word) or len(word) <= ngram:
+            tokens.append(word)
+            continue
+        tokens.extend(word[i:i + ngram] for i in range(len(word) - ngram + 1))
+    return tokens
+
+
+def _match_filter(metadata, filter):
+    return all(metadata.get(key) == value for key, value in (filter or {}).items())
+
+
+class BM25Index:
+    """
+    메모리 역색인 기반 BM25 검색
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75, tokenizer=tokenize_korean):
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+
+        # term -> [(문서 번호, 빈도)]
+        self.postings = defaultdict(list)
+        self.doc_lengths = []
+        for doc_idx, document in enumerate(self.documents):
+            counts = Counter(tokenizer(document.page_content))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((doc_idx, tf))
+
+        n_docs = len(self.documents)
+        self.avg_length = sum(self.doc_lengths) / n_docs if n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+
+    def search(self, query, k=3, filter=None):
+        """
+        (문서, 점수) 목록을 점수 높은 순으로 반환, filter는 메타데이터 일치 조건
+        """
+        scores = defaultdict(float)
+        for term in set(self.tokenizer(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_idx, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / self.avg_length)
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if filter:
+            scores = {i: s for i, s in scores.items() if _match_filter(self.documents[i].metadata, filter)}
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[doc_idx], score) for doc_idx, score in top]
+
+
+class BM25Retriever(BaseRetriever):
+    """
+    BM25Index를 LangChain retriever로 감싼 것
+    """
+    index: Any
+    k: int = 3
+    filter: dict = {}
+
+    def _get_relevant_documents(self, query, *, run_manager=None, filter=None) -> List[Document]:
+        search_filter = {**self.filter, **(filter or {})}
+        return [document for document, _ in self.index.search(query, k=self.k, filter=search_filter)]
+
+
+def _document_key(document):
+    return document.id or document.page_content
+
+
+def reciprocal_rank_fusion(result_lists, k=3, rrf_k=60, weights=None):
+    """
+    여러 검색 결과 목록을 RRF 점수(sum(weight / (rrf_k + 순위)))로 합쳐 상위 k개 반환
+    """
+    weights = weights or [1.0] * len(result_lists)
+    scores = defaultdict(float)
+    documents = {}
+    for weight, results in zip(weights, result_lists):
+        for rank, document in enumerate(results, 1):
+            key = _document_key(document)
+            scores[key] += weight / (rrf_k + rank)
+            documents.setdefault(key, document)
+
+    top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    return [documents[key] for key, _ in top]
+
+
+_search_pool = None
+_search_pool_lock = threading.Lock()
+
+
+def _get_search_pool():
+    # 하위 retriever 동시 실행용 스레드 풀 (프로세스당 1개)
+    global _search_pool
+    if _search_pool is None:
+        with _search_pool_lock:
+            if _search_pool is None:
+                _search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ktas-search")
+    return _search_pool
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    여러 retriever 결과를 RRF로 합치는 retriever (기존 dense retriever와 같은 방식으로 사용)
+    parallel이면 하위 retriever를 동시에 실행 (BM25 계산 중에 질의 임베딩 API 응답을 기다림)
+    """
+    retrievers: List[BaseRetriever]
+    weights: List[float] = []
+    k: int = 3
+    rrf_k: int = 60
+    parallel: bool = False
+
+    def _get_relevant_documents(self, query, *, run_manager=None, **kwargs) -> List[Document]:
+        # filter 등 검색 옵션은 하위 retriever에 그대로 전달
+        callbacks = run_manager.get_child() if run_manager else None
+
+        def search(retriever):
+            return retriever.invoke(query, config={"callbacks": callbacks}, **kwargs)
+
+        if self.parallel and len(self.retrievers) > 1:
+            # 요청 계측 컨텍스트(단계 시간 기록)를 작업 스레드에도 전달
+            futures = [_get_search_pool().submit(contextvars.copy_context().run, search, retriever)
+                       for retriever in self.retrievers[1:]]
+            result_lists = [search(self.retrievers[0])] + [future.result() for future in futures]
+        else:
+            result_lists = [search(retriever) for retriever in self.retrievers]
+        return reciprocal_rank_fusion(result_lists, k=self.k, rrf_k=self.rrf_k, weights=self.weights or None)
+
+
+def load_documents_from_vectorstore(vectorstore):
+    """
+    벡터스토어에 저장된 문서를 Document 목록으로 읽기 (BM25 색인용, PPTX 없이 동작)
+    """
+    stored = vectorstore.get(include=["documents", "metadatas"])
+    return [
+        Document(id=doc_id, page_content=content or "", metadata=metadata or {})
+        for doc_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+    ]
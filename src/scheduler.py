@@ -0,0 +1,146 @@
+# 중증도 우선 LLM 호출 스케줄러
+# 동시에 실행하는 LLM 호출 수를 제한하고, 대기 중인 요청은 활력징후 규칙으로 추정한 중증도 순으로 처리
+# (심정지 의심 환자가 발목 염좌 환자 뒤에서 기다리지 않도록 함)
+from concurrent.futures import Future
+import heapq, itertools, logging, threading, time
+
+from src.telemetry import metrics
+from src.triage_rules import parse_avpu, parse_vital_signs
+
+logger = logging.getLogger(__name__)
+
+# 규칙 엔진(KTAS 1/2)에 걸리지 않은 환자의 사전 중증도 추정 기준
+TACHYCARDIA_HR = 130
+BRADYCARDIA_HR = 50
+HIGH_FEVER_TEMP = 39.0
+HYPOTHERMIA_TEMP = 35.0
+HYPOGLYCEMIA_GLUCOSE = 60
+
+
+class QueueFull(Exception):
+    """
+    대기열이 가득 차 요청을 받을 수 없음
+    """
+
+
+def estimate_acuity(decision, vital_signs=None, consciousness=None):
+    """
+    LLM 없이 계산하는 사전 중증도 (1이 가장 급함, 대기열 우선순위로만 사용)
+    - 규칙 엔진이 KTAS 1/2를 판정하면 그 레벨
+    - 의식 저하(V/P/U) 또는 뚜렷한 활력징후 이상이 있으면 3
+    - 활력징후를 읽을 수 있고 이상이 없으면 4, 읽을 수 없으면 3(판단 보류)
+    """
+    if decision and decision.get("level"):
+        return decision["level"]
+
+    vitals = decision["vitals"] if decision else parse_vital_signs(vital_signs)
+    avpu = decision["avpu"] if decision else parse_avpu(consciousness)
+    if avpu in ("V", "P", "U"):
+        return 3
+
+    values = [vitals.sbp, vitals.heart_rate, vitals.spo2, vitals.temperature, vitals.glucose]
+    if all(value is None for value in values):
+        return 3
+
+    abnormal = (
+        (vitals.heart_rate is not None and not BRADYCARDIA_HR <= vitals.heart_rate < TACHYCARDIA_HR)
+        or (vitals.temperature is not None and not HYPOTHERMIA_TEMP <= vitals.temperature < HIGH_FEVER_TEMP)
+        or (vitals.glucose is not None and vitals.glucose < HYPOGLYCEMIA_GLUCOSE)
+    )
+    return 3 if abnormal else 4
+
+
+class PriorityScheduler:
+    """
+    우선순위 대기열 + 고정 크기 작업 스레드 풀
+    - workers: 동시에 실행할 최대 작업 수 (LLM 동시 호출 수)
+    - max_queue: 대기열 최대 길이, 가득 차면 submit()이 QueueFull을 발생시킴
+    priority가 작은 작업부터, 같으면 먼저 들어온 작업부터 실행
+    """
+
+    def __init__(self, workers=4, max_queue=32, name="llm"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.name = name
+        self._heap = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-scheduler-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._update_gauges()
+
+    def submit(self, priority, func, *args, **kwargs):
+        """
+        작업을 대기열에 넣고 concurrent.futures.Future 반환
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("스케줄러가 종료되었습니다")
+            if len(self._heap) >= self.max_queue:
+                metrics.increment("scheduler_rejected_total", scheduler=self.name, priority=priority)
+                raise QueueFull(f"대기열이 가득 찼습니다 ({self.max_queue}건)")
+            heapq.heappush(self._heap, (priority, next(self._sequence), time.perf_counter(), future, func, args, kwargs))
+            self._update_gauges()
+            self._cond.notify()
+        metrics.increment("scheduler_submitted_total", scheduler=self.name, priority=priority)
+        return future
+
+    def saturated(self):
+        with self._cond:
+            return len(self._heap) >= self.max_queue
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queue_depth": len(self._heap),
+                "in_flight": self._in_flight,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+            }
+
+    def shutdown(self, wait=True):
+        """
+        새 작업을 받지 않고, 대기 중인 작업까지 처리한 뒤 스레드 종료
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _update_gauges(self):
+        # self._cond를 잡은 상태에서 호출
+        metrics.set_gauge("queue_depth", len(self._heap), scheduler=self.name)
+        metrics.set_gauge("in_flight", self._in_flight, scheduler=self.name)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                priority, _, submitted, future, func, args, kwargs = heapq.heappop(self._heap)
+                self._in_flight += 1
+                self._update_gauges()
+
+            try:
+                # 대기 중에 취소된 작업(클라이언트 연결 끊김 등)은 실행하지 않음
+                if future.set_running_or_notify_cancel():
+                    metrics.observe_stage("queue_wait", time.perf_counter() - submitted)
+                    try:
+                        future.set_result(func(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._update_gauges()
@@ -0,0 +1,320 @@
+# KTAS 분류 HTTP 서비스 (ASGI)
+# uvicorn src.server:app --port 8000  또는  python src/server.py --port 8000
+# EMR 등 외부 시스템에서 호출할 수 있도록 단건/일괄/스트리밍 엔드포인트 제공
+# 벡터스토어/체인/LLM 클라이언트는 프로세스당 하나를 공유하고,
+# 체인 실행은 중증도 우선 스케줄러(동시 실행 KTAS_LLM_WORKERS, 대기열 KTAS_QUEUE_SIZE)를 거침
+import asyncio, dataclasses, json, logging, os, sys, time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+
+from src.rag_system import build_chain_input, stream_answer
+from src.resources import (get_deadline_triage, get_rule_engine, get_scheduler, get_session_manager, get_shared_chain,
+                           health_check, warmup)
+from src.scheduler import QueueFull, estimate_acuity
+from src.telemetry import metrics
+from src.triage_rules import format_decision
+
+logger = logging.getLogger(__name__)
+
+# 일괄 요청 한 번에 받을 수 있는 최대 환자 수
+MAX_BATCH_SIZE = int(os.getenv("KTAS_SERVER_MAX_BATCH", "100"))
+# 요청에 deadline이 없을 때 적용할 마감 시간(초), 0이면 마감 없이 LLM 답변을 기다림
+DEFAULT_DEADLINE = float(os.getenv("KTAS_SERVER_DEADLINE", "0"))
+
+
+class Patient(BaseModel):
+    symptoms: str = Field(min_length=1)
+    vital_signs: str = Field(min_length=1)
+    sex: str = ""
+    age: str = ""
+    consciousness: str = ""
+    diseases: str = ""
+    medications: str = ""
+
+    @field_validator("age", mode="before")
+    @classmethod
+    def age_as_text(cls, value):
+        # EMR에서 숫자로 보내는 나이도 허용 (65 -> "65")
+        return "" if value is None else str(value)
+
+
+class BatchRequest(BaseModel):
+    patients: List[Patient]
+
+
+class TriageResult(BaseModel):
+    level: Optional[int] = None
+    answer: Optional[str] = None
+    rule: Optional[dict] = None
+    acuity: Optional[int] = None
+    cached: bool = False
+    # 대기열이 가득 차 LLM 없이 규칙 결과만 반환한 경우
+    shed: bool = False
+    # 세션 재평가: unchanged(이전 결과) / delta(재평가 프롬프트) / full(전체 체인), 바뀐 항목
+    mode: Optional[str] = None
+    changes: Optional[List[str]] = None
+    # 마감 시간 안에 LLM 답변을 받지 못해 가이드라인 기준 추정치로 대체한 경우
+    degraded: bool = False
+    degraded_reason: Optional[str] = None
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+def rule_result(decision):
+    """
+    규칙 엔진 결과를 JSON으로 보낼 수 있는 형태로 변환 (KTAS 1/2에 해당하지 않으면 None)
+    """
+    if not decision["level"]:
+        return None
+    return {**decision, "vitals": dataclasses.asdict(decision["vitals"])}
+
+
+def evaluate_rules(patient):
+    """
+    (규칙 엔진 결과, 대기열 우선순위로 쓸 사전 중증도) 반환
+    """
+    decision = get_rule_engine().evaluate(
+        patient.get("vital_signs"), patient.get("consciousness"), patient.get("age"), patient.get("diseases")
+    )
+    return decision, estimate_acuity(decision)
+
+
+def shed_result(decision, acuity):
+    """
+    대기열 포화 시 응답: 규칙 엔진이 KTAS 1/2를 판정했으면 그 결과만 바로 반환, 아니면 503
+    """
+    if not decision["level"]:
+        raise HTTPException(503, "요청이 많아 잠시 후 다시 시도해 주세요", headers={"Retry-After": "5"})
+    metrics.increment("scheduler_shed_total", level=decision["level"])
+    return TriageResult(level=decision["level"], answer=format_decision(decision), rule=rule_result(decision),
+                        acuity=acuity, shed=True)
+
+
+def shed_events(result, acuity):
+    """
+    대기열 포화 시 스트리밍 응답 줄 (규칙 결과 -> 레벨 -> done)
+    """
+    return [
+        json.dumps({"event": "rule", "rule": result.rule, "acuity": acuity}, ensure_ascii=False) + "\n",
+        json.dumps({"event": "level", "level": result.level}) + "\n",
+        json.dumps({"event": "done", "shed": True}) + "\n",
+    ]
+
+
+def triage_patient(patient, decision, acuity, submitted, session_id=None, deadline=None):
+    """
+    환자 한 명 평가 (스케줄러 작업 스레드에서 실행)
+    session_id가 있으면 같은 세션의 이전 평가와 비교해 바뀐 단계만 다시 실행
+    deadline(초)이 있으면 대기열에서 기다린 시간을 포함해 마감 시간 안에 결과를 반환
+    """
+    chain_input = build_chain_input(patient)
+    if session_id is not None:
+        response = get_session_manager().invoke(session_id, chain_input)
+    elif deadline:
+        response = get_deadline_triage().invoke(chain_input, deadline=deadline, started=submitted)
+    else:
+        response = get_shared_chain().invoke(chain_input)
+    return TriageResult(
+        level=response.get("level"),
+        answer=response["answer"],
+        rule=rule_result(decision),
+        acuity=acuity,
+        cached=response.get("cached", False),
+        mode=response.get("mode"),
+        changes=response.get("changes"),
+        degraded=response.get("degraded", False),
+        degraded_reason=response.get("degraded_reason"),
+        elapsed=round(time.perf_counter() - submitted, 3),
+    )
+
+
+async def schedule_triage(patient, session_id=None, deadline=None):
+    patient = patient.model_dump()
+    decision, acuity = evaluate_rules(patient)
+    if session_id is not None:
+        plan = await run_in_threadpool(get_session_manager().plan, session_id, build_chain_input(patient))
+        if plan["mode"] == "unchanged":
+            # 입력이 그대로면 LLM을 호출하지 않으므로 대기열을 거치지 않음
+            return await run_in_threadpool(triage_patient, patient, decision, acuity, time.perf_counter(), session_id)
+    try:
+        future = get_scheduler().submit(acuity, triage_patient, patient, decision, acuity, time.perf_counter(),
+                                        session_id, deadline)
+    except QueueFull:
+        return shed_result(decision, acuity)
+    return await asyncio.wrap_future(future)
+
+
+def stream_events(patient, decision, acuity):
+    """
+    스트리밍 이벤트 생성 (스케줄러 작업 스레드에서 실행)
+    rule(규칙 결과) -> level(답변 첫 줄의 KTAS 레벨) -> text(설명 조각)... -> done 순서
+    """
+    yield {"event": "rule", "rule": rule_result(decision), "acuity": acuity}
+    levels, timings = [], {}
+    for text in stream_answer(get_shared_chain(), build_chain_input(patient), timings, levels.append):
+        while levels:
+            yield {"event": "level", "level": levels.pop(0)}
+        yield {"event": "text", "text": text}
+    while levels:
+        yield {"event": "level", "level": levels.pop(0)}
+    yield {"event": "done", "timings": {key: round(value, 3) for key, value in timings.items()}}
+
+
+async def iterate_in_thread(make_iterator, run=None):
+    """
+    동기 제너레이터를 작업 스레드 하나에서 끝까지 실행하고, 나오는 값을 비동기로 전달
+    (조각마다 스레드가 바뀌면 요청 계측 컨텍스트가 끊기므로 한 스레드에서 실행)
+    run: 함수를 받아 concurrent.futures.Future를 반환하는 실행기 (기본값은 이벤트 루프의 스레드 풀)
+    클라이언트 연결이 끊기면 다음 조각에서 생성을 멈춤 (대기열에서 기다리는 중이면 실행하지 않음)
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = False
+    done = object()
+
+    def produce():
+        iterator = make_iterator()
+        try:
+            for item in iterator:
+                if stopped:
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            iterator.close()
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = asyncio.wrap_future(run(produce)) if run else loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped = True
+        if not producer.cancel():
+            await asyncio.shield(producer)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # 첫 요청 전에 벡터스토어/체인/규칙 엔진/스케줄러를 만들고 인덱스를 데움
+    get_scheduler()
+    if os.getenv("KTAS_SERVER_WARMUP", "1") != "0":
+        await run_in_threadpool(warmup)
+    yield
+
+
+app = FastAPI(title="KTAS 중증도 분류 API", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return await run_in_threadpool(health_check)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return metrics.to_prometheus()
+
+
+@app.post("/triage", response_model=TriageResult)
+async def triage(patient: Patient, deadline: Optional[float] = None):
+    """
+    deadline(초): 이 시간 안에 LLM 답변이 없으면 가이드라인 기준 추정치(degraded=true)를 반환
+    """
+    return await schedule_triage(patient, deadline=deadline if deadline is not None else DEFAULT_DEADLINE)
+
+
+@app.post("/triage/batch", response_model=List[TriageResult])
+async def triage_batch(request: BatchRequest, deadline: Optional[float] = None):
+    if len(request.patients) > MAX_BATCH_SIZE:
+        raise HTTPException(413, f"한 번에 최대 {MAX_BATCH_SIZE}명까지 평가할 수 있습니다")
+
+    async def run(patient):
+        # 환자별로 스케줄러에 넣으므로 다른 요청과 함께 중증도 순서와 동시성 한도를 지킴
+        try:
+            return await schedule_triage(patient, deadline=deadline if deadline is not None else DEFAULT_DEADLINE)
+        except HTTPException as e:
+            return TriageResult(error=e.detail)
+        except Exception as e:
+            logger.exception("일괄 평가 실패")
+            return TriageResult(error=f"{type(e).__name__}: {str(e)}")
+
+    return await asyncio.gather(*(run(patient) for patient in request.patients))
+
+
+@app.post("/triage/stream")
+async def triage_stream(patient: Patient):
+    """
+    줄 단위 JSON(application/x-ndjson) 스트리밍
+    """
+    patient = patient.model_dump()
+    decision, acuity = evaluate_rules(patient)
+    scheduler = get_scheduler()
+    if scheduler.saturated():
+        result = shed_result(decision, acuity)
+        return StreamingResponse(iter(shed_events(result, acuity)), media_type="application/x-ndjson")
+
+    def run(produce):
+        return scheduler.submit(acuity, produce)
+
+    async def body():
+        try:
+            async for event in iterate_in_thread(lambda: stream_events(patient, decision, acuity), run):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except QueueFull:
+            # 포화 확인 뒤 다른 요청이 대기열을 채운 경우 (응답 헤더를 이미 보냈으므로 503 대신 오류 줄)
+            try:
+                result = shed_result(decision, acuity)
+            except HTTPException as e:
+                yield json.dumps({"event": "error", "error": e.detail, "shed": True}, ensure_ascii=False) + "\n"
+                return
+            for line in shed_events(result, acuity):
+                yield line
+        except Exception as e:
+            logger.exception("스트리밍 평가 실패")
+            yield json.dumps({"event": "error", "error": f"{type(e).__name__}: {str(e)}"}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.post("/sessions/{session_id}/triage", response_model=TriageResult)
+async def session_triage(session_id: str, patient: Patient):
+    """
+    같은 환자 재평가 (처음이면 전체 평가, 이후에는 바뀐 항목만 반영)
+    """
+    return await schedule_triage(patient, session_id)
+
+
+@app.delete("/sessions/{session_id}")
+async def close_session(session_id: str):
+    return {"closed": get_session_manager().close(session_id)}
+
+
+def main():
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="KTAS 분류 HTTP 서비스")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# 환자별 재평가 세션
+# 같은 환자의 활력징후/증상이 바뀌어 다시 평가할 때 이전 입력, 검색 결과, 답변을 보관해 두고
+# 바뀐 항목에 영향을 받는 단계만 다시 실행
+# - 입력이 (정규화 기준으로) 같으면 이전 결과를 그대로 반환
+# - 증상(검색 쿼리)이 바뀌면 검색부터 전체 체인을 다시 실행
+# - 그 외(활력징후, 의식상태, 기저질환 등)는 이전 검색 결과를 재사용하고 짧은 재평가 프롬프트로 LLM만 호출
+#   (나이가 바뀌어 성인/소아 구분이 달라지면 검색만 다시 수행)
+from collections import OrderedDict
+import logging, re, threading, time
+
+from src.answer_parser import parse_ktas_level
+from src.cache import CACHE_FIELDS, normalize_chain_input
+from src.rag_system import derive_search_filter
+from src.telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+FIELD_NAMES = {
+    "input": "증상",
+    "sex": "성별",
+    "age": "나이",
+    "vital_signs": "활력징후",
+    "consciousness": "의식상태",
+    "diseases": "기저질환",
+    "medications": "복용약물",
+}
+
+# 재평가 프롬프트에 넣을 이전 평가 요약 최대 길이
+SUMMARY_CHARS = 400
+
+_evaluation_section = re.compile(r"\[KTAS 평가\](.*?)(?=\[주의사항\]|$)", re.S)
+
+
+def diff_inputs(previous, current):
+    """
+    정규화 후 값이 달라진 항목 [(필드, 이전 값, 새 값)] (공백/표기 차이만 있는 입력은 같은 것으로 봄)
+    """
+    before, after = normalize_chain_input(previous), normalize_chain_input(current)
+    return [(field, previous.get(field), current.get(field)) for field in CACHE_FIELDS if before[field] != after[field]]
+
+
+def plan_update(session, chain_input):
+    """
+    다시 실행할 단계 결정
+    mode: unchanged(이전 결과 반환) / delta(재평가 프롬프트) / full(전체 체인)
+    retrieve: delta에서 검색을 다시 해야 하는지
+    """
+    if session is None or not session.answer:
+        return {"mode": "full", "changes": [], "retrieve": True}
+
+    changes = diff_inputs(session.chain_input, chain_input)
+    if not changes:
+        return {"mode": "unchanged", "changes": [], "retrieve": False}
+    if any(field == "input" for field, _, _ in changes):
+        return {"mode": "full", "changes": changes, "retrieve": True}
+
+    retrieve = session.context is None or derive_search_filter(session.chain_input) != derive_search_filter(chain_input)
+    return {"mode": "delta", "changes": changes, "retrieve": retrieve}
+
+
+def format_changes(changes):
+    return "\n".join(f"- {FIELD_NAMES.get(field, field)}: {before} -> {after}" for field, before, after in changes)
+
+
+def summarize_assessment(answer, max_chars=SUMMARY_CHARS):
+    """
+    이전 답변에서 [KTAS 평가] 부분만 잘라서 반환 (없으면 답변 앞부분)
+    """
+    match = _evaluation_section.search(answer or "")
+    summary = (match.group(1) if match else answer or "").strip()
+    return summary[:max_chars]
+
+
+class PatientSession:
+    """
+    환자 한 명의 마지막 평가 상태
+    """
+
+    def __init__(self, chain_input, context, answer, level):
+        self.chain_input = dict(chain_input)
+        self.context = context
+        self.answer = answer
+        self.level = level
+        self.assessments = 1
+        self.updated = time.time()
+
+    def to_dict(self):
+        return {
+            "level": self.level,
+            "assessments": self.assessments,
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.updated)),
+        }
+
+
+class SessionManager:
+    """
+    세션 ID별 재평가 관리 (invoke/stream 결과 형식은 ktas_chain과 같고 mode/changes 키가 추가됨)
+    - chain: 전체 체인 (검색 + few-shot 프롬프트)
+    - delta_chain: 재평가 체인 (rag_system.create_delta_chain)
+    - max_sessions: 최대 보관 세션 수, 넘으면 가장 오래 갱신되지 않은 세션부터 삭제
+    - ttl: 마지막 갱신 후 세션 유지 시간(초)
+    같은 세션에 동시에 들어온 갱신은 나중에 끝난 결과가 남음
+    """
+
+    def __init__(self, chain, delta_chain, max_sessions=1000, ttl=12 * 60 * 60):
+        self.chain = chain
+        self.delta_chain = delta_chain
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self.ttl is not None and time.time() - session.updated > self.ttl:
+                del self._sessions[session_id]
+                session = None
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def plan(self, session_id, chain_input):
+        return plan_update(self.get(session_id), chain_input)
+
+    def _save(self, session_id, chain_input, response, previous):
+        level = response.get("level") or parse_ktas_level(response["answer"])
+        session = PatientSession(chain_input, response.get("context"), response["answer"], level)
+        if previous is not None:
+            session.assessments = previous.assessments + 1
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def stream(self, session_id, chain_input, config=None):
+        """
+        바뀐 단계만 다시 실행하면서 체인 출력 조각을 그대로 반환
+        끝까지 생성된 경우에만 세션을 갱신 (중간에 끊긴 답변은 저장하지 않음)
+        """
+        session = self.get(session_id)
+        plan = plan_update(session, chain_input)
+        metrics.increment("session_updates_total", mode=plan["mode"])
+        logger.info("세션 %s 재평가: %s (변경 %s)", session_id, plan["mode"],
+                    ", ".join(field for field, _, _ in plan["changes"]) or "없음")
+
+        if plan["mode"] == "unchanged":
+            yield {**chain_input, "context": session.context, "answer": session.answer, "level": session.level,
+                   "mode": "unchanged", "changes": []}
+            return
+
+        if plan["mode"] == "full":
+            chain, run_input = self.chain, chain_input
+        else:
+            chain = self.delta_chain
+            run_input = {
+                **chain_input,
+                # 검색을 다시 해야 하면 None을 넘겨 delta_chain 안에서 검색
+                "context": None if plan["retrieve"] else session.context,
+                "previous_level": session.level or "미확인",
+                "previous_summary": summarize_assessment(session.answer),
+                "changed_fields": format_changes(plan["changes"]),
+            }
+
+        response, parts = {}, []
+        yield {"mode": plan["mode"], "changes": [field for field, _, _ in plan["changes"]]}
+        for chunk in chain.stream(run_input, config=config):
+            if chunk.get("answer"):
+                parts.append(chunk["answer"])
+            response.update({key: value for key, value in chunk.items() if key != "answer"})
+            yield chunk
+        if parts:
+            response["answer"] = "".join(parts)
+            self._save(session_id, chain_input, response, session)
+
+    def invoke(self, session_id, chain_input, config=None):
+        response, parts = {}, []
+        for chunk in self.stream(session_id, chain_input, config):
+            if chunk.get("answer"):
+                parts.append(chunk["answer"])
+            response.update({key: value for key, value in chunk.items() if key != "answer"})
+        response["answer"] = "".join(parts)
+        # 캐시에서 꺼낸 응답은 level 조각 없이 answer만 오므로 답변에서 다시 파싱
+        response["level"] = response.get("level") or parse_ktas_level(response["answer"])
+        return response
+
+    def bind(self, session_id):
+        """
+        세션 하나에 고정된 체인 (stream_answer 등 ktas_chain을 받는 함수에 그대로 전달)
+        """
+        return BoundSession(self, session_id)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+
+class BoundSession:
+    def __init__(self, manager, session_id):
+        self.manager = manager
+        self.session_id = session_id
+
+    def invoke(self, chain_input, config=None):
+        return self.manager.invoke(self.session_id, chain_input, config)
+
+    def stream(self, chain_input, config=None):
+        return self.manager.stream(self.session_id, chain_input, config)
@@ -0,0 +1,391 @@
+# 단계별 지연 시간 계측
+# 요청마다 단계(벡터스토어 열기, 질의 임베딩, 검색, 프롬프트 구성, LLM 생성)별 시간, 토큰 수, 캐시 적중을 기록하고
+# 회전 JSONL 로그와 Prometheus 텍스트 형식(파일/HTTP)으로 내보냄
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+import atexit, json, logging, os, threading, time, uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_DIR = os.getenv("KTAS_LOG_DIR", os.path.join(ROOT_DIR, "logs"))
+
+# 지연 시간 히스토그램 구간(초)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# LangChain 실행 이름 -> 단계 이름
+RUN_STAGES = {
+    "retrieve_documents": "retrieval",
+    "ChatPromptTemplate": "prompt_assembly",
+}
+
+_current_trace = ContextVar("ktas_trace", default=None)
+
+
+class Metrics:
+    """
+    프로세스 전체 누적 지표 (Prometheus 텍스트로 변환)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.stage_sum = defaultdict(float)
+        self.stage_count = defaultdict(int)
+        self.stage_buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.cache = defaultdict(int)     # (캐시 이름, hit/miss) -> 횟수
+        self.tokens = defaultdict(int)    # prompt/completion -> 토큰 수
+        self.gauges = {}                  # (이름, 라벨) -> 현재 값 (대기열 길이 등)
+        self.counters = defaultdict(int)  # (이름, 라벨) -> 횟수
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def increment(self, name, amount=1, **labels):
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            self.stage_sum[stage] += seconds
+            self.stage_count[stage] += 1
+            buckets = self.stage_buckets[stage]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+
+    def observe_trace(self, trace):
+        with self._lock:
+            self.requests += 1
+            self.errors += 1 if trace.get("error") else 0
+            for (name, result), count in trace["cache_counts"].items():
+                self.cache[(name, result)] += count
+            for kind, count in trace["tokens"].items():
+                self.tokens[kind] += count
+        for stage, seconds in trace["stages"].items():
+            self.observe_stage(stage, seconds)
+        self.observe_stage("total", trace["total"])
+
+    def to_prometheus(self):
+        with self._lock:
+            lines = [
+                "# TYPE ktas_requests_total counter",
+                f"ktas_requests_total {self.requests}",
+                "# TYPE ktas_request_errors_total counter",
+                f"ktas_request_errors_total {self.errors}",
+                "# TYPE ktas_stage_seconds histogram",
+            ]
+            for stage in sorted(self.stage_count):
+                for bound, count in zip(BUCKETS, self.stage_buckets[stage]):
+                    lines.append(f'ktas_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'ktas_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {self.stage_count[stage]}')
+                lines.append(f'ktas_stage_seconds_sum{{stage="{stage}"}} {self.stage_sum[stage]:.6f}')
+                lines.append(f'ktas_stage_seconds_count{{stage="{stage}"}} {self.stage_count[stage]}')
+            lines.append("# TYPE ktas_cache_total counter")
+            for (name, result), count in sorted(self.cache.items()):
+                lines.append(f'ktas_cache_total{{cache="{name}",result="{result}"}} {count}')
+            lines.append("# TYPE ktas_tokens_total counter")
+            for kind, count in sorted(self.tokens.items()):
+                lines.append(f'ktas_tokens_total{{type="{kind}"}} {count}')
+            for kind, values in (("gauge", self.gauges), ("counter", self.counters)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# TYPE ktas_{name} {kind}")
+                    for (metric, labels), value in sorted(values.items()):
+                        if metric == name:
+                            label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                            lines.append(f"ktas_{name}{{{label_text}}} {value}" if labels else f"ktas_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+recent_traces = deque(maxlen=int(os.getenv("KTAS_TRACE_HISTORY", "50")))
+startup_spans = {}
+
+_trace_logger = None
+_trace_logger_lock = threading.Lock()
+
+
+def _get_trace_logger():
+    # 요청 기록용 회전 JSONL 로그 (5MB x 5개)
+    global _trace_logger
+    if _trace_logger is None:
+        with _trace_logger_lock:
+            if _trace_logger is None:
+                os.makedirs(LOG_DIR, exist_ok=True)
+                trace_logger = logging.getLogger("ktas.trace")
+                trace_logger.setLevel(logging.INFO)
+                trace_logger.propagate = False
+                handler = RotatingFileHandler(os.path.join(LOG_DIR, "ktas_requests.jsonl"),
+                                              maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                trace_logger.addHandler(handler)
+                _trace_logger = trace_logger
+    return _trace_logger
+
+
+def write_prometheus_file(path=None):
+    """
+    Prometheus textfile collector용 파일 저장 (임시 파일에 쓴 뒤 교체)
+    """
+    path = path or os.path.join(LOG_DIR, "ktas_metrics.prom")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 여러 스레드/프로세스가 동시에 저장해도 서로의 임시 파일을 교체하지 않도록 작성자별 임시 파일 사용
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(metrics.to_prometheus())
+    os.replace(tmp_path, path)
+
+
+_prometheus_writer = None
+_prometheus_dirty = threading.Event()
+
+
+def _schedule_prometheus_file():
+    """
+    Prometheus 파일은 요청 경로에서 쓰지 않고, 바뀐 내용이 있을 때 백그라운드 스레드가 주기적으로 저장
+    저장 주기는 KTAS_METRICS_FILE_INTERVAL(초, 기본 10), 프로세스 종료 시 한 번 더 저장
+    """
+    global _prometheus_writer
+    _prometheus_dirty.set()
+    if _prometheus_writer is not None:
+        return
+    with _trace_logger_lock:
+        if _prometheus_writer is not None:
+            return
+        interval = float(os.getenv("KTAS_METRICS_FILE_INTERVAL", "10"))
+
+        def flush():
+            if _prometheus_dirty.is_set():
+                _prometheus_dirty.clear()
+                try:
+                    write_prometheus_file()
+                except OSError as e:
+                    logging.getLogger(__name__).warning("계측 기록 실패: %s", e)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                flush()
+
+        _prometheus_writer = threading.Thread(target=run, name="ktas-metrics-file", daemon=True)
+        _prometheus_writer.start()
+        atexit.register(flush)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage):
+    """
+    코드 블록 실행 시간을 현재 요청의 단계 시간으로 기록 (요청 밖이면 시작 단계 시간으로 기록)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_stage(stage, seconds):
+    trace = _current_trace.get()
+    if trace is None:
+        startup_spans[stage] = round(seconds, 6)
+        metrics.observe_stage(stage, seconds)
+        return
+    trace["stages"][stage] = round(trace["stages"].get(stage, 0.0) + seconds, 6)
+
+
+def record_cache(name, hit):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["cache_counts"][(name, "hit" if hit else "miss")] += 1
+
+
+def record_tokens(kind, count):
+    trace = _current_trace.get()
+    if trace is not None and count:
+        trace["tokens"][kind] = trace["tokens"].get(kind, 0) + count
+
+
+@contextmanager
+def trace_request(**attributes):
+    """
+    요청 하나의 계측 범위, 끝나면 JSONL 로그/지표/최근 요청 목록에 반영
+    """
+    trace = {
+        "request_id": uuid.uuid4().hex[:12],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stages": {},
+        "tokens": {},
+        "cache_counts": defaultdict(int),
+        "error": None,
+        **attributes,
+    }
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    except GeneratorExit:
+        # 스트리밍 도중 호출한 쪽이 읽기를 멈춘 경우
+        trace["cancelled"] = True
+        raise
+    except Exception as e:
+        trace["error"] = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # 다른 컨텍스트에서 정리되는 스트림(가비지 컬렉션 등)은 되돌릴 값이 없음
+            pass
+        trace["total"] = round(time.perf_counter() - start, 6)
+        _finish_trace(trace)
+
+
+def _finish_trace(trace):
+    metrics.observe_trace(trace)
+    record = {key: value for key, value in trace.items() if key != "cache_counts"}
+    record["cache"] = {f"{name}_{result}": count for (name, result), count in trace["cache_counts"].items()}
+    recent_traces.append(record)
+    try:
+        _get_trace_logger().info(json.dumps(record, ensure_ascii=False))
+    except OSError as e:
+        logging.getLogger(__name__).warning("계측 기록 실패: %s", e)
+    _schedule_prometheus_file()
+
+
+class TimingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain 실행 이벤트로 검색/프롬프트 구성/LLM 생성 시간과 토큰 수를 현재 요청에 기록
+    """
+
+    def __init__(self):
+        self._starts = {}
+        self._first_token_seen = set()
+
+    def _start(self, run_id, stage):
+        self._starts[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id):
+        started = self._starts.pop(run_id, None)
+        if started:
+            stage, start = started
+            record_stage(stage, time.perf_counter() - start)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        stage = RUN_STAGES.get(kwargs.get("name") or (serialized or {}).get("name"))
+        if stage:
+            self._start(run_id, stage)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "generation")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "generation")
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id not in self._first_token_seen and run_id in self._starts:
+            self._first_token_seen.add(run_id)
+            record_stage("first_token", time.perf_counter() - self._starts[run_id][1])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if not usage:
+            # 스트리밍 응답은 메시지의 usage_metadata에 토큰 수가 들어 있음
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    usage = getattr(message, "usage_metadata", None) or usage
+        record_tokens("prompt", usage.get("prompt_tokens") or usage.get("input_tokens") or 0)
+        record_tokens("completion", usage.get("completion_tokens") or usage.get("output_tokens") or 0)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+
+class TimedEmbeddings(Embeddings):
+    """
+    질의 임베딩 시간을 query_embedding 단계로 기록하는 래퍼 (나머지 속성은 원래 객체로 전달)
+    """
+
+    def __init__(self, embeddings):
+        self._embeddings = embeddings
+
+    def __getattr__(self, name):
+        return getattr(self._embeddings, name)
+
+    def embed_documents(self, texts):
+        with span("document_embedding"):
+            return self._embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with span("query_embedding"):
+            return self._embeddings.embed_query(text)
+
+
+class TracedChain:
+    """
+    ktas_chain 호출마다 요청 계측 범위를 열고 TimingCallbackHandler를 붙이는 래퍼
+    """
+
+    def __init__(self, chain):
+        self.chain = chain
+
+    def _config(self, config):
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [TimingCallbackHandler()]
+        return config
+
+    def invoke(self, chain_input, config=None, **kwargs):
+        with trace_request(mode="invoke"):
+            return self.chain.invoke(chain_input, config=self._config(config), **kwargs)
+
+    def stream(self, chain_input, config=None):
+        with trace_request(mode="stream"):
+            yield from self.chain.stream(chain_input, config=self._config(config))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=None):
+    """
+    /metrics HTTP 엔드포인트를 백그라운드 스레드로 시작 (프로세스당 한 번)
+    """
+    global _metrics_server
+    if _metrics_server is None:
+        port = int(port or os.getenv("KTAS_METRICS_PORT", "9108"))
+        _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    return _metrics_server
@@ -0,0 +1,324 @@
+# 활력징후 기반 사전 분류 (규칙 엔진)
+# 가이드라인 저장소(src/guideline_store.py)의 vital_signs_primary 기준 중 수치로 판단 가능한 항목만 로컬에서 평가하고,
+# KTAS 1/2에 해당하면 LLM을 기다리지 않고 즉시 결과를 반환
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+import json, os, re
+
+from src.guideline_store import GUIDELINE_JSON, GuidelineStore, open_guideline_store
+
+# 판단 기준 수치 (성인)
+SHOCK_SBP = 80              # 쇼크: 수축기 혈압 < 80
+HEMODYNAMIC_SBP = 90        # 혈역학적 장애: 수축기 혈압 < 90
+SEVERE_HYPOXIA_SPO2 = 90    # 중증 호흡곤란: SpO2 < 90
+MODERATE_HYPOXIA_SPO2 = 92  # 중등도 호흡곤란: SpO2 90-91
+FEVER_TEMP = 38.0
+
+# 기저질환에서 면역저하 상태로 볼 수 있는 표현
+IMMUNOCOMPROMISED_KEYWORDS = ("면역저하", "면역억제", "항암", "화학요법", "스테로이드", "이식", "HIV", "호중구감소")
+
+_number = re.compile(r"\d+(?:\.\d+)?")
+_age = re.compile(r"(\d+(?:\.\d+)?)\s*(개월|달|세|살)?")
+_avpu_verbal = re.compile(r"언어\s*자극|언어에\s*반응|말에\s*반응|verbal")
+# 위치 형식 '혈압-맥박-spo2-체온-혈당'의 각 항목 (빈 값 허용, 단위는 무시)
+_positional_value = re.compile(r"(\d+(?:\.\d+)?)?\s*(?:%|°?c|mmhg|bpm|회|mg/dl)?", re.I)
+_blood_pressure = re.compile(r"(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)")
+# 이름이 붙은 값: '혈압 120/80, 맥박 75', 'HR 75 BP 120/80', 'SpO2 95%'
+_labelled_values = {
+    "blood_pressure": re.compile(r"(?:혈압|\bbp\b|\bnibp\b)\s*[:=]?\s*(\d+(?:\.\d+)?)(?:\s*/\s*(\d+(?:\.\d+)?))?", re.I),
+    "heart_rate": re.compile(r"(?:맥박|심박수?|\bhr\b|\bpr\b|\bpulse\b)\s*[:=]?\s*(\d+(?:\.\d+)?)", re.I),
+    "spo2": re.compile(r"(?:산소포화도|\bspo2\b|\bsao2\b|\bsat\b)\s*[:=]?\s*(\d+(?:\.\d+)?)", re.I),
+    "temperature": re.compile(r"(?:체온|\bbt\b|\btemp(?:erature)?\b)\s*[:=]?\s*(\d+(?:\.\d+)?)", re.I),
+    "glucose": re.compile(r"(?:혈당|\bbst\b|\bbg\b|\bglucose\b)\s*[:=]?\s*(\d+(?:\.\d+)?)", re.I),
+}
+# 측정값으로 가능한 범위 (벗어나면 형식을 잘못 읽은 것으로 보고 읽지 않음, 예: 날짜 '2024-01-01')
+PLAUSIBLE_RANGES = {
+    "sbp": (20, 300), "dbp": (10, 200), "heart_rate": (10, 300), "spo2": (30, 100), "temperature": (25, 45),
+    "glucose": (10, 2000),
+}
+_avpu_pain = re.compile(r"통증\s*자극|통증에\s*반응|responds?\s+to\s+pain|pain\s*stimul|\(\s*pain\s*\)|^pain$")
+
+
+@dataclass
+class VitalSigns:
+    sbp: Optional[float] = None
+    dbp: Optional[float] = None
+    heart_rate: Optional[float] = None
+    spo2: Optional[float] = None
+    temperature: Optional[float] = None
+    glucose: Optional[float] = None
+    # 형식을 확실히 읽었는지 (False면 모든 값이 None이고 어떤 규칙도 적용되지 않음)
+    parsed: bool = False
+
+
+def _to_number(text):
+    match = _number.search(text or "")
+    return float(match.group()) if match else None
+
+
+def _parse_positional(text):
+    # '혈압-맥박-spo2-체온-혈당', 항목마다 숫자 하나(혈압은 '수축기/이완기')이거나 빈 값이어야 함
+    parts = [part.strip() for part in text.split("-")]
+    if not 2 <= len(parts) <= 5:
+        return None
+    parts += [""] * (5 - len(parts))
+    blood_pressure, *others = parts
+
+    sbp = dbp = None
+    if blood_pressure:
+        match = _blood_pressure.fullmatch(blood_pressure) or _positional_value.fullmatch(blood_pressure)
+        if match is None:
+            return None
+        sbp = float(match.group(1)) if match.group(1) else None
+        dbp = float(match.group(2)) if match.re is _blood_pressure else None
+
+    values = []
+    for part in others:
+        match = _positional_value.fullmatch(part)
+        if match is None:
+            return None
+        values.append(float(match.group(1)) if match.group(1) else None)
+    heart_rate, spo2, temperature, glucose = values
+    return VitalSigns(sbp, dbp, heart_rate, spo2, temperature, glucose, parsed=True)
+
+
+def _parse_labelled(text):
+    # 항목 이름이 붙은 값만 읽고, 같은 항목이 두 번 나오거나 이름 없는 숫자가 남으면 읽지 않음
+    values, rest = {}, text
+    for name, pattern in _labelled_values.items():
+        matches = list(pattern.finditer(text))
+        if len(matches) > 1:
+            return None
+        if matches:
+            values[name] = matches[0]
+            rest = rest.replace(matches[0].group(), " ")
+    if not values or _number.search(rest):
+        return None
+
+    def number(name, group=1):
+        match = values.get(name)
+        return float(match.group(group)) if match and match.group(group) else None
+
+    return VitalSigns(
+        sbp=number("blood_pressure"),
+        dbp=number("blood_pressure", 2),
+        heart_rate=number("heart_rate"),
+        spo2=number("spo2"),
+        temperature=number("temperature"),
+        glucose=number("glucose"),
+        parsed=True,
+    )
+
+
+def _plausible(vitals):
+    if vitals is None:
+        return None
+    for name, (low, high) in PLAUSIBLE_RANGES.items():
+        value = getattr(vitals, name)
+        if value is not None and not low <= value <= high:
+            return None
+    return vitals
+
+
+def parse_vital_signs(vital_signs):
+    """
+    활력징후 문자열을 VitalSigns로 변환
+    - 위치 형식 '혈압-맥박-spo2-체온-혈당' (예: 120/80-75-100-36.5-80, 빈 항목은 None)
+    - 이름이 붙은 값 (예: '혈압 120/80, 맥박 75', 'HR 75 BP 120/80', 'SpO2 95%')
+    어느 형식으로도 확실히 읽을 수 없으면 parsed=False이고 모든 값이 None (추측한 값으로 규칙을 적용하지 않음)
+    """
+    text = (vital_signs or "").strip()
+    if not text:
+        return VitalSigns()
+    if _blood_pressure.fullmatch(text):
+        return _plausible(_parse_positional(text + "-")) or VitalSigns()
+    vitals = _parse_labelled(text) or (_parse_positional(text) if "-" in text else None)
+    return _plausible(vitals) or VitalSigns()
+
+
+def parse_avpu(consciousness):
+    """
+    의식상태 입력을 AVPU 문자(A/V/P/U)로 변환 (알 수 없으면 None)
+    """
+    text = (consciousness or "").strip().lower()
+    if not text:
+        return None
+    if "unresponsive" in text or "무반응" in text or "의식없음" in text or text == "u":
+        return "U"
+    # 자유 입력에는 "명료, 통증 호소"처럼 증상이 섞일 수 있으므로 A/V를 먼저 보고, V/P는 자극 반응 표현만 인정
+    if "alert" in text or "명료" in text or text == "a":
+        return "A"
+    if _avpu_verbal.search(text) or text == "v":
+        return "V"
+    if _avpu_pain.search(text) or text == "p":
+        return "P"
+    return None
+
+
+def parse_age_months(age):
+    """
+    나이 입력을 개월 수로 변환 ('30' -> 360, '2개월' -> 2), 미확인이면 None
+    """
+    match = _age.search(age or "")
+    if not match:
+        return None
+    value = float(match.group(1))
+    return value if match.group(2) in ("개월", "달") else value * 12
+
+
+# 기준 문구 -> 판단 함수
+# 문구에 포함된 키워드로 연결하며, 수치로 판단할 수 없는 기준(아파 보임 등)은 등록하지 않음
+def _shock(p):
+    if p["vitals"].sbp is not None and p["vitals"].sbp < SHOCK_SBP:
+        return f"수축기 혈압 {p['vitals'].sbp:g}mmHg (<{SHOCK_SBP})"
+
+
+def _hemodynamic(p):
+    if p["vitals"].sbp is not None and p["vitals"].sbp < HEMODYNAMIC_SBP:
+        return f"수축기 혈압 {p['vitals'].sbp:g}mmHg (<{HEMODYNAMIC_SBP})"
+
+
+def _severe_dyspnea(p):
+    if p["vitals"].spo2 is not None and p["vitals"].spo2 < SEVERE_HYPOXIA_SPO2:
+        return f"산소포화도 {p['vitals'].spo2:g}% (<{SEVERE_HYPOXIA_SPO2})"
+
+
+def _moderate_dyspnea(p):
+    spo2 = p["vitals"].spo2
+    if spo2 is not None and SEVERE_HYPOXIA_SPO2 <= spo2 < MODERATE_HYPOXIA_SPO2:
+        return f"산소포화도 {spo2:g}% ({SEVERE_HYPOXIA_SPO2}-{MODERATE_HYPOXIA_SPO2 - 1})"
+
+
+def _unconscious(p):
+    if p["avpu"] == "U":
+        return "의식상태 U (무반응)"
+
+
+def _altered_consciousness(p):
+    if p["avpu"] in ("V", "P"):
+        return f"의식상태 {p['avpu']}"
+
+
+def _fever_immunocompromised(p):
+    temperature = p["vitals"].temperature
+    if temperature is not None and temperature >= FEVER_TEMP:
+        keyword = next((k for k in IMMUNOCOMPROMISED_KEYWORDS if k.lower() in p["diseases"].lower()), None)
+        if keyword:
+            return f"체온 {temperature:g}°C, 기저질환 '{keyword}'"
+
+
+def _infant_temperature(p):
+    months, temperature = p["age_months"], p["vitals"].temperature
+    if months is not None and months < 3 and temperature is not None and (temperature < 36 or temperature >= 38):
+        return f"{months:g}개월, 체온 {temperature:g}°C"
+
+
+# 성인 혈압 기준 (소아에게는 적용하지 않음)
+ADULT_ONLY_RULES = (_shock, _hemodynamic)
+
+CRITERIA_RULES = [
+    ("쇼크", _shock),
+    ("혈역학적 장애", _hemodynamic),
+    ("중증 호흡곤란", _severe_dyspnea),
+    ("중등도 호흡곤란", _moderate_dyspnea),
+    ("무의식", _unconscious),
+    ("의식변화", _altered_consciousness),
+    ("열, 면역저하", _fever_immunocompromised),
+    ("<3개월이면서 T<36°C 또는 ≥38°C", _infant_temperature),
+]
+
+
+def _find_rule(description):
+    for keyword, rule in CRITERIA_RULES:
+        if keyword in description:
+            return rule
+    return None
+
+
+def load_guideline(json_path=GUIDELINE_JSON):
+    with open(json_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def collect_criteria(data, patient_type="adult", code=None, category="vital_signs_primary"):
+    """
+    category(기본 vital_signs_primary) 기준을 (설명, 레벨) 목록으로 반환
+    code가 없으면 전체 코드에서 각 기준이 가장 많이 쓰인 레벨을 사용
+    data: 가이드라인 저장소 또는 JSON과 같은 형태의 dict
+    """
+    if isinstance(data, GuidelineStore):
+        pairs = [(row["description"], row["level"]) for row in data.criteria(code, patient_type, category)]
+    else:
+        pairs = []
+        for c in ([code] if code else list(data)):
+            levels_by_code = data.get(c, {}).get(patient_type, {}).get(category, {})
+            for level, descriptions in levels_by_code.items():
+                pairs.extend((desc, int(level)) for desc in descriptions)
+
+    levels = {}
+    for desc, level in pairs:
+        levels.setdefault(desc, Counter())[level] += 1
+
+    return [(desc, counter.most_common(1)[0][0]) for desc, counter in levels.items()]
+
+
+class VitalSignRuleEngine:
+    """
+    활력징후 1차 고려사항 규칙 엔진
+    evaluate()는 KTAS 1/2 기준이 명확히 충족되면 level을, 아니면 None을 반환
+    """
+
+    def __init__(self, data=None, max_level=2):
+        self.data = data if data is not None else open_guideline_store()
+        self.max_level = max_level
+        self._criteria = {}
+
+    def _rules(self, patient_type, code):
+        key = (patient_type, code)
+        if key not in self._criteria:
+            rules = []
+            for desc, level in collect_criteria(self.data, patient_type, code):
+                rule = _find_rule(desc)
+                if rule is not None and level <= self.max_level:
+                    rules.append((level, desc, rule))
+            # 낮은 레벨(중증)부터 평가
+            self._criteria[key] = sorted(rules, key=lambda r: r[0])
+        return self._criteria[key]
+
+    def evaluate(self, vital_signs, consciousness, age=None, diseases=None, code=None):
+        patient = {
+            "vitals": parse_vital_signs(vital_signs),
+            "avpu": parse_avpu(consciousness),
+            "age_months": parse_age_months(age),
+            "diseases": diseases or "",
+        }
+        months = patient["age_months"]
+        patient_type = "pediatric" if months is not None and months < 15 * 12 else "adult"
+        rules = self._rules(patient_type, code)
+        if not rules and patient_type == "pediatric":
+            # 소아 기준이 추출되지 않은 경우 성인 기준으로 평가하되, 성인 혈압 기준은 빼고 LLM 판단에 맡김
+            rules = [rule for rule in self._rules("adult", code) if rule[2] not in ADULT_ONLY_RULES]
+
+        reasons = []
+        for level, desc, rule in rules:
+            finding = rule(patient)
+            if finding:
+                reasons.append({"level": level, "criterion": desc, "finding": finding})
+
+        return {
+            "level": min((r["level"] for r in reasons), default=None),
+            "reasons": reasons,
+            "vitals": patient["vitals"],
+            "avpu": patient["avpu"],
+        }
+
+
+def format_decision(decision):
+    """
+    규칙 엔진 결과를 화면 표시용 문자열로 변환
+    """
+    lines = [f"[규칙 기반 사전 분류] KTAS {decision['level']}"]
+    for reason in decision["reasons"]:
+        lines.append(f"- {reason['criterion']} (KTAS {reason['level']}): {reason['finding']}")
+    return "\n".join(lines)
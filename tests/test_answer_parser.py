@@ -0,0 +1,72 @@
+import pytest
+
+from src.answer_parser import LevelStreamParser, parse_ktas_level, split_answer
+
+ANSWER = "KTAS_LEVEL: 2\n[KTAS 기준]\n- KTAS 1 기준에는 해당하지 않음\n[KTAS 평가]\nKTAS 2"
+
+
+@pytest.mark.parametrize("answer, expected", [
+    (ANSWER, 2),
+    ("**KTAS_LEVEL**: 3\n설명", 3),
+    ("KTAS_LEVEL： 1\n설명", 1),
+    ("  \n> KTAS_LEVEL: 4\n설명", 4),
+    # 레벨 줄이 없으면 [KTAS 평가] 섹션에서 찾고, [KTAS 기준] 설명의 숫자는 무시
+    ("[KTAS 기준]\nKTAS 1: 쇼크\n[KTAS 평가]\n환자는 KTAS 3에 해당", 3),
+    ("[KTAS 기준]\nKTAS 1: 쇼크", None),
+    ("KTAS_LEVEL: 7\n설명", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_ktas_level(answer, expected):
+    assert parse_ktas_level(answer) == expected
+
+
+def test_split_answer_removes_level_line():
+    level, body = split_answer(ANSWER)
+    assert level == 2
+    assert body.startswith("[KTAS 기준]")
+
+
+def feed_all(chunks):
+    parser = LevelStreamParser()
+    body = "".join(parser.feed(chunk) for chunk in chunks) + parser.close()
+    return parser, body
+
+
+def test_stream_parser_level_before_body():
+    parser = LevelStreamParser()
+    assert parser.feed("KTAS_LE") == ""
+    assert parser.level is None
+    assert parser.feed("VEL: 2\n[KTAS") == "[KTAS"
+    assert parser.level == 2
+    assert parser.feed(" 기준]") == " 기준]"
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(ANSWER)])
+def test_stream_parser_matches_split_answer(size):
+    parser, body = feed_all([ANSWER[i:i + size] for i in range(0, len(ANSWER), size)])
+    assert (parser.level, body) == split_answer(ANSWER)
+
+
+def test_stream_parser_without_level_line():
+    answer = "[KTAS 기준]\n" + "설명 " * 30 + "\n[KTAS 평가]\nKTAS 3"
+    parser, body = feed_all([answer[i:i + 5] for i in range(0, len(answer), 5)])
+    assert body == answer
+    assert parser.level == 3
+
+
+def test_stream_parser_short_answer_flushed_on_close():
+    parser = LevelStreamParser()
+    assert parser.feed("KTAS_LEVEL: 5") == ""
+    assert parser.close() == ""
+    assert parser.level == 5
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("KTAS_LEVEL: 2입니다\n설명", 2),
+    ("[KTAS 평가]\n최종 KTAS 2.", 2),
+    ("[KTAS 평가]\nKTAS 2.5", None),
+    ("KTAS_LEVEL: 12\n설명", None),
+])
+def test_parse_ktas_level_boundaries(answer, expected):
+    assert parse_ktas_level(answer) == expected
@@ -0,0 +1,97 @@
+import json, threading, time
+
+from src.batch import read_patients, run_batch
+
+PATIENT = {"symptoms": "흉통", "vital_signs": "120/80-80-98-36.5-100"}
+
+
+class FakeChain:
+    """
+    증상에 따라 응답을 늦추거나 실패하는 체인
+    """
+
+    def __init__(self, delays=None, failures=()):
+        self.delays = delays or {}
+        self.failures = set(failures)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def invoke(self, chain_input):
+        with self.lock:
+            self.calls += 1
+        symptoms = chain_input["input"]
+        time.sleep(self.delays.get(symptoms, 0))
+        if symptoms in self.failures:
+            raise RuntimeError(f"실패: {symptoms}")
+        return {"answer": f"KTAS_LEVEL: 3\n{symptoms}"}
+
+
+def read_output(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_results_are_written_in_input_order(tmp_path):
+    patients = [{**PATIENT, "symptoms": f"증상{i}"} for i in range(20)]
+    # 앞 번호가 늦게 끝나도 입력 순서대로 기록
+    chain = FakeChain(delays={"증상0": 0.2, "증상3": 0.1})
+    output = tmp_path / "out.jsonl"
+    counts = run_batch(chain, patients, output, max_workers=4)
+
+    records = read_output(output)
+    assert counts == {"ok": 20, "error": 0}
+    assert [record["index"] for record in records] == list(range(20))
+    assert [record["patient"]["symptoms"] for record in records] == [f"증상{i}" for i in range(20)]
+    assert all(record["level"] == 3 for record in records)
+
+
+def test_errors_are_recorded_per_item(tmp_path):
+    patients = [{**PATIENT, "symptoms": "정상"}, {**PATIENT, "symptoms": "실패"},
+                {"symptoms": "활력징후 없음"}, {**PATIENT, "symptoms": "정상"}]
+    chain = FakeChain(failures={"실패"})
+    output = tmp_path / "out.jsonl"
+    counts = run_batch(chain, patients, output, max_workers=2)
+
+    records = read_output(output)
+    assert counts == {"ok": 2, "error": 2}
+    assert [record["error"] is None for record in records] == [True, False, False, True]
+    assert "RuntimeError" in records[1]["error"]
+    assert "vital_signs" in records[2]["error"]
+    # 필수 입력이 빠진 환자는 체인을 호출하지 않음
+    assert chain.calls == 3
+
+
+def test_malformed_jsonl_line_does_not_stop_the_run(tmp_path):
+    input_path = tmp_path / "patients.jsonl"
+    input_path.write_text(json.dumps(PATIENT) + "\n{bad json\n\n" + json.dumps(PATIENT) + "\n", encoding="utf-8")
+    output = tmp_path / "out.jsonl"
+    counts = run_batch(FakeChain(), read_patients(str(input_path)), output, max_workers=2)
+
+    records = read_output(output)
+    assert counts == {"ok": 2, "error": 1}
+    assert [record["index"] for record in records] == [0, 1, 2]
+    assert records[1]["error"].startswith("InvalidRecord: 2번째 줄")
+
+
+def test_finished_results_are_flushed_when_input_fails(tmp_path):
+    def patients():
+        yield PATIENT
+        raise OSError("입력 파일 읽기 실패")
+
+    output = tmp_path / "out.jsonl"
+    try:
+        run_batch(FakeChain(delays={"흉통": 0.05}), patients(), output)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("입력 오류가 전달되지 않음")
+    assert [record["index"] for record in read_output(output)] == [0]
+
+
+def test_read_patients_csv(tmp_path):
+    input_path = tmp_path / "patients.csv"
+    input_path.write_text("symptoms,vital_signs,age\n흉통, 120/80-80-98 ,65\n", encoding="utf-8-sig")
+    assert list(read_patients(str(input_path))) == [{
+        "sex": "", "age": "65", "symptoms": "흉통", "vital_signs": "120/80-80-98",
+        "consciousness": "", "diseases": "", "medications": "",
+    }]
@@ -0,0 +1,62 @@
+import sqlite3, time
+
+from src.cache import ResponseCache, make_cache_key, make_cache_version
+from src.rag_system import build_chain_input
+
+CHAIN_INPUT = build_chain_input({"symptoms": "흉통", "vital_signs": "120/80-80-98-36.5-100", "age": "45"})
+
+
+def test_versions_sharing_a_file_do_not_evict_each_other(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    old = ResponseCache(path, version="snapshot-a")
+    old.put(CHAIN_INPUT, "KTAS_LEVEL: 3\nA")
+    new = ResponseCache(path, version="snapshot-b")
+    assert new.get(CHAIN_INPUT) is None
+    new.put(CHAIN_INPUT, "KTAS_LEVEL: 2\nB")
+
+    # 다른 버전 캐시를 열거나 저장해도 기존 버전 항목은 남아 있음
+    assert ResponseCache(path, version="snapshot-a").get(CHAIN_INPUT) == "KTAS_LEVEL: 3\nA"
+    assert new.get(CHAIN_INPUT) == "KTAS_LEVEL: 2\nB"
+    assert old.stats()["entries"] == 1
+
+
+def test_expired_entries_of_any_version_are_removed_on_put(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    stale = ResponseCache(path, version="old", ttl=60)
+    stale.put(CHAIN_INPUT, "오래된 답변")
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE responses SET created = ?", (time.time() - 3600,))
+
+    ResponseCache(path, version="new", ttl=60).put({**CHAIN_INPUT, "input": "두통"}, "새 답변")
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT version FROM responses").fetchall() == [("new",)]
+
+
+def test_lru_limit(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), version="v", max_entries=2)
+    for symptoms in ("흉통", "두통", "복통"):
+        cache.put({**CHAIN_INPUT, "input": symptoms}, symptoms)
+    assert cache.get({**CHAIN_INPUT, "input": "흉통"}) is None
+    assert cache.get({**CHAIN_INPUT, "input": "복통"}) == "복통"
+
+
+def test_legacy_table_is_replaced(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, version TEXT NOT NULL, answer TEXT NOT NULL, "
+                     "created REAL NOT NULL, accessed REAL NOT NULL)")
+        conn.execute("INSERT INTO responses VALUES (?, 'v', 'a', 0, 0)", (make_cache_key(CHAIN_INPUT),))
+    cache = ResponseCache(path, version="v")
+    cache.put(CHAIN_INPUT, "답변")
+    assert cache.get(CHAIN_INPUT) == "답변"
+
+
+def test_cache_version_includes_retriever_mode():
+    assert make_cache_version("prompt", "index", "hybrid") != make_cache_version("prompt", "index", "dense")
+
+
+def test_cache_key_normalizes_equivalent_vitals():
+    labelled = {**CHAIN_INPUT, "vital_signs": "혈압 120/80, 맥박 80, 산소포화도 98%, 체온 36.5, 혈당 100"}
+    assert make_cache_key(labelled) == make_cache_key(CHAIN_INPUT)
+    assert make_cache_key({**CHAIN_INPUT, "vital_signs": "체온 39.4"}) != make_cache_key(
+        {**CHAIN_INPUT, "vital_signs": "체온 38.4"})
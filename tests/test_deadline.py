@@ -0,0 +1,46 @@
+import pytest
+
+from src.deadline import estimate_ktas, parse_pain_score
+from src.triage_rules import VitalSignRuleEngine, load_guideline
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("NRS 8", 8),
+    ("VAS: 9", 9),
+    ("통증 7/10", 7),
+    ("통증 점수 6", 6),
+    ("통증 8점", 8),
+    ("복통 NRS 10, 구토", 10),
+    ("3/10 정도의 둔한 통증", 3),
+    ("통증 8시간 지속", None),
+    ("통증 3일", None),
+    ("NRS 2주 전부터", None),
+    ("어제부터 복통", None),
+    ("통증 7", None),
+    ("GCS 8/15", None),
+    ("NRS 11", None),
+])
+def test_parse_pain_score(text, expected):
+    assert parse_pain_score(text) == expected
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return VitalSignRuleEngine(load_guideline())
+
+
+def estimate(engine, symptoms):
+    chain_input = {"input": symptoms, "age": "40", "diseases": "", "medications": "",
+                   "vital_signs": "120/80-80-98-36.5-100", "consciousness": "명료"}
+    decision = engine.evaluate(chain_input["vital_signs"], chain_input["consciousness"], chain_input["age"])
+    return estimate_ktas(chain_input, engine.data, decision)
+
+
+def test_estimate_does_not_read_duration_as_pain(engine):
+    assert estimate(engine, "복부 통증 8시간 지속")["level"] == 4
+
+
+def test_estimate_uses_severe_pain(engine):
+    result = estimate(engine, "복부 통증 NRS 9")
+    assert result["level"] <= 3
+    assert any("통증 점수 9/10" == reason["finding"] for reason in result["reasons"])
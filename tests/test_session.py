@@ -0,0 +1,58 @@
+from src.rag_system import build_chain_input
+from src.session import PatientSession, plan_update
+
+PATIENT = {
+    "sex": "남성", "age": "45", "symptoms": "30분 전 시작된 흉통", "vital_signs": "120/80-80-98-36.5-100",
+    "consciousness": "명료", "diseases": "고혈압", "medications": "미확인",
+}
+
+
+def make_session(patient=PATIENT, answer="KTAS_LEVEL: 3\n[KTAS 평가]\nKTAS 3", context=()):
+    return PatientSession(build_chain_input(patient), list(context), answer, 3)
+
+
+def plan(patient, session):
+    return plan_update(session, build_chain_input(patient))
+
+
+def test_full_without_previous_assessment():
+    assert plan(PATIENT, None) == {"mode": "full", "changes": [], "retrieve": True}
+    assert plan(PATIENT, make_session(answer=""))["mode"] == "full"
+
+
+def test_unchanged_when_only_formatting_differs():
+    patient = {**PATIENT, "symptoms": " 30분 전  시작된 흉통 ", "consciousness": "명료(Alert)",
+               "medications": "", "vital_signs": "혈압 120/80, 맥박 80, 산소포화도 98%, 체온 36.5, 혈당 100"}
+    assert plan(patient, make_session()) == {"mode": "unchanged", "changes": [], "retrieve": False}
+
+
+def test_full_when_symptoms_change():
+    result = plan({**PATIENT, "symptoms": "갑자기 시작된 심한 두통"}, make_session())
+    assert result["mode"] == "full"
+    assert result["retrieve"]
+    assert [field for field, _, _ in result["changes"]] == ["input"]
+
+
+def test_delta_reuses_retrieval_when_vitals_change():
+    result = plan({**PATIENT, "vital_signs": "85/50-120-93-36.5-100"}, make_session())
+    assert result["mode"] == "delta"
+    assert not result["retrieve"]
+    assert result["changes"] == [("vital_signs", "120/80-80-98-36.5-100", "85/50-120-93-36.5-100")]
+
+
+def test_delta_detects_free_text_vital_change():
+    session = make_session({**PATIENT, "vital_signs": "체온 38.5, 맥박 120"})
+    result = plan({**PATIENT, "vital_signs": "체온 39.4, 맥박 120"}, session)
+    assert result["mode"] == "delta"
+
+
+def test_delta_retrieves_again_when_patient_type_changes():
+    result = plan({**PATIENT, "age": "7"}, make_session())
+    assert result["mode"] == "delta"
+    assert result["retrieve"]
+
+
+def test_delta_retrieves_again_without_saved_context():
+    session = make_session()
+    session.context = None
+    assert plan({**PATIENT, "consciousness": "통증자극에 반응"}, session)["retrieve"]
@@ -0,0 +1,99 @@
+import pytest
+
+from src.triage_rules import VitalSignRuleEngine, load_guideline, parse_avpu, parse_vital_signs
+
+
+@pytest.fixture(scope="module")
+def engine():
+    # 가이드라인 저장소(sqlite)를 만들지 않도록 JSON을 직접 사용
+    return VitalSignRuleEngine(load_guideline())
+
+
+def vitals_tuple(vitals):
+    return (vitals.sbp, vitals.dbp, vitals.heart_rate, vitals.spo2, vitals.temperature, vitals.glucose)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("120/80-75-100-36.5-80", (120, 80, 75, 100, 36.5, 80)),
+    ("120/80-75-98", (120, 80, 75, 98, None, None)),
+    ("85/50-45--36.5-", (85, 50, 45, None, 36.5, None)),
+    ("90/60-100-95%-37.2°C-110", (90, 60, 100, 95, 37.2, 110)),
+    ("120/80", (120, 80, None, None, None, None)),
+    ("혈압 85/50, 맥박 45", (85, 50, 45, None, None, None)),
+    ("HR 75 BP 120/80", (120, 80, 75, None, None, None)),
+    ("SpO2 95", (None, None, None, 95, None, None)),
+    ("체온 39.4, 맥박 90", (None, None, 90, None, 39.4, None)),
+    ("체온 38.5, 맥박 120, 산소포화도 96%", (None, None, 120, 96, 38.5, None)),
+])
+def test_parse_vital_signs(text, expected):
+    vitals = parse_vital_signs(text)
+    assert vitals.parsed
+    assert vitals_tuple(vitals) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "", "80", "맥박 90 120", "BP 120/80 BP 100/60", "2024-01-01", "1/2", "혈압이 낮음",
+])
+def test_parse_vital_signs_rejects_ambiguous_input(text):
+    vitals = parse_vital_signs(text)
+    assert not vitals.parsed
+    assert vitals_tuple(vitals) == (None,) * 6
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("명료(Alert)", "A"),
+    ("언어자극에 반응(Verbal)", "V"),
+    ("통증자극에 반응(Pain)", "P"),
+    ("무반응(Unresponsive)", "U"),
+    ("명료, 통증 호소", "A"),
+    ("통증 호소", None),
+    ("언어장애", None),
+    ("responds to pain", "P"),
+    ("p", "P"),
+    ("", None),
+])
+def test_parse_avpu(text, expected):
+    assert parse_avpu(text) == expected
+
+
+def test_evaluate_shock(engine):
+    decision = engine.evaluate("70/40-130-85-36.5-100", "명료", "40")
+    assert decision["level"] == 1
+    assert {reason["criterion"] for reason in decision["reasons"]} >= {"쇼크", "중증 호흡곤란"}
+
+
+def test_evaluate_normal_adult(engine):
+    decision = engine.evaluate("120/80-80-98-36.5-100", "명료", "40")
+    assert decision["level"] is None
+    assert decision["reasons"] == []
+
+
+@pytest.mark.parametrize("vital_signs", [
+    "SpO2 95", "체온 39.4, 맥박 90", "HR 75 BP 120/80", "혈압이 낮음", "80",
+])
+def test_evaluate_free_text_never_guesses_blood_pressure(engine, vital_signs):
+    assert engine.evaluate(vital_signs, "명료", "40")["level"] is None
+
+
+def test_evaluate_benchmark_pediatric_patient(engine):
+    # benchmarks/bench_suite.PATIENTS[1]: 7세, 열과 빈맥만 있고 혈압은 없음
+    decision = engine.evaluate("체온 38.5, 맥박 120, 산소포화도 96%", "명료", "7")
+    assert decision["level"] is None
+
+
+def test_evaluate_pediatric_skips_adult_blood_pressure(engine):
+    assert engine.evaluate("75/40-140-97-37-", "명료", "6개월")["level"] is None
+    # 같은 혈압이어도 성인은 쇼크
+    assert engine.evaluate("75/40-140-97-37-", "명료", "40")["level"] == 1
+
+
+def test_evaluate_pediatric_hypoxia_still_applies(engine):
+    decision = engine.evaluate("120/80-80-85-36.5", "명료", "6개월")
+    assert decision["level"] == 1
+    assert [reason["criterion"] for reason in decision["reasons"]] == ["중증 호흡곤란"]
+
+
+def test_evaluate_consciousness_only(engine):
+    decision = engine.evaluate("", "무반응", "40")
+    assert decision["level"] == 1
+    assert not decision["vitals"].parsed